@@ -0,0 +1,277 @@
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import VehicleType, FuelType, TerrainType, RoadType
+from emission_calculator import (EmissionCalculator, TERRAIN_TYPES, ROAD_TYPES, TERRAIN_INDEX, ROAD_INDEX,
+                                 TTW, WTT, WTW)
+
+
+logger = logging.getLogger(__name__)
+
+GROUP_COLUMNS = ["vehicle_type", "fuel_type", "city", "month"]
+# Summed per group: trips, distance_km, tonne_km, ttw_kg, wtt_kg, wtw_kg
+METRIC_COLUMNS = ["trips", "distance_km", "tonne_km", "ttw_kg", "wtt_kg", "wtw_kg"]
+REPORT_COLUMNS = METRIC_COLUMNS + ["wtw_g_per_tkm"]
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+VEHICLE_CODES = {vehicle.value: i for i, vehicle in enumerate(VehicleType)}
+FUEL_CODES = {fuel.value: i for i, fuel in enumerate(FuelType)}
+
+# A Parquet batch as columns, or a CSV header with raw lines
+Chunk = Union[Dict[str, List[Any]], Tuple[List[str], List[str]]]
+
+
+def iter_csv_chunks(path: str, chunk_rows: int) -> Iterator[Tuple[List[str], List[str]]]:
+    """(header, raw lines) chunks; lines are parsed in the worker so reading is not the bottleneck
+
+    Records must not contain embedded newlines.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        header = [name.strip() for name in next(csv.reader([f.readline()]))]
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+            yield header, lines
+
+
+def iter_parquet_chunks(path: str, chunk_rows: int) -> Iterator[Dict[str, List[Any]]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Reading Parquet files requires the 'pyarrow' package (pip install pyarrow)") from e
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pydict()
+
+
+def iter_chunks(paths: Sequence[str], chunk_rows: int) -> Iterator[Chunk]:
+    for path in paths:
+        reader = iter_parquet_chunks if path.endswith(".parquet") else iter_csv_chunks
+        yield from reader(path, chunk_rows)
+
+
+def chunk_columns(chunk: Chunk) -> Tuple[Dict[str, List[Any]], Optional[np.ndarray]]:
+    """Column lists of a Parquet batch or a raw CSV chunk, with a mask of CSV rows whose field count is wrong
+
+    Short and long rows are padded or cut to the header so the columns stay aligned.
+    """
+    if isinstance(chunk, dict):
+        return chunk, None
+    header, lines = chunk
+    rows = [row for row in csv.reader(lines) if row]
+    ragged = np.fromiter((len(row) != len(header) for row in rows), dtype=bool, count=len(rows))
+    if ragged.any():
+        rows = [row if len(row) == len(header) else (row + [""] * len(header))[:len(header)] for row in rows]
+    return dict(zip(header, map(list, zip(*rows)))), ragged
+
+
+def parse_floats(values: Sequence[Any], default: float = np.nan) -> np.ndarray:
+    """Floats with blanks and nulls as default and unparseable values as NaN"""
+    try:
+        parsed = np.asarray(values, dtype=np.float64)
+        # Parquet nulls arrive as None, which converts to NaN; only required columns keep it
+        return parsed if np.isnan(default) else np.where(np.isnan(parsed), default, parsed)
+    except (TypeError, ValueError):
+        parsed = np.empty(len(values))
+        for i, value in enumerate(values):
+            if value is None or value == "":
+                parsed[i] = default
+                continue
+            try:
+                parsed[i] = float(value)
+            except ValueError:
+                parsed[i] = np.nan
+        return parsed
+
+
+def encode(values: Sequence[Any], codes: Dict[str, int]) -> np.ndarray:
+    """Map categorical strings to codes, normalizing each distinct value once; -1 where unknown"""
+    lookup = {value: codes.get(str(value).strip().lower(), -1) for value in set(values)}
+    return np.fromiter(map(lookup.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """(codes, distinct values) in first-seen order"""
+    index: Dict[Any, int] = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.intp, count=len(values))
+    return codes, list(index)
+
+
+def category_shares(chunk: Dict[str, List[Any]], size: int, kinds: list, index: dict, column: str,
+                    default: Any) -> np.ndarray:
+    """(row, category) distance shares from share columns, a single category column, or the default"""
+    share_columns = [f"{kind.value}_share" for kind in kinds]
+    if all(name in chunk for name in share_columns):
+        shares = np.column_stack([parse_floats(chunk[name], 0.0) for name in share_columns])
+        shares = np.nan_to_num(shares)
+        totals = shares.sum(axis=1, keepdims=True)
+        fallback = np.zeros(len(kinds))
+        fallback[index[default]] = 1.0
+        return np.where(totals > 0, shares / np.where(totals > 0, totals, 1.0), fallback)
+    codes = np.full(size, index[default], dtype=np.intp)
+    if column in chunk:
+        parsed = encode(chunk[column], {kind.value: i for i, kind in enumerate(kinds)})
+        codes = np.where(parsed >= 0, parsed, codes)
+    return np.eye(len(kinds))[codes]
+
+
+def text_column(columns: Dict[str, List[Any]], column: str, size: int, default: str,
+                transform=str) -> List[str]:
+    if column not in columns:
+        return [default] * size
+    return [transform(value) if value else default for value in columns[column]]
+
+
+def process_chunk(chunk: Chunk, group_by: Sequence[str]) -> Tuple[Dict[tuple, np.ndarray], int, int]:
+    """Per-group metric sums for one chunk, with its row count and the number of rows skipped as invalid"""
+    columns, ragged = chunk_columns(chunk)
+    size = len(columns.get("distance_km", []))
+    if size == 0:
+        return {}, 0, 0
+    vehicle_idx = encode(columns["vehicle_type"], VEHICLE_CODES)
+    fuel_idx = encode(columns["fuel_type"], FUEL_CODES)
+    distances = parse_floats(columns["distance_km"])
+    loads = parse_floats(columns["load_weight"], 0.0) if "load_weight" in columns else np.zeros(size)
+    valid = (vehicle_idx >= 0) & (fuel_idx >= 0) & (distances >= 0) & (loads >= 0)
+    if ragged is not None:
+        valid &= ~ragged
+    if not valid.any():
+        return {}, size, size
+
+    terrain_shares = category_shares(columns, size, TERRAIN_TYPES, TERRAIN_INDEX, "terrain", TerrainType.FLAT)
+    road_shares = category_shares(columns, size, ROAD_TYPES, ROAD_INDEX, "road_type", RoadType.HIGHWAY)
+    emissions = EmissionCalculator.calculate_indexed_emissions(
+        vehicle_idx[valid], fuel_idx[valid], distances[valid], loads[valid],
+        terrain_shares[valid], road_shares[valid]
+    )
+    metrics = np.column_stack([
+        np.ones(len(emissions)),
+        distances[valid],
+        distances[valid] * loads[valid] / 1000,
+        emissions[:, TTW], emissions[:, WTT], emissions[:, WTW]
+    ])
+
+    # (codes, labels) per group column; city and month are factorized on the fly
+    keys = {
+        "vehicle_type": (vehicle_idx[valid], [vehicle.value for vehicle in VehicleType]),
+        "fuel_type": (fuel_idx[valid], [fuel.value for fuel in FuelType])
+    }
+    for column, source, default, transform in (("city", "city", "Unknown", str),
+                                               # ISO dates (or date objects from Parquet) start with YYYY-MM
+                                               ("month", "date", "unknown", lambda date: str(date)[:7])):
+        if column in group_by:
+            codes, labels = factorize(text_column(columns, source, size, default, transform))
+            keys[column] = (codes[valid], labels)
+
+    # One mixed-radix integer key per row, so grouping is a single integer unique() plus bincounts
+    combined = np.zeros(len(metrics), dtype=np.int64)
+    for column in group_by:
+        codes, labels = keys[column]
+        combined = combined * len(labels) + codes
+    groups, group_of_row = np.unique(combined, return_inverse=True)
+    sums = np.column_stack([np.bincount(group_of_row, weights=metrics[:, m], minlength=len(groups))
+                            for m in range(metrics.shape[1])])
+    result = {}
+    for g, key in enumerate(groups.tolist()):
+        labels = []
+        for column in reversed(group_by):
+            key, code = divmod(key, len(keys[column][1]))
+            labels.append(keys[column][1][code])
+        result[tuple(reversed(labels))] = sums[g]
+    return result, size, size - int(valid.sum())
+
+
+def merge_into(totals: Dict[tuple, np.ndarray], partial: Dict[tuple, np.ndarray]) -> None:
+    for key, sums in partial.items():
+        if key in totals:
+            totals[key] += sums
+        else:
+            totals[key] = sums.copy()
+
+
+def aggregate(paths: Sequence[str], group_by: Sequence[str], chunk_rows: int = DEFAULT_CHUNK_ROWS,
+              workers: Optional[int] = None) -> Tuple[Dict[tuple, np.ndarray], int, int]:
+    """(group sums, rows read, rows skipped) over all input files"""
+    workers = workers or os.cpu_count() or 1
+    totals: Dict[tuple, np.ndarray] = {}
+    rows = skipped = 0
+
+    def collect(result: Tuple[Dict[tuple, np.ndarray], int, int]) -> None:
+        nonlocal rows, skipped
+        merge_into(totals, result[0])
+        rows += result[1]
+        skipped += result[2]
+
+    if workers == 1:
+        for chunk in iter_chunks(paths, chunk_rows):
+            collect(process_chunk(chunk, group_by))
+        return totals, rows, skipped
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        # At most two chunks per worker in flight keeps memory bounded when reading outpaces processing
+        pending = set()
+        for chunk in iter_chunks(paths, chunk_rows):
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+            pending.add(pool.submit(process_chunk, chunk, group_by))
+        for future in concurrent.futures.as_completed(pending):
+            collect(future.result())
+    return totals, rows, skipped
+
+
+def report_rows(totals: Dict[tuple, np.ndarray]) -> List[tuple]:
+    """Sorted (group..., metrics..., wtw_g_per_tkm) rows"""
+    rows = []
+    for key in sorted(totals):
+        sums = totals[key]
+        tonne_km = sums[METRIC_COLUMNS.index("tonne_km")]
+        intensity = sums[METRIC_COLUMNS.index("wtw_kg")] * 1000 / tonne_km if tonne_km > 0 else None
+        rows.append(key + (int(sums[0]),) + tuple(float(value) for value in sums[1:]) + (intensity,))
+    return rows
+
+
+def write_report(path: str, group_by: Sequence[str], rows: List[tuple]) -> None:
+    header = list(group_by) + REPORT_COLUMNS
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Writing Parquet files requires the 'pyarrow' package (pip install pyarrow)") from e
+        pq.write_table(pa.table({name: [row[i] for row in rows] for i, name in enumerate(header)}), path)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(["" if value is None else value for value in row] for row in rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Aggregate ISO 14083 emissions over historical trip files")
+    parser.add_argument("inputs", nargs="+", help="Trip files (.csv or .parquet)")
+    parser.add_argument("output", help="Report file (.csv or .parquet)")
+    parser.add_argument("--group-by", default=",".join(GROUP_COLUMNS),
+                        help=f"Comma-separated subset of {', '.join(GROUP_COLUMNS)}")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    group_by = [column.strip() for column in args.group_by.split(",") if column.strip()]
+    unknown = set(group_by) - set(GROUP_COLUMNS)
+    if unknown:
+        parser.error(f"Unknown group-by columns: {', '.join(sorted(unknown))}")
+    totals, rows, skipped = aggregate(args.inputs, group_by, args.chunk_rows, args.workers)
+    write_report(args.output, group_by, report_rows(totals))
+    logger.info(f"Aggregated {rows - skipped} trips into {len(totals)} groups in {args.output} "
+                f"({skipped} invalid rows skipped)")
@@ -0,0 +1 @@
+"""Load benchmarks for the API against replayed upstream responses (see run.py)"""
@@ -0,0 +1,289 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import random
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+
+# Upstream names used for latency settings and call counters
+NOMINATIM = "nominatim"
+OSRM = "osrm"
+GEMINI = "gemini"
+
+DEFAULT_LATENCY = {NOMINATIM: 0.02, OSRM: 0.05, GEMINI: 0.3}
+
+# Pre-encoded translated copies of each recorded route geometry
+ROUTE_VARIANTS = 16
+ROUTE_VARIANT_SPREAD_DEGREES = 2.0
+# Geocoded addresses are spread this far around the recorded result
+SEARCH_SPREAD_DEGREES = 0.5
+
+# (step name, intersection classes, speed km/h) cycled along synthetic routes
+SYNTHETIC_ROAD_MIX = [
+    ("NH48", ["motorway"], 80.0),
+    ("SH17", [], 55.0),
+    ("Station Road", [], 25.0),
+    ("Ring Road", ["trunk"], 65.0)
+]
+SYNTHETIC_TOWNS = ["Alibag", "Khopoli", "Lonavala", "Talegaon", "Chakan", "Shirur", "Ahmednagar", "Rahuri",
+                   "Kopargaon", "Malegaon", "Dhule", "Shirpur", "Sendhwa", "Julwania", "Dhamnod", "Manpur"]
+
+
+def _hash_unit(text: str) -> float:
+    """Deterministic value in [0, 1) for a string"""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big") / 2 ** 64
+
+
+def synthetic_route(start: tuple, end: tuple, points: int, seed: int = 0) -> Dict[str, Any]:
+    """OSRM /route response with a wiggly polyline of the given number of points between two (lat, lon)"""
+    rng = np.random.default_rng(seed)
+    (start_lat, start_lon), (end_lat, end_lon) = start, end
+    t = np.linspace(0.0, 1.0, points)
+    # Smooth lateral drift that returns to zero at both ends
+    drift = np.cumsum(rng.normal(0.0, 1.0, points))
+    drift = (drift - drift[0] - t * (drift[-1] - drift[0])) * 0.002
+    lons = start_lon + t * (end_lon - start_lon) - drift * (end_lat - start_lat)
+    lats = start_lat + t * (end_lat - start_lat) + drift * (end_lon - start_lon)
+    coordinates = np.column_stack([lons, lats]).round(6)
+
+    lat_rad = np.radians(coordinates[:, 1])
+    dlat = np.diff(lat_rad)
+    dlon = np.radians(np.diff(coordinates[:, 0]))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(dlon / 2) ** 2
+    leg_m = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+
+    step_count = max(1, min(len(leg_m) // 50, 400))
+    bounds = np.linspace(0, len(leg_m), step_count + 1).astype(int)
+    steps, leg_speed = [], np.empty(len(leg_m))
+    for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        name, classes, speed_kmh = SYNTHETIC_ROAD_MIX[i % len(SYNTHETIC_ROAD_MIX)]
+        distance = float(leg_m[lo:hi].sum())
+        leg_speed[lo:hi] = speed_kmh / 3.6
+        steps.append({
+            "distance": round(distance, 1),
+            "duration": round(distance / (speed_kmh / 3.6), 1),
+            "name": name,
+            "mode": "driving",
+            "geometry": {"coordinates": coordinates[lo:hi + 1].tolist()},
+            "intersections": [{"classes": classes}] if classes else [{}]
+        })
+    distance = float(leg_m.sum())
+    return {
+        "code": "Ok",
+        "routes": [{
+            "distance": round(distance, 1),
+            "duration": round(float((leg_m / leg_speed).sum()), 1),
+            "geometry": {"coordinates": coordinates.tolist()},
+            "legs": [{
+                "steps": steps,
+                "annotation": {
+                    "distance": leg_m.round(1).tolist(),
+                    "duration": (leg_m / leg_speed).round(1).tolist(),
+                    "speed": leg_speed.round(1).tolist()
+                }
+            }]
+        }]
+    }
+
+
+def synthetic_fixtures(routes: Dict[str, tuple], seed: int = 0) -> Dict[str, Any]:
+    """Fixture set with one synthetic route per name, mapped to (start, end, points)"""
+    rng = random.Random(seed)
+    return {
+        "search": [[{"lat": f"{18.5 + rng.random():.6f}", "lon": f"{73.0 + rng.random():.6f}",
+                     "display_name": f"{town}, Maharashtra, India"}] for town in SYNTHETIC_TOWNS],
+        "reverse": [{"address": {"city": town, "county": f"{town} Taluka", "state": "Maharashtra",
+                                 "country": "India"}} for town in SYNTHETIC_TOWNS],
+        "route": {name: synthetic_route(start, end, points, seed)
+                  for name, (start, end, points) in routes.items()},
+        "gemini": [json.dumps({"reasoning": f"<p>Synthetic reasoning {i}: diesel emits more CO2 than CNG on this "
+                                            f"route; hilly segments dominate the total.</p>"})
+                   for i in range(8)]
+    }
+
+
+def load_fixtures(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_fixtures(fixtures: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f)
+
+
+def upstream_of(url: httpx.URL) -> Optional[str]:
+    if "nominatim" in url.host:
+        return NOMINATIM
+    if url.path.startswith("/route/") or url.path.startswith("/table/"):
+        return OSRM
+    return None
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves Nominatim and OSRM calls from a fixture set after a simulated network delay"""
+
+    def __init__(self, fixtures: Dict[str, Any], route: str, latency: Optional[Dict[str, float]] = None,
+                 jitter: float = 0.0, seed: int = 0):
+        self.search = fixtures["search"]
+        self.reverse = fixtures["reverse"]
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls: Dict[str, int] = {NOMINATIM: 0, OSRM: 0}
+        self.route_variants = ReplayTransport.encode_route_variants(fixtures["route"][route])
+
+    @staticmethod
+    def encode_route_variants(response: Dict[str, Any], variants: int = ROUTE_VARIANTS) -> List[bytes]:
+        """JSON bodies of the route translated to different places, encoded once up front"""
+        route = response["routes"][0]
+        coordinates = np.asarray(route["geometry"]["coordinates"])
+        step_bounds = np.cumsum([0] + [len(step["geometry"]["coordinates"]) - 1 for step in route["legs"][0]["steps"]])
+        bodies = []
+        for i in range(variants):
+            angle = 2 * math.pi * i / variants
+            radius = ROUTE_VARIANT_SPREAD_DEGREES * (i + 1) / variants
+            shifted = (coordinates + [radius * math.cos(angle), radius * math.sin(angle)]).round(6)
+            steps = [{**step, "geometry": {"coordinates": shifted[lo:hi + 1].tolist()}}
+                     for step, lo, hi in zip(route["legs"][0]["steps"], step_bounds[:-1], step_bounds[1:])]
+            variant = {**route, "geometry": {"coordinates": shifted.tolist()},
+                       "legs": [{**route["legs"][0], "steps": steps}]}
+            bodies.append(json.dumps({**response, "routes": [variant]}).encode())
+        return bodies
+
+    def delay(self, upstream: str) -> float:
+        base = self.latency.get(upstream, 0.0)
+        if self.jitter > 0:
+            base *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        path, params = request.url.path, request.url.params
+        if path.endswith("/search"):
+            query = params.get("q", "")
+            results = self.search[int(_hash_unit(query) * len(self.search))]
+            if not results:
+                return httpx.Response(200, json=[])
+            # Spread addresses around the recorded result so each one geocodes differently
+            offset_lat = (_hash_unit(query + ":lat") - 0.5) * SEARCH_SPREAD_DEGREES
+            offset_lon = (_hash_unit(query + ":lon") - 0.5) * SEARCH_SPREAD_DEGREES
+            result = {**results[0], "lat": f"{float(results[0]['lat']) + offset_lat:.6f}",
+                      "lon": f"{float(results[0]['lon']) + offset_lon:.6f}"}
+            return httpx.Response(200, json=[result])
+        if path.endswith("/reverse"):
+            cell = f"{float(params['lat']):.1f},{float(params['lon']):.1f}"
+            return httpx.Response(200, json=self.reverse[int(_hash_unit(cell) * len(self.reverse))])
+        if path.startswith("/route/"):
+            body = self.route_variants[int(_hash_unit(path) * len(self.route_variants))]
+            return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+        return httpx.Response(404, json={"code": "NotFound"})
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream = upstream_of(request.url)
+        if upstream is not None:
+            self.calls[upstream] += 1
+            await asyncio.sleep(self.delay(upstream))
+        return self.respond(request)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to a real transport and keeps Nominatim and OSRM route responses as fixtures"""
+
+    def __init__(self, fixtures: Dict[str, Any], route: str,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.fixtures = fixtures
+        self.route = route
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        if response.status_code == 200:
+            data = json.loads(content)
+            path = request.url.path
+            if path.endswith("/search") and data:
+                self.fixtures.setdefault("search", []).append(data[:1])
+            elif path.endswith("/reverse") and "address" in data:
+                self.fixtures.setdefault("reverse", []).append(data)
+            elif path.startswith("/route/") and data.get("code") == "Ok":
+                # Alternatives are not replayed; keep the preferred route only
+                self.fixtures.setdefault("route", {})[self.route] = {**data, "routes": data["routes"][:1]}
+        # The body is already decoded, so drop the encoding headers
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length")]
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayModel:
+    """Stand-in for a Gemini GenerativeModel answering from recorded texts"""
+
+    def __init__(self, texts: List[str], latency: float, calls: Dict[str, int]):
+        self.texts = texts
+        self.latency = latency
+        self.calls = calls
+
+    async def generate_content_async(self, prompt: str, generation_config=None, stream: bool = False, **kwargs):
+        self.calls[GEMINI] = self.calls.get(GEMINI, 0) + 1
+        await asyncio.sleep(self.latency)
+        text = self.texts[int(_hash_unit(prompt) * len(self.texts))]
+        if stream:
+            html = next(iter(json.loads(text).values()))
+
+            async def chunks():
+                for i in range(0, len(html), 64):
+                    yield SimpleNamespace(text=html[i:i + 64])
+            return chunks()
+        part = SimpleNamespace(text=text)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+@contextlib.contextmanager
+def replay_gemini(texts: List[str], latency: float, calls: Dict[str, int]) -> Iterator[None]:
+    """Answer the Gemini provider's calls from recorded texts for the duration of the block"""
+    from reasoning import GEMINI, GeminiProvider, ReasoningService
+
+    class ReplayProvider(GeminiProvider):
+        async def create_model(self):
+            return ReplayModel(texts, latency, calls)
+
+    original = ReasoningService.providers[GEMINI]
+    ReasoningService.providers[GEMINI] = ReplayProvider()
+    try:
+        yield
+    finally:
+        ReasoningService.providers[GEMINI] = original
+
+
+@contextlib.contextmanager
+def record_gemini(fixtures: Dict[str, Any]) -> Iterator[None]:
+    """Keep the raw text of every (non-streaming) Gemini response made during the block"""
+    from reasoning import GEMINI, GeminiProvider, ReasoningService
+
+    class RecordingModel:
+        def __init__(self, model):
+            self.model = model
+
+        async def generate_content_async(self, *args, **kwargs):
+            response = await self.model.generate_content_async(*args, **kwargs)
+            if not kwargs.get("stream"):
+                fixtures.setdefault("gemini", []).append(response.candidates[0].content.parts[0].text)
+            return response
+
+    class RecordingProvider(GeminiProvider):
+        async def create_model(self):
+            return RecordingModel(await super().create_model())
+
+    original = ReasoningService.providers[GEMINI]
+    ReasoningService.providers[GEMINI] = RecordingProvider()
+    try:
+        yield
+    finally:
+        ReasoningService.providers[GEMINI] = original
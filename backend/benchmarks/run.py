@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import contextlib
+import inspect
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+import main
+from main import build_reasoning_data, compare_route_emissions, resolve_coordinates
+from metrics import start_request_timings
+from models import TripRequest
+from reasoning import ReasoningService
+from reasoning_jobs import InProcessReasoningQueue
+from route_service import RouteService
+from benchmarks.fixtures import (GEMINI, ReplayTransport, RecordingTransport, DEFAULT_LATENCY, load_fixtures,
+                                 record_gemini, replay_gemini, save_fixtures, synthetic_fixtures)
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+# Modules that must not be imported when the app starts; they load on first use
+LAZY_MODULES = ("google.generativeai",)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = (time.perf_counter() - start) * 1000\n"
+    "print(json.dumps({'import_ms': elapsed, 'eager_modules': [m for m in %r if m in sys.modules]}))\n"
+)
+
+
+@dataclass
+class Scenario:
+    name: str
+    endpoint: str
+    origin: str
+    destination: str
+    # Synthetic route: (lat, lon) endpoints and number of geometry points
+    route_start: tuple
+    route_end: tuple
+    route_points: int
+    requests: int
+    concurrency: int
+    trips_per_request: int = 1
+    reasoning: bool = True
+    reasoning_provider: Optional[str] = None
+
+
+SCENARIOS = {
+    "urban": Scenario("urban", "/calculate-trip", "Andheri, Mumbai", "Bandra Kurla Complex, Mumbai",
+                      (19.119, 72.847), (19.066, 72.868), 400, requests=200, concurrency=20),
+    "long_haul": Scenario("long_haul", "/calculate-trip", "Mumbai, India", "Delhi, India",
+                          (19.076, 72.878), (28.614, 77.209), 60000, requests=30, concurrency=5),
+    "heatmap": Scenario("heatmap", "/city-emissions-heatmap", "Mumbai, India", "Delhi, India",
+                        (19.076, 72.878), (28.614, 77.209), 60000, requests=30, concurrency=5, reasoning=False),
+    "batch": Scenario("batch", "/calculate-trips/batch", "Mumbai, India", "Pune, India",
+                      (19.076, 72.878), (18.520, 73.857), 3000, requests=10, concurrency=2, trips_per_request=25),
+    "batch_template": Scenario("batch_template", "/calculate-trips/batch", "Mumbai, India", "Pune, India",
+                               (19.076, 72.878), (18.520, 73.857), 3000, requests=10, concurrency=2,
+                               trips_per_request=25, reasoning_provider="template")
+}
+
+
+def trip_body(scenario: Scenario, i: Optional[int]) -> Dict[str, Any]:
+    """Trip request; numbered addresses geocode (and so route) differently, None keeps the real ones"""
+    suffix = "" if i is None else f" #{i}"
+    body = {
+        "start_location": {"address": scenario.origin + suffix},
+        "end_location": {"address": scenario.destination + suffix},
+        "vehicle_type": "truck",
+        "fuel_type": "diesel_b7",
+        "load_weight": 1000 + (i or 0) % 8 * 500,
+        "reasoning_mode": "inline" if scenario.reasoning else "off"
+    }
+    if scenario.reasoning_provider:
+        body["reasoning_provider"] = scenario.reasoning_provider
+    return body
+
+
+def request_body(scenario: Scenario, i: Optional[int]) -> Dict[str, Any]:
+    if scenario.trips_per_request == 1:
+        return trip_body(scenario, i)
+    base = 0 if i is None else i * scenario.trips_per_request
+    return {
+        "trips": [trip_body(scenario, None if i is None else base + j) for j in range(scenario.trips_per_request)],
+        "include_reasoning": scenario.reasoning
+    }
+
+
+def measure_startup(runs: int = 3) -> Dict[str, Any]:
+    """Fastest wall time of "import main" over fresh interpreters, and any lazy modules it loaded"""
+    best: Optional[Dict[str, Any]] = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-c", IMPORT_PROBE % (LAZY_MODULES,)], cwd=BACKEND_DIR,
+                                   capture_output=True, text=True, check=True)
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or probe["import_ms"] < best["import_ms"]:
+            best = probe
+    best["import_ms"] = round(best["import_ms"], 1)
+    return best
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+    values = np.percentile(samples, PERCENTILES)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+
+
+@contextlib.asynccontextmanager
+async def bench_client(transport: httpx.AsyncBaseTransport) -> AsyncIterator[tuple]:
+    """API client talking to the app in-process, with every upstream call going through transport"""
+    # Replayed upstreams are not the public Nominatim, so its throttle would only measure itself
+    route_service = RouteService(http_client=httpx.AsyncClient(transport=transport), nominatim_rate_limit=0)
+    await route_service.startup()
+    reasoning_jobs = InProcessReasoningQueue(workers=2, max_queue_size=1000, result_ttl_seconds=60)
+    await reasoning_jobs.start()
+    main.app.state.route_service = route_service
+    main.app.state.reasoning_jobs = reasoning_jobs
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                     timeout=None) as client:
+            yield client, route_service
+    finally:
+        await reasoning_jobs.stop()
+        await route_service.shutdown()
+
+
+async def run_load(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send requests with bounded concurrency; latency percentiles overall and per stage"""
+    latencies: List[float] = []
+    stage_ms: Dict[str, List[float]] = {}
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in pending:
+            # The app copies this context into its tasks, so its stage timers add to this dict
+            timings = start_request_timings()
+            start = time.perf_counter()
+            response = await client.post(scenario.endpoint, json=request_body(scenario, i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+                logger.warning(f"{scenario.name}: HTTP {response.status_code} {response.text[:200]}")
+            for name, ms in timings.items():
+                stage_ms.setdefault(name, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "stages": {name: {"latency_ms": percentiles(samples)} for name, samples in sorted(stage_ms.items())}
+    }
+
+
+async def profile_memory(client: httpx.AsyncClient, route_service: RouteService,
+                         scenario: Scenario) -> Dict[str, float]:
+    """Peak traced allocations (KiB) of a whole request and of each stage of one trip, run step by step"""
+    peaks: Dict[str, float] = {}
+
+    async def measure(name: str, fn: Callable[[], Any]) -> Any:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        if inspect.isawaitable(result):
+            result = await result
+        peaks[name] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+        return result
+
+    async def collect_cities(route_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [city async for _, city in route_service.iter_route_cities(route_data)]
+
+    trip = TripRequest(**trip_body(scenario, -1))
+    tracemalloc.start()
+    try:
+        await measure("request", lambda: client.post(scenario.endpoint, json=request_body(scenario, -2)))
+        start, end = await measure("geocode", lambda: asyncio.gather(
+            resolve_coordinates(trip.start_location, route_service),
+            resolve_coordinates(trip.end_location, route_service)
+        ))
+        route_data = await measure("route", lambda: route_service.fetch_route(start, end))
+        route_data["cities"] = await measure("cities", lambda: collect_cities(route_data))
+        await measure("emissions", lambda: compare_route_emissions(trip, route_data["cities"]).fuel_comparisons(
+            trip.vehicle_type, trip.fuel_type
+        ))
+        if scenario.reasoning:
+            await measure("reasoning", lambda: ReasoningService.generate_reasoning(
+                build_reasoning_data(trip, route_data)
+            ))
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+async def run_scenario(scenario: Scenario, fixtures: Dict[str, Any], latency: Dict[str, float], jitter: float,
+                       requests: Optional[int], concurrency: Optional[int]) -> Dict[str, Any]:
+    transport = ReplayTransport(fixtures, scenario.name, latency, jitter)
+    gemini_calls: Dict[str, int] = {}
+    with replay_gemini(fixtures["gemini"], latency[GEMINI], gemini_calls):
+        async with bench_client(transport) as (client, route_service):
+            result = await run_load(client, scenario, requests or scenario.requests,
+                                    concurrency or scenario.concurrency)
+            upstream_calls = {**transport.calls, **gemini_calls}
+            memory = await profile_memory(client, route_service, scenario)
+    result["upstream_calls"] = upstream_calls
+    result["peak_memory_kib"] = memory.pop("request")
+    for name, peak in memory.items():
+        result["stages"].setdefault(name, {})["peak_memory_kib"] = peak
+    return result
+
+
+async def record(scenarios: List[Scenario], path: str) -> None:
+    """Run each scenario once against the live services and save their responses as fixtures"""
+    fixtures: Dict[str, Any] = {}
+    with record_gemini(fixtures):
+        for scenario in scenarios:
+            async with bench_client(RecordingTransport(fixtures, scenario.name)) as (client, _):
+                response = await client.post(scenario.endpoint, json=request_body(scenario, None))
+                print(f"{scenario.name}: HTTP {response.status_code}")
+    missing = [key for key in ("search", "reverse", "route", "gemini") if not fixtures.get(key)]
+    if missing:
+        logger.warning(f"Nothing recorded for {', '.join(missing)}; replaying those will fail")
+    save_fixtures(fixtures, path)
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """p95 latency, throughput and peak memory changes beyond tolerance, per scenario and stage"""
+    regressions = []
+
+    def check(label: str, current: float, previous: float, higher_is_worse: bool = True) -> None:
+        if previous <= 0:
+            return
+        change = (current - previous) / previous
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append(f"{label}: {previous} -> {current} ({change:+.0%})")
+
+    if "startup" in results and "startup" in baseline:
+        check("startup import ms", results["startup"]["import_ms"], baseline["startup"]["import_ms"])
+    for name, result in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        check(f"{name} p95 latency ms", result["latency_ms"]["p95"], previous["latency_ms"]["p95"])
+        check(f"{name} requests/s", result["requests_per_second"], previous["requests_per_second"], False)
+        check(f"{name} peak memory KiB", result["peak_memory_kib"], previous["peak_memory_kib"])
+        for stage, stats in result["stages"].items():
+            previous_stage = previous["stages"].get(stage, {})
+            if "latency_ms" in stats and "latency_ms" in previous_stage:
+                check(f"{name}/{stage} p95 ms", stats["latency_ms"]["p95"], previous_stage["latency_ms"]["p95"])
+            if "peak_memory_kib" in stats and "peak_memory_kib" in previous_stage:
+                check(f"{name}/{stage} peak memory KiB", stats["peak_memory_kib"], previous_stage["peak_memory_kib"])
+    return regressions
+
+
+def print_report(results: Dict[str, Any], import_budget_ms: float) -> None:
+    startup = results["startup"]
+    budget = f" (budget {import_budget_ms:g} ms)" if import_budget_ms > 0 else ""
+    print(f"startup: import main {startup['import_ms']} ms{budget}")
+    if startup["eager_modules"]:
+        print(f"  imported at startup, should be lazy: {', '.join(startup['eager_modules'])}")
+    if not results["scenarios"]:
+        return
+    header = f"{'scenario/stage':<22}{'reqs':>6}{'err':>5}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>11}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        print(f"{name:<22}{result['requests']:>6}{result['errors']:>5}{result['requests_per_second']:>9}"
+              f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}{result['peak_memory_kib']:>11}")
+        for stage, stats in result["stages"].items():
+            latency = stats.get("latency_ms", {})
+            print(f"  {stage:<20}{'':>20}{latency.get('p50', '-'):>10}{latency.get('p95', '-'):>10}"
+                  f"{latency.get('p99', '-'):>10}{stats.get('peak_memory_kib', '-'):>11}")
+        calls = ", ".join(f"{upstream}={count}" for upstream, count in result["upstream_calls"].items())
+        print(f"  upstream calls: {calls}")
+
+
+def parse_latency(text: str) -> Dict[str, float]:
+    latency = dict(DEFAULT_LATENCY)
+    for item in filter(None, text.split(",")):
+        upstream, _, seconds = item.partition("=")
+        if upstream not in DEFAULT_LATENCY:
+            raise argparse.ArgumentTypeError(f"Unknown upstream '{upstream}' (expected one of {', '.join(DEFAULT_LATENCY)})")
+        latency[upstream] = float(seconds)
+    return latency
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the API against replayed upstream responses")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, help="Requests per scenario (default: per scenario)")
+    parser.add_argument("--concurrency", type=int, help="Concurrent clients (default: per scenario)")
+    parser.add_argument("--latency", type=parse_latency, default=dict(DEFAULT_LATENCY),
+                        help="Injected upstream latency in seconds, e.g. nominatim=0.05,osrm=0.1,gemini=1.0")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Latency jitter as a fraction of the latency")
+    parser.add_argument("--fixtures", help="Recorded fixtures JSON (default: synthetic fixtures)")
+    parser.add_argument("--record", metavar="PATH", help="Record live responses for the scenarios to PATH and exit")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--import-budget-ms", type=float, default=1000.0,
+                        help="Fail when importing the app takes longer (default 1000; 0 disables)")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    scenarios = [SCENARIOS[name] for name in names]
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.record:
+        asyncio.run(record(scenarios, args.record))
+        return 0
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        fixtures = synthetic_fixtures({s.name: (s.route_start, s.route_end, s.route_points) for s in scenarios})
+    results = {"startup": measure_startup(), "scenarios": {}}
+    for scenario in scenarios:
+        results["scenarios"][scenario.name] = asyncio.run(run_scenario(scenario, fixtures, args.latency, args.jitter,
+                                                                       args.requests, args.concurrency))
+    print_report(results, args.import_budget_ms)
+    startup = results["startup"]
+    failed = bool(startup["eager_modules"]) or 0 < args.import_budget_ms < startup["import_ms"]
+    if failed:
+        print("STARTUP over budget or importing lazy modules eagerly")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
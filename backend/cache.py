@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """In-memory cache with least-recently-used eviction and optional per-entry TTL
+
+    When max_weight and weigher are given, entries are also evicted until the
+    summed weight (e.g. an estimate of bytes held) fits within max_weight.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 max_weight: Optional[int] = None, weigher: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries when full"""
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.time() + ttl if ttl else None
+        weight = self.weigher(value) if self.weigher else 0
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, expires_at, weight)
+            self.weight += weight
+            while len(self._data) > self.max_entries or (
+                    self.max_weight is not None and self.weight > self.max_weight and len(self._data) > 1):
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk cache tier backed by SQLite; values are stored as JSON
+
+    Writes are buffered and committed in batches by a background thread, so
+    set() never waits for the disk; get() sees buffered writes immediately.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, flush_interval: float = 0.25):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last commits, not corrupt
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.commit()
+        # key -> (JSON value, expires_at), or None for a pending delete
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._writer = threading.Thread(target=self._write_behind, name=f"cache-writer-{namespace}", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._pending_lock:
+            pending = key in self._pending
+            row = self._pending.get(key)
+        if not pending:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Buffer a JSON-serializable value for the next batched write"""
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.time() + ttl if ttl else None
+        self._enqueue(key, (json.dumps(value), expires_at))
+
+    def delete(self, key: str) -> None:
+        self._enqueue(key, None)
+
+    def _enqueue(self, key: str, entry: Optional[tuple]) -> None:
+        with self._pending_lock:
+            self._pending[key] = entry
+        self._wake.set()
+
+    def flush(self) -> None:
+        """Write all buffered sets and deletes in one transaction"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts = [(self.namespace, key, entry[0], entry[1]) for key, entry in pending.items() if entry is not None]
+        deletes = [(self.namespace, key) for key, entry in pending.items() if entry is None]
+        with self._lock:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)", upserts
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", deletes)
+            if upserts and self.max_entries:
+                # Rows are rewritten on every set, so the lowest rowids are the oldest writes
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND rowid NOT IN ("
+                    "SELECT rowid FROM cache WHERE namespace = ? ORDER BY rowid DESC LIMIT ?)",
+                    (self.namespace, self.namespace, self.max_entries)
+                )
+            self._conn.commit()
+
+    def _write_behind(self) -> None:
+        while not self._closing.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # Let more writes accumulate so they share one commit (close() cuts the wait short)
+            self._closing.wait(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed for {self.namespace}: {e}")
+
+    def purge_expired(self) -> int:
+        """Delete expired rows in this namespace and return how many were removed"""
+        self.flush()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (self.namespace, time.time())
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        """Write what is still buffered and close the connection"""
+        self._closing.set()
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """Memory LRU tier in front of an optional SQLite tier, with hit/miss counters
+
+    Only the memory tier is used on the event loop: disk reads run in a worker
+    thread and disk writes are batched by the SQLite tier's writer thread.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 disk_path: Optional[str] = None, max_disk_entries: Optional[int] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = SQLiteCache(disk_path, namespace=name, ttl_seconds=ttl_seconds,
+                                        max_entries=max_disk_entries)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache disabled for {name}: {e}")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look the key up in memory, then on disk (promoting disk hits to memory)"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache read failed for {self.name}: {e}")
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store the value in memory and queue it for the disk tier"""
+        self.memory.set(key, value, ttl_seconds)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl_seconds)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Disk cache write failed for {self.name}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "disk_enabled": self.disk is not None
+        }
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+
+
+class SingleFlight:
+    """Deduplicate concurrent async calls: callers with the same key share one in-flight call"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the already running call for the same key"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,123 @@
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+# Reverse geocoding (Nominatim)
+REVERSE_GEOCODE_CONCURRENCY = _env_int("REVERSE_GEOCODE_CONCURRENCY", 5)
+# Nominatim's public usage policy allows at most 1 request per second; 0 disables throttling (own instances)
+NOMINATIM_MAX_REQUESTS_PER_SECOND = _env_float("NOMINATIM_MAX_REQUESTS_PER_SECOND", 1.0)
+
+# Geocode / reverse-geocode cache
+GEOCODE_CACHE_SIZE = _env_int("GEOCODE_CACHE_SIZE", 10000)
+GEOCODE_CACHE_TTL_SECONDS = _env_float("GEOCODE_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+REVERSE_GEOCODE_CACHE_TTL_SECONDS = _env_float("REVERSE_GEOCODE_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+# SQLite file for the persistent cache tier; leave empty to keep the cache in memory only
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "")
+# Reverse geocodes are cached per grid cell of 360 / 2 ** (zoom + levels) degrees
+REVERSE_GEOCODE_GRID_LEVELS = _env_int("REVERSE_GEOCODE_GRID_LEVELS", 2)
+# Directory built with places_index.py; route points are resolved offline first and Nominatim only on a miss
+PLACES_INDEX_PATH = os.getenv("PLACES_INDEX_PATH", "")
+
+# Shared outbound HTTP client
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = _env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = _env_float("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30.0)
+# HTTP/2 is only used when the optional h2 package is installed
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "true").lower() in ("1", "true", "yes")
+# Nominatim's usage policy requires an identifying User-Agent
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "GreenRoute/1.0")
+
+# Per-upstream timeouts
+NOMINATIM_SEARCH_TIMEOUT_SECONDS = _env_float("NOMINATIM_SEARCH_TIMEOUT_SECONDS", 5.0)
+NOMINATIM_REVERSE_TIMEOUT_SECONDS = _env_float("NOMINATIM_REVERSE_TIMEOUT_SECONDS", 3.0)
+OSRM_TIMEOUT_SECONDS = _env_float("OSRM_TIMEOUT_SECONDS", 10.0)
+GEMINI_TIMEOUT_SECONDS = _env_float("GEMINI_TIMEOUT_SECONDS", 30.0)
+
+# Upstream resilience: after CIRCUIT_BREAKER_FAILURE_THRESHOLD consecutive failures an upstream is
+# skipped (failing fast) for CIRCUIT_BREAKER_RESET_SECONDS, then probed with a single call
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = _env_int("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+CIRCUIT_BREAKER_RESET_SECONDS = _env_float("CIRCUIT_BREAKER_RESET_SECONDS", 30.0)
+# Time budget shared by all upstream calls of one request (per trip in batches); 0 disables
+REQUEST_DEADLINE_SECONDS = _env_float("REQUEST_DEADLINE_SECONDS", 20.0)
+# Send a duplicate OSRM request when the first has not answered after this long; 0 disables.
+# Nominatim is never hedged: its usage policy forbids the extra load
+OSRM_HEDGE_DELAY_SECONDS = _env_float("OSRM_HEDGE_DELAY_SECONDS", 0.0)
+
+# Routing engine: "osrm" (HTTP server) or "local" (in-process graph built with local_router.py)
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm").lower()
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "http://router.project-osrm.org")
+LOCAL_ROUTING_GRAPH_PATH = os.getenv("LOCAL_ROUTING_GRAPH_PATH", "")
+
+# Route segmentation: routes are split into equal-distance segments, one city lookup each
+ROUTE_MAX_SEGMENTS = _env_int("ROUTE_MAX_SEGMENTS", 10)
+ROUTE_MIN_SEGMENT_KM = _env_float("ROUTE_MIN_SEGMENT_KM", 5.0)
+
+# Elevation: directory of SRTM .hgt tiles used to derive terrain from grade; empty uses address keywords
+ELEVATION_DATA_PATH = os.getenv("ELEVATION_DATA_PATH", "")
+ELEVATION_TILE_CACHE_SIZE = _env_int("ELEVATION_TILE_CACHE_SIZE", 64)
+
+# Route alternatives: upper bound on routes compared per /route-alternatives request
+ROUTE_ALTERNATIVES_MAX = _env_int("ROUTE_ALTERNATIVES_MAX", 5)
+
+# Distance matrices: routing-engine table requests cover at most BLOCK_SIZE sources x BLOCK_SIZE destinations
+# (the public OSRM server accepts 100 coordinates per table request)
+ROUTE_TABLE_BLOCK_SIZE = _env_int("ROUTE_TABLE_BLOCK_SIZE", 50)
+ROUTE_TABLE_CONCURRENCY = _env_int("ROUTE_TABLE_CONCURRENCY", 4)
+ROUTE_TABLE_CACHE_SIZE = _env_int("ROUTE_TABLE_CACHE_SIZE", 2000)
+
+# Emission matrix: maximum origins (and destinations) per /emission-matrix request, and for format=json
+EMISSION_MATRIX_MAX_POINTS = _env_int("EMISSION_MATRIX_MAX_POINTS", 1000)
+EMISSION_MATRIX_MAX_JSON_POINTS = _env_int("EMISSION_MATRIX_MAX_JSON_POINTS", 200)
+
+# Tour optimization: stop limit, default search time, and independent starts run in a process pool
+TOUR_MAX_STOPS = _env_int("TOUR_MAX_STOPS", 500)
+TOUR_TIME_BUDGET_SECONDS = _env_float("TOUR_TIME_BUDGET_SECONDS", 2.0)
+TOUR_STARTS = _env_int("TOUR_STARTS", 1)
+TOUR_WORKERS = _env_int("TOUR_WORKERS", 1)
+
+# Metrics: Prometheus histograms on /metrics; when disabled, stage timers are no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Batch trip calculation
+BATCH_MAX_CONCURRENCY = _env_int("BATCH_MAX_CONCURRENCY", 8)
+
+# Reasoning provider: "gemini" (LLM, SDK loaded on first use), "template" (local, from the computed figures) or "off"
+REASONING_PROVIDER = os.getenv("REASONING_PROVIDER", "gemini").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Background reasoning jobs
+REASONING_JOB_WORKERS = _env_int("REASONING_JOB_WORKERS", 2)
+REASONING_JOB_QUEUE_SIZE = _env_int("REASONING_JOB_QUEUE_SIZE", 100)
+REASONING_JOB_TTL_SECONDS = _env_float("REASONING_JOB_TTL_SECONDS", 3600)
+
+# Reasoning (LLM output) cache
+REASONING_CACHE_SIZE = _env_int("REASONING_CACHE_SIZE", 1000)
+REASONING_CACHE_TTL_SECONDS = _env_float("REASONING_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+# SQLite file for the persistent reasoning cache tier; leave empty to keep it in memory only
+REASONING_CACHE_PATH = os.getenv("REASONING_CACHE_PATH", "")
+REASONING_CACHE_DISK_MAX_ENTRIES = _env_int("REASONING_CACHE_DISK_MAX_ENTRIES", 10000)
+# Decimal places distances are rounded to before hashing, so near-identical trips share an entry
+REASONING_CACHE_DISTANCE_PRECISION = _env_int("REASONING_CACHE_DISTANCE_PRECISION", 0)
+
+# Route cache
+ROUTE_CACHE_SIZE = _env_int("ROUTE_CACHE_SIZE", 1000)
+ROUTE_CACHE_TTL_SECONDS = _env_float("ROUTE_CACHE_TTL_SECONDS", 24 * 3600)
+ROUTE_CACHE_MAX_MB = _env_float("ROUTE_CACHE_MAX_MB", 256)
+# Origin/destination coordinates are snapped to this many decimals (4 ~ 11 m) to form the route id
+ROUTE_CACHE_COORD_PRECISION = _env_int("ROUTE_CACHE_COORD_PRECISION", 4)
@@ -0,0 +1,65 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371  # Earth's radius in km
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized haversine distance in km between arrays of points given in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class PolylineDistance:
+    """Cumulative-distance index over a GeoJSON [lon, lat] polyline
+
+    The coordinate list is converted to an array once and a prefix sum of
+    leg lengths is built, so any segment distance is a single subtraction.
+    """
+
+    def __init__(self, coordinates: Sequence[Sequence[float]]):
+        points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.lon = points[:, 0]
+        self.lat = points[:, 1]
+        if len(points) > 1:
+            legs = haversine_km(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:])
+        else:
+            legs = np.zeros(0)
+        self.legs = legs
+        self.cumulative = np.concatenate(([0.0], np.cumsum(legs)))
+
+    def __len__(self) -> int:
+        return len(self.cumulative)
+
+    @property
+    def total(self) -> float:
+        """Total length of the polyline in km"""
+        return float(self.cumulative[-1])
+
+    def segment(self, start_idx: int, end_idx: int) -> float:
+        """Distance in km between two point indices (0 for out-of-range or empty segments)"""
+        if start_idx >= len(self) or end_idx >= len(self) or end_idx <= start_idx:
+            return 0.0
+        return float(self.cumulative[end_idx] - self.cumulative[max(start_idx, 0)])
+
+    def segments(self, boundaries: Sequence[int]) -> List[float]:
+        """Distances between consecutive boundary indices, computed in one vectorized pass"""
+        idx = np.clip(np.asarray(boundaries, dtype=np.int64), 0, len(self) - 1)
+        return np.diff(self.cumulative[idx]).tolist()
+
+    def interpolate(self, distances: Sequence[float]) -> np.ndarray:
+        """[lon, lat] points at the given distances (km) along the polyline, linearly interpolated"""
+        distances = np.clip(np.asarray(distances, dtype=np.float64), 0.0, self.total)
+        if len(self) < 2:
+            return np.column_stack([np.full(len(distances), self.lon[0]), np.full(len(distances), self.lat[0])])
+        idx = np.clip(np.searchsorted(self.cumulative, distances, side="right") - 1, 0, len(self) - 2)
+        legs = self.legs[idx]
+        fraction = np.divide(distances - self.cumulative[idx], legs, out=np.zeros_like(legs), where=legs > 0)
+        lon = self.lon[idx] + fraction * (self.lon[idx + 1] - self.lon[idx])
+        lat = self.lat[idx] + fraction * (self.lat[idx + 1] - self.lat[idx])
+        return np.column_stack([lon, lat])
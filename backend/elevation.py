@@ -0,0 +1,160 @@
+import logging
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cache import LRUCache
+from distance import PolylineDistance
+from models import TerrainType
+
+
+logger = logging.getLogger(__name__)
+
+HGT_VOID = -32768
+
+# Mean absolute grade (%) above which a segment counts as hilly / mountainous
+HILLY_MIN_GRADE_PERCENT = 1.0
+MOUNTAINOUS_MIN_GRADE_PERCENT = 3.0
+
+# Elevation is resampled every SAMPLE_SPACING_M along the route and smoothed over
+# SMOOTHING_WINDOW samples, so DEM noise is not counted as climbing
+SAMPLE_SPACING_M = 200
+SMOOTHING_WINDOW = 5
+MAX_SAMPLES = 20000
+
+# Segments with less DEM coverage than this keep their address-based terrain
+MIN_COVERAGE = 0.5
+
+
+class ElevationModel:
+    """Vectorized bilinear elevation lookups over a directory of SRTM .hgt tiles (N19E072.hgt), memory-mapped"""
+
+    def __init__(self, directory: str, max_tiles: int = 64):
+        self.directory = directory
+        # Missing tiles are cached as False so the filesystem is not probed again
+        self.tiles = LRUCache(max_entries=max_tiles)
+
+    @staticmethod
+    def tile_name(lat_floor: int, lon_floor: int) -> str:
+        return (f"{'N' if lat_floor >= 0 else 'S'}{abs(lat_floor):02d}"
+                f"{'E' if lon_floor >= 0 else 'W'}{abs(lon_floor):03d}.hgt")
+
+    def tile(self, lat_floor: int, lon_floor: int) -> Optional[np.ndarray]:
+        """Memory-mapped height grid of a tile (row 0 is the northern edge), or None if not available"""
+        name = ElevationModel.tile_name(lat_floor, lon_floor)
+        grid = self.tiles.get(name)
+        if grid is None:
+            path = os.path.join(self.directory, name)
+            grid = False
+            if os.path.exists(path):
+                size = int(math.isqrt(os.path.getsize(path) // 2))
+                try:
+                    grid = np.memmap(path, dtype=">i2", mode="r", shape=(size, size))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not open elevation tile {path}: {e}")
+            self.tiles.set(name, grid)
+        return grid if grid is not False else None
+
+    def sample(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """Elevations in metres at the given points; NaN where no tile or a void covers the point"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        heights = np.full(lats.shape, np.nan)
+        lat_floor = np.floor(lats).astype(np.int64)
+        lon_floor = np.floor(lons).astype(np.int64)
+        tile_keys = lat_floor * 1000 + lon_floor
+
+        for key in np.unique(tile_keys):
+            mask = tile_keys == key
+            tile_lat, tile_lon = int(lat_floor[mask][0]), int(lon_floor[mask][0])
+            grid = self.tile(tile_lat, tile_lon)
+            if grid is None:
+                continue
+            size = grid.shape[0]
+            rows = (tile_lat + 1 - lats[mask]) * (size - 1)
+            cols = (lons[mask] - tile_lon) * (size - 1)
+            r0 = np.clip(np.floor(rows).astype(np.int64), 0, size - 2)
+            c0 = np.clip(np.floor(cols).astype(np.int64), 0, size - 2)
+            fr = rows - r0
+            fc = cols - c0
+            corners = np.stack([grid[r0, c0], grid[r0, c0 + 1], grid[r0 + 1, c0], grid[r0 + 1, c0 + 1]])
+            corners = np.where(corners == HGT_VOID, np.nan, corners.astype(np.float64))
+            heights[mask] = (corners[0] * (1 - fr) * (1 - fc) + corners[1] * (1 - fr) * fc
+                             + corners[2] * fr * (1 - fc) + corners[3] * fr * fc)
+        return heights
+
+
+class TerrainProfile:
+    """Cumulative climb and descent along a route polyline, from resampled DEM elevations"""
+
+    def __init__(self, positions_km: np.ndarray, elevations_m: np.ndarray):
+        self.positions_km = positions_km
+        self.elevations_m = elevations_m
+        rise = np.diff(elevations_m)
+        valid = ~np.isnan(rise)
+        self.cumulative_climb = np.concatenate(([0.0], np.cumsum(np.where(valid & (rise > 0), rise, 0.0))))
+        self.cumulative_descent = np.concatenate(([0.0], np.cumsum(np.where(valid & (rise < 0), -rise, 0.0))))
+        self.cumulative_covered = np.concatenate(([0.0], np.cumsum(np.where(valid, np.diff(positions_km), 0.0))))
+
+    @property
+    def total(self) -> float:
+        return float(self.positions_km[-1])
+
+    @classmethod
+    def from_coordinates(cls, model: ElevationModel, coordinates: List[List[float]]) -> Optional["TerrainProfile"]:
+        """Sample a [lon, lat] polyline at regular spacing; None if it is degenerate"""
+        return cls.from_polyline(model, PolylineDistance(coordinates))
+
+    @classmethod
+    def from_polyline(cls, model: ElevationModel, polyline: PolylineDistance) -> Optional["TerrainProfile"]:
+        """Sample an indexed route polyline at regular spacing; None if it is degenerate"""
+        if len(polyline) < 2 or polyline.total <= 0:
+            return None
+        count = int(min(MAX_SAMPLES, max(2, math.ceil(polyline.total * 1000 / SAMPLE_SPACING_M) + 1)))
+        positions = np.linspace(0.0, polyline.total, count)
+        points = polyline.interpolate(positions)
+        elevations = model.sample(points[:, 1], points[:, 0])
+        return cls(positions, smooth(elevations, SMOOTHING_WINDOW))
+
+    def segments(self, boundaries_km: Sequence[float]) -> List[Optional[Dict[str, float]]]:
+        """climb_m / descent_m between consecutive boundaries; None where DEM coverage is too sparse"""
+        boundaries = np.asarray(boundaries_km, dtype=np.float64)
+        climb = np.diff(np.interp(boundaries, self.positions_km, self.cumulative_climb))
+        descent = np.diff(np.interp(boundaries, self.positions_km, self.cumulative_descent))
+        covered = np.diff(np.interp(boundaries, self.positions_km, self.cumulative_covered))
+        lengths = np.diff(boundaries)
+        result = []
+        for climb_m, descent_m, covered_km, length_km in zip(climb, descent, covered, lengths):
+            if length_km <= 0 or covered_km < MIN_COVERAGE * length_km:
+                result.append(None)
+                continue
+            # Extrapolate partially covered segments to their full length
+            scale = length_km / covered_km
+            result.append({"climb_m": float(climb_m * scale), "descent_m": float(descent_m * scale)})
+        return result
+
+
+def smooth(values: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average that ignores NaNs and keeps gaps as NaN"""
+    if window <= 1 or len(values) < window:
+        return values
+    valid = ~np.isnan(values)
+    kernel = np.ones(window)
+    sums = np.convolve(np.where(valid, values, 0.0), kernel, mode="same")
+    counts = np.convolve(valid.astype(np.float64), kernel, mode="same")
+    return np.where(valid, sums / np.maximum(counts, 1), np.nan)
+
+
+def average_grade_percent(climb_m: float, descent_m: float, distance_km: float) -> float:
+    """Mean absolute grade over a segment"""
+    return (climb_m + descent_m) / (distance_km * 1000) * 100 if distance_km > 0 else 0.0
+
+
+def terrain_for_grade(grade_percent: float) -> TerrainType:
+    if grade_percent >= MOUNTAINOUS_MIN_GRADE_PERCENT:
+        return TerrainType.MOUNTAINOUS
+    if grade_percent >= HILLY_MIN_GRADE_PERCENT:
+        return TerrainType.HILLY
+    return TerrainType.FLAT
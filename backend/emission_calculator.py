@@ -1,4 +1,10 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
 from models import FuelType, VehicleType, EMISSION_FACTORS, EmissionBreakdown, TerrainType, RoadType
+from models import CityEmission, FuelComparison, VehicleComparison
 
 
 # Terrain and road type multipliers
@@ -16,6 +22,38 @@ ROAD_TYPE_MULTIPLIERS = {
 
 # Load weight impact (additional gCO2/km per kg of load)
 LOAD_WEIGHT_FACTOR = 0.05
+
+# Enum ordinals used to index the precomputed factor table
+VEHICLE_TYPES = list(VehicleType)
+FUEL_TYPES = list(FuelType)
+TERRAIN_TYPES = list(TerrainType)
+ROAD_TYPES = list(RoadType)
+VEHICLE_INDEX = {vehicle: i for i, vehicle in enumerate(VEHICLE_TYPES)}
+FUEL_INDEX = {fuel: i for i, fuel in enumerate(FUEL_TYPES)}
+TERRAIN_INDEX = {terrain: i for i, terrain in enumerate(TERRAIN_TYPES)}
+ROAD_INDEX = {road: i for i, road in enumerate(ROAD_TYPES)}
+
+# Component axis of the factor table and of the emission arrays
+TTW, WTT, WTW = 0, 1, 2
+
+
+def build_factor_table() -> np.ndarray:
+    """Combined gCO2/km with terrain and road multipliers applied
+
+    Shape is (vehicle, fuel, terrain, road, 2), the last axis holding TTW and WTT.
+    """
+    base = np.array([
+        [[EMISSION_FACTORS[vehicle][fuel]["ttw"], EMISSION_FACTORS[vehicle][fuel]["wtt"]] for fuel in FUEL_TYPES]
+        for vehicle in VEHICLE_TYPES
+    ], dtype=np.float64)
+    terrain = np.array([TERRAIN_MULTIPLIERS[terrain] for terrain in TERRAIN_TYPES], dtype=np.float64)
+    road = np.array([ROAD_TYPE_MULTIPLIERS[road] for road in ROAD_TYPES], dtype=np.float64)
+    return base[:, :, None, None, :] * terrain[None, None, :, None, None] * road[None, None, None, :, None]
+
+
+FACTOR_TABLE = build_factor_table()
+
+
 class EmissionCalculator:
     """Service for CO2 emission calculations based on ISO 14083 and GLEC Framework"""
     
@@ -49,3 +87,210 @@ class EmissionCalculator:
             wtt_kg=base_emission.wtt_kg * multiplier,
             wtw_kg=(base_emission.ttw_kg + base_emission.wtt_kg) * multiplier + load_addition_kg
         )
+    
+    @staticmethod
+    def calculate_segment_emissions(vehicle_type: VehicleType, distances_km: Sequence[float],
+                                    terrains: Sequence[TerrainType], road_types: Sequence[RoadType],
+                                    load_weight: Union[float, Sequence[float]]) -> np.ndarray:
+        """Emissions in kg for every fuel over every segment in one vectorized pass
+
+        Returns an array of shape (fuel, segment, 3) holding TTW, WTT and WTW,
+        matching calculate_base_emission followed by apply_modifiers.
+        """
+        return EmissionCalculator.calculate_fleet_segment_emissions(
+            [vehicle_type], distances_km, terrains, road_types, load_weight
+        )[0]
+    
+    @staticmethod
+    def calculate_fleet_segment_emissions(vehicle_types: Sequence[VehicleType], distances_km: Sequence[float],
+                                          terrains: Sequence[TerrainType], road_types: Sequence[RoadType],
+                                          load_weight: Union[float, Sequence[float]],
+                                          road_shares: Optional[np.ndarray] = None) -> np.ndarray:
+        """Emissions in kg for several vehicle types, shape (vehicle, fuel, segment, 3)
+
+        road_shares, when given, is a (segment, road type) array of distance
+        shares that replaces the single road type per segment. load_weight is
+        either one load for the whole trip or the load carried on each segment.
+        """
+        distances = np.asarray(distances_km, dtype=np.float64)
+        vehicle_idx = np.fromiter((VEHICLE_INDEX[vehicle] for vehicle in vehicle_types), dtype=np.intp)
+        terrain_idx = np.fromiter((TERRAIN_INDEX[terrain] for terrain in terrains), dtype=np.intp, count=len(distances))
+        
+        # (vehicle, fuel, segment, 2) gCO2/km for each segment's terrain/road
+        if road_shares is not None:
+            factors = np.einsum("vfsrc,sr->vfsc", FACTOR_TABLE[vehicle_idx][:, :, terrain_idx], road_shares)
+        else:
+            road_idx = np.fromiter((ROAD_INDEX[road] for road in road_types), dtype=np.intp, count=len(distances))
+            factors = FACTOR_TABLE[vehicle_idx][:, :, terrain_idx, road_idx, :]
+        load_addition_kg = np.asarray(load_weight, dtype=np.float64) * LOAD_WEIGHT_FACTOR * distances / 1000
+        
+        emissions = np.empty(factors.shape[:3] + (3,), dtype=np.float64)
+        emissions[..., TTW] = factors[..., 0] * distances / 1000 + load_addition_kg
+        emissions[..., WTT] = factors[..., 1] * distances / 1000
+        emissions[..., WTW] = emissions[..., TTW] + emissions[..., WTT]
+        return emissions
+    
+    @staticmethod
+    def cost_per_km(vehicle_type: VehicleType, fuel_type: FuelType, terrain: TerrainType,
+                    road_type: RoadType) -> tuple:
+        """WTW kg per km empty and extra kg per km for each kg of load: (per_km, per_kg_km)"""
+        factors = FACTOR_TABLE[VEHICLE_INDEX[vehicle_type], FUEL_INDEX[fuel_type],
+                               TERRAIN_INDEX[terrain], ROAD_INDEX[road_type]]
+        return float(factors.sum()) / 1000, LOAD_WEIGHT_FACTOR / 1000
+
+    @staticmethod
+    def calculate_indexed_emissions(vehicle_idx: np.ndarray, fuel_idx: np.ndarray, distances_km: np.ndarray,
+                                    load_weight: np.ndarray, terrain_shares: np.ndarray,
+                                    road_shares: np.ndarray) -> np.ndarray:
+        """Emissions in kg for many independent trips given as factor-table indices, shape (trip, 3)
+
+        terrain_shares and road_shares are (trip, terrain) and (trip, road type)
+        distance shares; they are combined assuming terrain and road type are
+        independent along the trip.
+        """
+        distances = np.asarray(distances_km, dtype=np.float64)
+        factors = FACTOR_TABLE[vehicle_idx, fuel_idx]  # (trip, terrain, road, 2)
+        by_road = np.einsum("ntrc,nt->nrc", factors, terrain_shares)
+        per_km = np.einsum("nrc,nr->nc", by_road, road_shares)
+        emissions = np.empty((len(distances), 3), dtype=np.float64)
+        emissions[:, TTW] = (per_km[:, 0] + np.asarray(load_weight) * LOAD_WEIGHT_FACTOR) * distances / 1000
+        emissions[:, WTT] = per_km[:, 1] * distances / 1000
+        emissions[:, WTW] = emissions[:, TTW] + emissions[:, WTT]
+        return emissions
+
+    @staticmethod
+    def calculate_matrix_emissions(vehicle_types: Sequence[VehicleType], fuel_types: Sequence[FuelType],
+                                   distances_km: np.ndarray, terrain: TerrainType, road_type: RoadType,
+                                   load_weight: float, dtype=np.float32) -> np.ndarray:
+        """WTW kg for every vehicle/fuel over a whole distance matrix, shape (vehicle, fuel, origin, destination)"""
+        vehicle_idx = [VEHICLE_INDEX[vehicle] for vehicle in vehicle_types]
+        fuel_idx = [FUEL_INDEX[fuel] for fuel in fuel_types]
+        factors = FACTOR_TABLE[np.ix_(vehicle_idx, fuel_idx)][:, :, TERRAIN_INDEX[terrain], ROAD_INDEX[road_type], :]
+        # The load surcharge is added to TTW per km, so it folds into one WTW rate per vehicle/fuel
+        per_km = ((factors.sum(axis=-1) + load_weight * LOAD_WEIGHT_FACTOR) / 1000).astype(dtype)
+        return per_km[:, :, None, None] * np.asarray(distances_km, dtype=dtype)[None, None]
+    
+    @staticmethod
+    def compare_emissions(segments: Sequence[Dict[str, Any]], vehicle_type: VehicleType, load_weight: float,
+                          terrain: TerrainType = TerrainType.FLAT, road_type: RoadType = RoadType.HIGHWAY,
+                          include_vehicles: bool = False) -> "EmissionComparison":
+        """Per-segment and total TTW/WTT/WTW for every fuel (and optionally every vehicle) in one pass
+
+        Segments are route city dicts with "segment_distance_km" and optional
+        "terrain" / "road_type" / "road_type_shares"; missing values fall back
+        to the given defaults.
+        """
+        vehicle_types = VEHICLE_TYPES if include_vehicles else [vehicle_type]
+        segment_terrains = [segment.get("terrain", terrain) for segment in segments]
+        segment_road_types = [segment.get("road_type", road_type) for segment in segments]
+        road_shares = None
+        if any("road_type_shares" in segment for segment in segments):
+            # Segments without classified shares count entirely as their single road type
+            road_shares = np.array([
+                [segment["road_type_shares"][road] for road in ROAD_TYPES] if "road_type_shares" in segment
+                else [float(road == segment_road) for road in ROAD_TYPES]
+                for segment, segment_road in zip(segments, segment_road_types)
+            ], dtype=np.float64)
+        emissions = EmissionCalculator.calculate_fleet_segment_emissions(
+            vehicle_types,
+            [segment["segment_distance_km"] for segment in segments],
+            segment_terrains,
+            segment_road_types,
+            load_weight,
+            road_shares
+        )
+        return EmissionComparison(
+            segments=list(segments),
+            vehicle_types=list(vehicle_types),
+            terrains=segment_terrains,
+            road_types=segment_road_types,
+            emissions=emissions
+        )
+
+
+@dataclass
+class EmissionComparison:
+    """Result of EmissionCalculator.compare_emissions
+
+    emissions has shape (vehicle, fuel, segment, 3) with TTW, WTT and WTW in kg;
+    totals are summed once and every view below is derived from them.
+    """
+    segments: List[Dict[str, Any]]
+    vehicle_types: List[VehicleType]
+    terrains: List[TerrainType]
+    road_types: List[RoadType]
+    emissions: np.ndarray
+    totals: np.ndarray = field(init=False)
+    
+    def __post_init__(self):
+        self.totals = self.emissions.sum(axis=2)
+        self._vehicle_index = {vehicle: i for i, vehicle in enumerate(self.vehicle_types)}
+    
+    def split(self, group_sizes: Sequence[int]) -> List["EmissionComparison"]:
+        """Split a comparison computed over several routes' concatenated segments into one per route"""
+        bounds = np.concatenate(([0], np.cumsum(group_sizes))).tolist()
+        return [
+            EmissionComparison(
+                segments=self.segments[start:end],
+                vehicle_types=self.vehicle_types,
+                terrains=self.terrains[start:end],
+                road_types=self.road_types[start:end],
+                emissions=self.emissions[:, :, start:end]
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+    
+    def segment_emissions(self, vehicle_type: VehicleType, fuel_type: FuelType) -> np.ndarray:
+        """(segment, 3) emissions for one vehicle/fuel combination"""
+        return self.emissions[self._vehicle_index[vehicle_type], FUEL_INDEX[fuel_type]]
+    
+    def total(self, vehicle_type: VehicleType, fuel_type: FuelType) -> EmissionBreakdown:
+        ttw_kg, wtt_kg, wtw_kg = self.totals[self._vehicle_index[vehicle_type], FUEL_INDEX[fuel_type]].tolist()
+        return EmissionBreakdown(ttw_kg=ttw_kg, wtt_kg=wtt_kg, wtw_kg=wtw_kg)
+    
+    def city_emissions(self, vehicle_type: VehicleType, fuel_type: FuelType) -> List[CityEmission]:
+        """City emission entries (WTW) for one vehicle/fuel combination"""
+        wtw = self.segment_emissions(vehicle_type, fuel_type)[:, WTW].tolist()
+        return [
+            CityEmission(
+                city=segment["name"],
+                distance_km=segment["segment_distance_km"],
+                co2_emission_kg=co2_emission_kg,
+                terrain=terrain,
+                road_type=road_type,
+                road_type_shares=segment.get("road_type_shares"),
+                climb_m=segment.get("climb_m"),
+                grade_percent=segment.get("grade_percent")
+            )
+            for segment, co2_emission_kg, terrain, road_type in zip(self.segments, wtw, self.terrains, self.road_types)
+        ]
+    
+    def fuel_comparisons(self, vehicle_type: VehicleType, baseline_fuel: FuelType) -> List[FuelComparison]:
+        """Total WTW of every fuel for one vehicle, relative to the baseline fuel"""
+        fuel_totals = self.totals[self._vehicle_index[vehicle_type], :, WTW].tolist()
+        baseline = fuel_totals[FUEL_INDEX[baseline_fuel]]
+        return [
+            FuelComparison(
+                fuel_type=fuel,
+                emission_kg=total,
+                percentage_difference=_percentage_difference(total, baseline) if fuel != baseline_fuel else 0.0
+            )
+            for fuel, total in zip(FUEL_TYPES, fuel_totals)
+        ]
+    
+    def vehicle_comparisons(self, fuel_type: FuelType, baseline_vehicle: VehicleType) -> List[VehicleComparison]:
+        """Total WTW of every compared vehicle type for one fuel, relative to the baseline vehicle"""
+        vehicle_totals = self.totals[:, FUEL_INDEX[fuel_type], WTW].tolist()
+        baseline = vehicle_totals[self._vehicle_index[baseline_vehicle]]
+        return [
+            VehicleComparison(
+                vehicle_type=vehicle,
+                emission_kg=total,
+                percentage_difference=_percentage_difference(total, baseline) if vehicle != baseline_vehicle else 0.0
+            )
+            for vehicle, total in zip(self.vehicle_types, vehicle_totals)
+        ]
+
+
+def _percentage_difference(value: float, baseline: float) -> float:
+    return ((value - baseline) / baseline) * 100 if baseline else 0.0
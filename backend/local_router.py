@@ -0,0 +1,460 @@
+import argparse
+import heapq
+import logging
+import math
+import operator
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from distance import haversine_km
+
+
+logger = logging.getLogger(__name__)
+
+# Drivable OSM highway classes; *_link ways are folded into their parent class
+ROAD_CLASSES = [
+    "motorway", "trunk", "primary", "secondary", "tertiary",
+    "unclassified", "residential", "service", "living_street"
+]
+ROAD_CLASS_INDEX = {road_class: i for i, road_class in enumerate(ROAD_CLASSES)}
+DEFAULT_SPEEDS_KMH = {
+    "motorway": 100, "trunk": 80, "primary": 65, "secondary": 55, "tertiary": 45,
+    "unclassified": 35, "residential": 25, "service": 15, "living_street": 10
+}
+
+# Grid cell size (degrees) of the nearest-node index
+SNAP_CELL_DEGREES = 0.01
+
+
+class RoadGraph:
+    """Directed road graph in CSR form with optional ALT landmark tables"""
+
+    def __init__(self, node_lat: np.ndarray, node_lon: np.ndarray, offsets: np.ndarray, targets: np.ndarray,
+                 edge_length_m: np.ndarray, edge_speed_kmh: np.ndarray, edge_class: np.ndarray,
+                 landmarks: Optional[np.ndarray] = None, landmark_from: Optional[np.ndarray] = None,
+                 landmark_to: Optional[np.ndarray] = None):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lon = np.asarray(node_lon, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.edge_length_m = np.asarray(edge_length_m, dtype=np.float64)
+        self.edge_speed_kmh = np.asarray(edge_speed_kmh, dtype=np.float64)
+        self.edge_class = np.asarray(edge_class, dtype=np.uint8)
+        self.edge_time_s = self.edge_length_m / (self.edge_speed_kmh / 3.6)
+        self.max_speed_ms = float(self.edge_speed_kmh.max()) / 3.6 if len(self.edge_speed_kmh) else 1.0
+
+        # Python lists make the per-edge accesses in the search loop much cheaper than NumPy indexing
+        self._offsets = self.offsets.tolist()
+        self._targets = self.targets.tolist()
+        self._times = self.edge_time_s.tolist()
+        self.set_landmarks(landmarks, landmark_from, landmark_to)
+        self._build_snap_index()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_lat)
+
+    @classmethod
+    def from_edges(cls, node_lat: Sequence[float], node_lon: Sequence[float], edge_from: Sequence[int],
+                   edge_to: Sequence[int], edge_speed_kmh: Sequence[float], edge_class: Sequence[int],
+                   edge_length_m: Optional[Sequence[float]] = None) -> "RoadGraph":
+        """Build a graph from an edge list; lengths default to the haversine distance between nodes"""
+        node_lat = np.asarray(node_lat, dtype=np.float64)
+        node_lon = np.asarray(node_lon, dtype=np.float64)
+        edge_from = np.asarray(edge_from, dtype=np.int64)
+        edge_to = np.asarray(edge_to, dtype=np.int64)
+        if edge_length_m is None:
+            edge_length_m = haversine_km(node_lat[edge_from], node_lon[edge_from],
+                                         node_lat[edge_to], node_lon[edge_to]) * 1000
+        order = np.argsort(edge_from, kind="stable")
+        counts = np.bincount(edge_from, minlength=len(node_lat))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(
+            node_lat, node_lon, offsets, edge_to[order],
+            np.asarray(edge_length_m, dtype=np.float64)[order],
+            np.asarray(edge_speed_kmh, dtype=np.float64)[order],
+            np.asarray(edge_class, dtype=np.uint8)[order]
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Load a graph archive written by save()"""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(**arrays)
+
+    def save(self, path: str) -> None:
+        arrays = {
+            "node_lat": self.node_lat, "node_lon": self.node_lon,
+            "offsets": self.offsets, "targets": self.targets,
+            "edge_length_m": self.edge_length_m, "edge_speed_kmh": self.edge_speed_kmh,
+            "edge_class": self.edge_class
+        }
+        if self.landmarks is not None:
+            arrays.update(landmarks=self.landmarks, landmark_from=self.landmark_from,
+                          landmark_to=self.landmark_to)
+        np.savez(path, **arrays)
+
+    def _build_snap_index(self) -> None:
+        """Grid index mapping cells to node ids for nearest-node snapping"""
+        cell_lat = np.floor(self.node_lat / SNAP_CELL_DEGREES).astype(np.int64)
+        cell_lon = np.floor(self.node_lon / SNAP_CELL_DEGREES).astype(np.int64)
+        cells = cell_lat * 100000 + cell_lon
+        self._snap_order = np.argsort(cells, kind="stable")
+        self._snap_cells = cells[self._snap_order]
+
+    def nearest_node(self, lat: float, lon: float, max_rings: int = 50) -> int:
+        """Closest graph node to a point, searching outward ring by ring in the grid index"""
+        cell_lat = math.floor(lat / SNAP_CELL_DEGREES)
+        cell_lon = math.floor(lon / SNAP_CELL_DEGREES)
+        for ring in range(max_rings + 1):
+            candidates = []
+            for d_lat in range(-ring, ring + 1):
+                for d_lon in range(-ring, ring + 1):
+                    # Only the cells on this ring's border are new
+                    if max(abs(d_lat), abs(d_lon)) != ring:
+                        continue
+                    cell = (cell_lat + d_lat) * 100000 + (cell_lon + d_lon)
+                    lo = np.searchsorted(self._snap_cells, cell, side="left")
+                    hi = np.searchsorted(self._snap_cells, cell, side="right")
+                    if hi > lo:
+                        candidates.append(self._snap_order[lo:hi])
+            if candidates:
+                nodes = np.concatenate(candidates)
+                distances = haversine_km(lat, lon, self.node_lat[nodes], self.node_lon[nodes])
+                return int(nodes[int(np.argmin(distances))])
+        raise ValueError(f"No road network node near {lat}, {lon}")
+
+    def set_landmarks(self, landmarks: Optional[np.ndarray], landmark_from: Optional[np.ndarray],
+                      landmark_to: Optional[np.ndarray]) -> None:
+        """Set the (node, landmark) travel times from / to each landmark"""
+        self.landmarks = landmarks
+        self.landmark_from = landmark_from
+        self.landmark_to = landmark_to
+        # Rows as lists: the heuristic runs on every push, where NumPy's per-call overhead dominates
+        self._landmark_from = landmark_from.tolist() if landmark_from is not None else None
+        self._landmark_to = landmark_to.tolist() if landmark_to is not None else None
+
+    def _heuristic(self, target: int):
+        """Admissible travel-time lower bound to target (ALT when landmarks exist, else straight line)"""
+        if self._landmark_from:
+            from_target = self._landmark_from[target]
+            to_target = self._landmark_to[target]
+            landmark_from, landmark_to, sub = self._landmark_from, self._landmark_to, operator.sub
+
+            def alt(node: int) -> float:
+                bound = max(max(map(sub, from_target, landmark_from[node])),
+                            max(map(sub, landmark_to[node], to_target)))
+                return bound if bound > 0 and math.isfinite(bound) else 0.0
+            return alt
+
+        target_lat = math.radians(self.node_lat[target])
+        target_lon = math.radians(self.node_lon[target])
+        node_lat, node_lon, max_speed = self.node_lat, self.node_lon, self.max_speed_ms
+
+        def straight_line(node: int) -> float:
+            lat = math.radians(node_lat[node])
+            lon = math.radians(node_lon[node])
+            a = (math.sin((target_lat - lat) / 2) ** 2
+                 + math.cos(lat) * math.cos(target_lat) * math.sin((target_lon - lon) / 2) ** 2)
+            return 2 * 6371000 * math.asin(min(1.0, math.sqrt(a))) / max_speed
+        return straight_line
+
+    def shortest_path(self, source: int, target: int,
+                      edge_penalty: Optional[Dict[int, float]] = None) -> Optional[Tuple[List[int], List[int]]]:
+        """A* search on travel time; returns (nodes, edges) or None if target is unreachable
+
+        edge_penalty optionally multiplies the travel time of specific edges
+        (used to compute alternative routes).
+        """
+        if source == target:
+            return [source], []
+        heuristic = self._heuristic(target)
+        offsets, targets, times = self._offsets, self._targets, self._times
+        best = {source: 0.0}
+        prev_edge: Dict[int, int] = {}
+        prev_node: Dict[int, int] = {}
+        settled = set()
+        heap = [(heuristic(source), 0.0, source)]
+
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in settled:
+                continue
+            settled.add(node)
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                edge_time = times[edge]
+                if edge_penalty and edge in edge_penalty:
+                    edge_time *= edge_penalty[edge]
+                new_cost = cost + edge_time
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    prev_edge[neighbour] = edge
+                    prev_node[neighbour] = node
+                    heapq.heappush(heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        else:
+            return None
+
+        nodes = [target]
+        edges = []
+        while nodes[-1] != source:
+            edges.append(prev_edge[nodes[-1]])
+            nodes.append(prev_node[nodes[-1]])
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def build_route(self, nodes: List[int], edges: List[int]) -> Dict[str, Any]:
+        """Shape a node/edge path like an OSRM route: distance_km, duration_seconds, coordinates, steps"""
+        coordinates = [[float(self.node_lon[n]), float(self.node_lat[n])] for n in nodes]
+        edge_idx = np.asarray(edges, dtype=np.int64)
+        lengths = self.edge_length_m[edge_idx]
+        durations = self.edge_time_s[edge_idx]
+        classes = self.edge_class[edge_idx]
+
+        # One step per run of consecutive edges with the same road class
+        steps = []
+        start = 0
+        for i in range(1, len(edges) + 1):
+            if i == len(edges) or classes[i] != classes[start]:
+                road_class = ROAD_CLASSES[int(classes[start])]
+                steps.append({
+                    "distance": float(lengths[start:i].sum()),
+                    "duration": float(durations[start:i].sum()),
+                    "name": "",
+                    "mode": "driving",
+                    "road_class": road_class,
+                    "geometry": {"coordinates": coordinates[start:i + 1]},
+                    "intersections": [{"classes": ["motorway"]}] if road_class == "motorway" else [{}]
+                })
+                start = i
+
+        return {
+            "distance_km": float(lengths.sum()) / 1000,
+            "duration_seconds": float(durations.sum()),
+            "coordinates": coordinates,
+            "steps": steps,
+            "annotation": {
+                "distance": lengths.tolist(),
+                "duration": durations.tolist(),
+                "speed": (lengths / np.maximum(durations, 1e-9)).tolist()
+            }
+        }
+
+    def route(self, start_coords: tuple, end_coords: tuple) -> Dict[str, Any]:
+        """Shortest-time route between two (lat, lon) points"""
+        source = self.nearest_node(*start_coords)
+        target = self.nearest_node(*end_coords)
+        path = self.shortest_path(source, target)
+        if path is None:
+            raise ValueError("Route not found")
+        return self.build_route(*path)
+
+    def route_alternatives(self, start_coords: tuple, end_coords: tuple, count: int = 3,
+                           penalty: float = 1.4, max_overlap: float = 0.8) -> List[Dict[str, Any]]:
+        """Up to count distinct routes using the penalty method
+
+        After each search the edges of the found path get their travel time
+        multiplied by penalty; a new path is kept only if at most max_overlap
+        of its length is shared with an accepted route.
+        """
+        source = self.nearest_node(*start_coords)
+        target = self.nearest_node(*end_coords)
+        penalties: Dict[int, float] = {}
+        accepted: List[Tuple[List[int], List[int]]] = []
+        accepted_edges: List[set] = []
+        for _ in range(count * 3):
+            path = self.shortest_path(source, target, penalties)
+            if path is None:
+                break
+            edges = path[1]
+            if not edges:
+                accepted = accepted or [path]
+                break
+            length = float(self.edge_length_m[edges].sum()) if edges else 0.0
+            edge_set = set(edges)
+            distinct = all(
+                float(self.edge_length_m[list(edge_set & previous)].sum()) <= max_overlap * length
+                for previous in accepted_edges
+            )
+            if distinct or not accepted:
+                accepted.append(path)
+                accepted_edges.append(edge_set)
+                if len(accepted) == count:
+                    break
+            for edge in edges:
+                penalties[edge] = penalties.get(edge, 1.0) * penalty
+        if not accepted:
+            raise ValueError("Route not found")
+        return [self.build_route(nodes, edges) for nodes, edges in accepted]
+
+    def table(self, sources: Sequence[tuple], destinations: Sequence[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances_km, durations_s) of the fastest routes between (lat, lon) points, NaN if unreachable
+
+        One Dijkstra per source, stopped once every destination is settled.
+        """
+        targets = [self.nearest_node(*point) for point in destinations]
+        distances = np.full((len(sources), len(destinations)), np.nan)
+        durations = np.full((len(sources), len(destinations)), np.nan)
+        lengths = self.edge_length_m.tolist()
+        for row, point in enumerate(sources):
+            source = self.nearest_node(*point)
+            pending = set(targets)
+            best = {source: 0.0}
+            metres = {source: 0.0}
+            settled = set()
+            heap = [(0.0, source)]
+            while heap and pending:
+                cost, node = heapq.heappop(heap)
+                if node in settled:
+                    continue
+                settled.add(node)
+                pending.discard(node)
+                for edge in range(self._offsets[node], self._offsets[node + 1]):
+                    neighbour = self._targets[edge]
+                    new_cost = cost + self._times[edge]
+                    if new_cost < best.get(neighbour, math.inf):
+                        best[neighbour] = new_cost
+                        metres[neighbour] = metres[node] + lengths[edge]
+                        heapq.heappush(heap, (new_cost, neighbour))
+            for col, target in enumerate(targets):
+                if target in settled:
+                    durations[row, col] = best[target]
+                    distances[row, col] = metres[target] / 1000
+        return distances, durations
+
+    def reverse_adjacency(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """CSR of the reversed graph: (offsets, sources, edge ids)"""
+        edge_from = np.repeat(np.arange(self.node_count), np.diff(self.offsets))
+        order = np.argsort(self.targets, kind="stable")
+        counts = np.bincount(self.targets, minlength=self.node_count)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return offsets, edge_from[order], order
+
+    def travel_times_from(self, source: int, reverse: bool = False) -> np.ndarray:
+        """Dijkstra travel times from source to every node (to source, when reverse)"""
+        if reverse:
+            rev_offsets, rev_sources, rev_edges = self.reverse_adjacency()
+            offsets, targets = rev_offsets.tolist(), rev_sources.tolist()
+            times = self.edge_time_s[rev_edges].tolist()
+        else:
+            offsets, targets, times = self._offsets, self._targets, self._times
+        dist = [math.inf] * self.node_count
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > dist[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                new_cost = cost + times[edge]
+                if new_cost < dist[neighbour]:
+                    dist[neighbour] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbour))
+        return np.asarray(dist)
+
+    def select_landmarks(self, count: int = 8) -> None:
+        """Pick landmarks by farthest-point selection and precompute their ALT tables"""
+        count = min(count, self.node_count)
+        landmarks = [int(np.argmax(self.node_lat + self.node_lon))]
+        from_tables = []
+        to_tables = []
+        while True:
+            from_tables.append(self.travel_times_from(landmarks[-1]))
+            to_tables.append(self.travel_times_from(landmarks[-1], reverse=True))
+            if len(landmarks) == count:
+                break
+            # Next landmark: the reachable node farthest from all chosen ones
+            reach = np.min(np.where(np.isfinite(from_tables), from_tables, -1), axis=0)
+            reach[landmarks] = -1
+            landmarks.append(int(np.argmax(reach)))
+            logger.info(f"Selected landmark {len(landmarks)}/{count}")
+        # Unreachable pairs get +inf; the heuristic treats non-finite bounds as 0
+        self.set_landmarks(np.asarray(landmarks, dtype=np.int64), np.stack(from_tables, axis=1),
+                           np.stack(to_tables, axis=1))
+
+
+def build_graph_from_osm(pbf_path: str) -> RoadGraph:
+    """Extract the drivable road network from an OSM PBF/XML file (requires pyosmium)"""
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Building a road graph requires the 'osmium' package (pip install osmium)") from e
+
+    node_index: Dict[int, int] = {}
+    node_lat: List[float] = []
+    node_lon: List[float] = []
+    edge_from: List[int] = []
+    edge_to: List[int] = []
+    edge_speed: List[float] = []
+    edge_class: List[int] = []
+
+    def node_id(node) -> int:
+        index = node_index.get(node.ref)
+        if index is None:
+            index = node_index[node.ref] = len(node_lat)
+            node_lat.append(node.location.lat)
+            node_lon.append(node.location.lon)
+        return index
+
+    class WayHandler(osmium.SimpleHandler):
+        def way(self, way):
+            highway = way.tags.get("highway", "")
+            road_class = highway[:-5] if highway.endswith("_link") else highway
+            if road_class not in ROAD_CLASS_INDEX or way.tags.get("access") in ("no", "private"):
+                return
+            speed = parse_maxspeed(way.tags.get("maxspeed")) or DEFAULT_SPEEDS_KMH[road_class]
+            oneway = way.tags.get("oneway")
+            if road_class == "motorway" and oneway is None:
+                oneway = "yes"
+            try:
+                nodes = [node_id(node) for node in way.nodes]
+            except osmium.InvalidLocationError:
+                return
+            for a, b in zip(nodes, nodes[1:]):
+                if oneway == "-1":
+                    a, b = b, a
+                pairs = [(a, b)] if oneway in ("yes", "true", "1", "-1") else [(a, b), (b, a)]
+                for u, v in pairs:
+                    edge_from.append(u)
+                    edge_to.append(v)
+                    edge_speed.append(speed)
+                    edge_class.append(ROAD_CLASS_INDEX[road_class])
+
+    WayHandler().apply_file(pbf_path, locations=True)
+    logger.info(f"Extracted {len(node_lat)} nodes and {len(edge_from)} edges from {pbf_path}")
+    return RoadGraph.from_edges(node_lat, node_lon, edge_from, edge_to, edge_speed, edge_class)
+
+
+def parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """Parse an OSM maxspeed tag ("50", "30 mph") into km/h"""
+    if not value:
+        return None
+    parts = value.split()
+    try:
+        speed = float(parts[0])
+    except ValueError:
+        return None
+    return speed * 1.609 if len(parts) > 1 and parts[1] == "mph" else speed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Preprocess an OSM extract into a GreenRoute road graph")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build a graph archive from an OSM PBF file")
+    build.add_argument("input", help="OSM extract (.osm.pbf)")
+    build.add_argument("output", help="Output graph archive (.npz)")
+    build.add_argument("--landmarks", type=int, default=8, help="Number of ALT landmarks (0 disables)")
+    args = parser.parse_args()
+
+    graph = build_graph_from_osm(args.input)
+    if args.landmarks > 0:
+        graph.select_landmarks(args.landmarks)
+    graph.save(args.output)
+    logger.info(f"Wrote {args.output}")
@@ -1,23 +1,67 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
+import concurrent.futures
+import json
 import logging
-import google.generativeai as genai
-from functools import lru_cache
+import time
+import numpy as np
+from typing import Optional
 
-from models import VehicleType, FuelType, TerrainType, RoadType, LocationModel, TripRequest, CityEmission, EmissionBreakdown, TripResponse, FuelComparison, EMISSION_FACTORS
+from models import VehicleType, FuelType, TerrainType, RoadType, LocationModel, TripRequest, EmissionBreakdown, TripResponse, EMISSION_FACTORS
+from models import BatchTripRequest, BatchTripResult, BatchTripResponse, ReasoningMode, ReasoningJobResponse
+from models import RouteAlternative, RouteAlternativesResponse
+from models import TourRequest, TourResponse, TourLeg, EmissionMatrixRequest, MatrixFormat
+from config import BATCH_MAX_CONCURRENCY, REASONING_JOB_WORKERS, REASONING_JOB_QUEUE_SIZE, REASONING_JOB_TTL_SECONDS
+from config import ROUTE_ALTERNATIVES_MAX, TOUR_MAX_STOPS, TOUR_TIME_BUDGET_SECONDS, TOUR_STARTS, TOUR_WORKERS
+from config import EMISSION_MATRIX_MAX_JSON_POINTS, EMISSION_MATRIX_MAX_POINTS, REQUEST_DEADLINE_SECONDS
+from metrics import REGISTRY, HTTP_SECONDS, cache_metrics, circuit_metrics, request_timings, stage, start_request_timings
+from resilience import REASONING_UNAVAILABLE, TEMPLATE_REASONING, breaker_states, start_deadline
 from route_service import RouteService
-from emission_calculator import EmissionCalculator
+from emission_calculator import EmissionCalculator, EmissionComparison, FUEL_INDEX, TTW, WTT, WTW
 from reasoning import ReasoningService
+from reasoning_jobs import InProcessReasoningQueue, ReasoningJobBackend, ReasoningQueueFull
+from tour_optimizer import create_tour_pool, solve_tour, tour_cost, leg_loads
+from matrix_export import iter_csv, to_npz_bytes, to_arrow_bytes, arrow_available
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared RouteService (and its pooled HTTP client) and reasoning workers once per process"""
+    route_service = RouteService()
+    await route_service.startup()
+    app.state.route_service = route_service
+    reasoning_jobs = InProcessReasoningQueue(
+        workers=REASONING_JOB_WORKERS,
+        max_queue_size=REASONING_JOB_QUEUE_SIZE,
+        result_ttl_seconds=REASONING_JOB_TTL_SECONDS
+    )
+    await reasoning_jobs.start()
+    app.state.reasoning_jobs = reasoning_jobs
+    # One pool for every /optimize-tour request instead of spawning workers per tour
+    tour_pool = create_tour_pool(TOUR_WORKERS) if TOUR_WORKERS > 1 and TOUR_STARTS > 1 else None
+    app.state.tour_pool = tour_pool
+    try:
+        yield
+    finally:
+        if tour_pool is not None:
+            tour_pool.shutdown(wait=False, cancel_futures=True)
+        await reasoning_jobs.stop()
+        await route_service.shutdown()
+        await asyncio.to_thread(ReasoningService.close_cache)
+
 app = FastAPI(
     title="GreenRoute API",
     description="CO2 Emission Tracking and Route Optimization API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -30,11 +74,30 @@ app.add_middleware(
 )
 
 
-# Cache for frequently accessed data
-@lru_cache(maxsize=100)
-def get_cached_emission_factors(vehicle_type: str, fuel_type: str):
-    """Cache emission factors for better performance"""
-    return EMISSION_FACTORS[VehicleType(vehicle_type)][FuelType(fuel_type)]
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request latency by route template; skipped entirely when metrics are disabled"""
+    if not REGISTRY.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_SECONDS.observe(time.perf_counter() - start, request.method, path, str(response.status_code))
+    return response
+
+
+def get_route_service(request: Request) -> RouteService:
+    """Dependency returning the process-wide RouteService"""
+    return request.app.state.route_service
+
+def get_reasoning_jobs(request: Request) -> ReasoningJobBackend:
+    """Dependency returning the background reasoning job backend"""
+    return request.app.state.reasoning_jobs
+
+def get_tour_pool(request: Request) -> Optional[concurrent.futures.Executor]:
+    """Dependency returning the process pool for tour starts, if TOUR_WORKERS enables one"""
+    return getattr(request.app.state, "tour_pool", None)
 
 # API Endpoints
 @app.get("/")
@@ -43,154 +106,554 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now().isoformat(), "circuits": breaker_states()}
+
+async def resolve_coordinates(location: LocationModel, route_service: RouteService) -> tuple:
+    """Geocode a location unless explicit coordinates were provided"""
+    if not location.latitude:
+        async with stage("geocode"):
+            return await route_service.geocode_address(location.address)
+    return (location.latitude, location.longitude)
+
+
+def compare_route_emissions(trip_request: TripRequest, cities: list,
+                            include_vehicles: bool = False) -> EmissionComparison:
+    """Emissions for every fuel (and optionally vehicle) over the route's city segments in one pass"""
+    # City-specific terrain and road type are used if available, otherwise the request defaults
+    return EmissionCalculator.compare_emissions(
+        cities,
+        trip_request.vehicle_type,
+        trip_request.load_weight,
+        terrain=trip_request.terrain,
+        road_type=trip_request.road_type,
+        include_vehicles=include_vehicles
+    )
+
+
+async def build_trip_response(trip_request: TripRequest, route_data: dict, trip_id: str,
+                              start_time: datetime, include_reasoning: bool = True,
+                              reasoning_jobs: Optional[ReasoningJobBackend] = None) -> TripResponse:
+    """Compute emissions, fuel comparisons and reasoning for a routed trip"""
+    with stage("emissions"):
+        # Calculate city-wise emissions for every fuel (and vehicle, if requested) in one pass
+        comparison = compare_route_emissions(trip_request, route_data["cities"], trip_request.compare_vehicles)
+        city_emissions = comparison.city_emissions(trip_request.vehicle_type, trip_request.fuel_type)
+        total_emission = comparison.total(trip_request.vehicle_type, trip_request.fuel_type)
+        
+        # Calculate fuel consumption based on total distance
+        fuel_consumption = route_data["distance_km"] * 0.08  # L/km estimate
+        
+        # Fuel and vehicle comparisons are derived from the same result
+        fuel_comparisons = comparison.fuel_comparisons(trip_request.vehicle_type, trip_request.fuel_type)
+        vehicle_comparisons = None
+        if trip_request.compare_vehicles:
+            vehicle_comparisons = comparison.vehicle_comparisons(trip_request.fuel_type, trip_request.vehicle_type)
+    
+    # Generate reasoning with city-specific information
+    fallbacks = list(route_data.get("fallbacks", []))
+    reasoning = ""
+    reasoning_job_id = None
+    reasoning_mode = trip_request.reasoning_mode if include_reasoning else ReasoningMode.OFF
+    if reasoning_mode == ReasoningMode.BACKGROUND and reasoning_jobs is not None:
+        # Keep Gemini latency off the request path; clients poll /reasoning/{job_id}
+        try:
+            reasoning_job_id = reasoning_jobs.submit(build_reasoning_data(trip_request, route_data, comparison))
+        except ReasoningQueueFull as e:
+            logger.warning(f"Skipping reasoning for {trip_id}: {e}")
+    elif reasoning_mode != ReasoningMode.OFF:
+        reasoning_data = build_reasoning_data(trip_request, route_data, comparison)
+        try:
+            async with stage("reasoning"):
+                reasoning = await ReasoningService.generate_reasoning(reasoning_data)
+        except Exception as e:
+            # The emissions are complete without it, so answer degraded with the template reasoning
+            logger.error(f"Reasoning unavailable for {trip_id}: {e}")
+            reasoning = ReasoningService.fallback_reasoning(reasoning_data)
+            fallbacks.append(TEMPLATE_REASONING if reasoning else REASONING_UNAVAILABLE)
+    
+    # Calculate processing time
+    processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
+    
+    return TripResponse(
+        trip_id=trip_id,
+        route_id=route_data["route_id"],
+        total_distance_km=route_data["distance_km"],
+        total_fuel_consumption=fuel_consumption,
+        total_co2_emission=total_emission,
+        city_emissions=city_emissions,
+        fuel_comparisons=fuel_comparisons,
+        route_coordinates=route_data["coordinates"],
+        reasoning=reasoning,
+        calculation_time_ms=processing_time,
+        reasoning_job_id=reasoning_job_id,
+        vehicle_comparisons=vehicle_comparisons,
+        timings=request_timings(),
+        degraded=bool(fallbacks),
+        fallbacks=fallbacks
+    )
+
+
+def build_reasoning_data(trip_request: TripRequest, route_data: dict,
+                         comparison: Optional[EmissionComparison] = None) -> dict:
+    """Trip summary passed to the reasoning service, with the computed figures when a comparison is given"""
+    city_info = [{"name": city["name"], "distance": city["segment_distance_km"], 
+                 "terrain": city.get("terrain", trip_request.terrain),
+                 "road_type": city.get("road_type", trip_request.road_type)} 
+                 for city in route_data["cities"]]
+    
+    trip_data = {
+        "vehicle_type": trip_request.vehicle_type,
+        "fuel_type": trip_request.fuel_type,
+        "distance_km": route_data["distance_km"],
+        "terrain": trip_request.terrain,
+        "road_type": trip_request.road_type,
+        "load_weight": trip_request.load_weight,
+        "cities": city_info,
+        "total_cities": len(route_data["cities"]),
+        "reasoning_provider": trip_request.reasoning_provider
+    }
+    if comparison is not None:
+        trip_data["total_emission"] = comparison.total(trip_request.vehicle_type, trip_request.fuel_type)
+        trip_data["city_emissions"] = comparison.city_emissions(trip_request.vehicle_type, trip_request.fuel_type)
+        trip_data["fuel_comparisons"] = comparison.fuel_comparisons(trip_request.vehicle_type, trip_request.fuel_type)
+    return trip_data
+
 
 @app.post("/calculate-trip", response_model=TripResponse)
-async def calculate_trip(trip_request: TripRequest):
+async def calculate_trip(trip_request: TripRequest, route_service: RouteService = Depends(get_route_service),
+                         reasoning_jobs: ReasoningJobBackend = Depends(get_reasoning_jobs)):
     """Calculate CO2 emissions and optimize route for a trip"""
     start_time = datetime.now()
+    start_deadline(REQUEST_DEADLINE_SECONDS)
+    if trip_request.include_timings:
+        start_request_timings()
     
     try:
         # Generate unique trip ID
         trip_id = f"trip_{int(datetime.now().timestamp())}"
         
         # Geocode addresses if coordinates not provided
-        if not trip_request.start_location.latitude:
-            start_coords = await route_service.geocode_address(trip_request.start_location.address)
-        else:
-            start_coords = (trip_request.start_location.latitude, trip_request.start_location.longitude)
-            
-        if not trip_request.end_location.latitude:
-            end_coords = await route_service.geocode_address(trip_request.end_location.address)
-        else:
-            end_coords = (trip_request.end_location.latitude, trip_request.end_location.longitude)
+        start_coords = await resolve_coordinates(trip_request.start_location, route_service)
+        end_coords = await resolve_coordinates(trip_request.end_location, route_service)
         
         # Get optimized route with cities
         route_data = await route_service.get_route_with_cities(start_coords, end_coords)
-        route_service.route = route_data
-        # Calculate city-wise emissions
-        city_emissions = []
-        total_emission_sum = EmissionBreakdown(ttw_kg=0, wtt_kg=0, wtw_kg=0)
         
-        for city_data in route_data["cities"]:
-            # Use city-specific terrain and road type if available, otherwise use request defaults
-            city_terrain = city_data.get("terrain", trip_request.terrain)
-            city_road_type = city_data.get("road_type", trip_request.road_type)
+        return await build_trip_response(trip_request, route_data, trip_id, start_time,
+                                         reasoning_jobs=reasoning_jobs)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating trip: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_stream_event(event: str, data, stream_format: str) -> str:
+    """Encode one stream event as an NDJSON line or a Server-Sent Event"""
+    data = jsonable_encoder(data)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+@app.post("/calculate-trip/stream")
+async def calculate_trip_stream(trip_request: TripRequest,
+                                stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+                                route_service: RouteService = Depends(get_route_service),
+                                reasoning_jobs: ReasoningJobBackend = Depends(get_reasoning_jobs)):
+    """Stream a trip calculation: route geometry, city emissions as resolved, fuel comparisons, then reasoning"""
+    start_time = datetime.now()
+    trip_id = f"trip_{int(start_time.timestamp())}"
+    start_deadline(REQUEST_DEADLINE_SECONDS)
+    
+    try:
+        start_coords = await resolve_coordinates(trip_request.start_location, route_service)
+        end_coords = await resolve_coordinates(trip_request.end_location, route_service)
+        cached_route = route_service.get_cached_route(RouteService.route_cache_key(start_coords, end_coords))
+        if cached_route is not None:
+            # Copy so the cached route is never mutated while streaming
+            route_data = dict(cached_route)
+        else:
+            route_data = await route_service.fetch_route(start_coords, end_coords)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating trip: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def resolve_cities():
+        if cached_route is not None:
+            for item in enumerate(cached_route["cities"]):
+                yield item
+        elif route_data["fallback"]:
+            for item in enumerate(await route_service.get_cities_along_simple_route(start_coords, end_coords)):
+                yield item
+        else:
+            async for item in route_service.iter_route_cities(route_data):
+                yield item
+    
+    async def events():
+        try:
+            yield format_stream_event("route", {
+                "trip_id": trip_id,
+                "route_id": route_data["route_id"],
+                "total_distance_km": route_data["distance_km"],
+                "duration_seconds": route_data["duration_seconds"],
+                "route_coordinates": route_data["coordinates"]
+            }, stream_format)
             
-            # Calculate base emission for this city segment
-            city_base_emission = EmissionCalculator.calculate_base_emission(
-                trip_request.vehicle_type,
-                trip_request.fuel_type,
-                city_data["segment_distance_km"]
-            )
+            # Emit each city segment as soon as it and every segment before it are resolved
+            resolved = []
+            async for index, city_data in resolve_cities():
+                city_emission = compare_route_emissions(trip_request, [city_data]).city_emissions(
+                    trip_request.vehicle_type, trip_request.fuel_type
+                )[0]
+                yield format_stream_event("city_emission", {"index": index, **city_emission.model_dump()}, stream_format)
+                resolved.append((index, city_data))
+            route_data["cities"] = [city for _, city in sorted(resolved, key=lambda item: item[0])]
+            if cached_route is None:
+                route_service.store_route(route_data)
+            fallbacks = list(route_data["fallbacks"])
             
-            # Apply modifiers for this city segment
-            city_emission = EmissionCalculator.apply_modifiers(
-                city_base_emission,
-                city_terrain,
-                city_road_type,
-                trip_request.load_weight,
-                city_data["segment_distance_km"]
+            comparison = compare_route_emissions(trip_request, route_data["cities"], trip_request.compare_vehicles)
+            yield format_stream_event("totals", {
+                "total_co2_emission": comparison.total(trip_request.vehicle_type, trip_request.fuel_type),
+                "total_fuel_consumption": route_data["distance_km"] * 0.08  # L/km estimate
+            }, stream_format)
+            yield format_stream_event(
+                "fuel_comparisons",
+                comparison.fuel_comparisons(trip_request.vehicle_type, trip_request.fuel_type),
+                stream_format
             )
-            
-            # Add to city emissions list
-            city_emissions.append(
-                CityEmission(
-                    city=city_data["name"],
-                    distance_km=city_data["segment_distance_km"],
-                    co2_emission_kg=city_emission.wtw_kg,
-                    terrain=city_terrain,
-                    road_type=city_road_type
+            if trip_request.compare_vehicles:
+                yield format_stream_event(
+                    "vehicle_comparisons",
+                    comparison.vehicle_comparisons(trip_request.fuel_type, trip_request.vehicle_type),
+                    stream_format
                 )
-            )
             
-            # Sum up total emissions
-            total_emission_sum.ttw_kg += city_emission.ttw_kg
-            total_emission_sum.wtt_kg += city_emission.wtt_kg
-            total_emission_sum.wtw_kg += city_emission.wtw_kg
-        
-        # Use summed emissions as total
-        total_emission = total_emission_sum
-        
-        # Calculate fuel consumption based on total distance
-        fuel_consumption = route_data["distance_km"] * 0.08  # L/km estimate
-        
-        # Calculate fuel comparisons for each city and total
-        fuel_comparisons = []
-        baseline_total_emission = total_emission.wtw_kg
-        
-        for fuel in FuelType:
-            if fuel == trip_request.fuel_type:
-                fuel_comparisons.append(
-                    FuelComparison(
-                        fuel_type=fuel,
-                        emission_kg=baseline_total_emission,
-                        percentage_difference=0.0
-                    )
-                )
-            else:
-                # Calculate total emission for this fuel type across all cities
-                fuel_total_emission = 0.0
-                
-                for city_data in route_data["cities"]:
-                    city_terrain = city_data.get("terrain", trip_request.terrain)
-                    city_road_type = city_data.get("road_type", trip_request.road_type)
-                    
-                    city_fuel_emission = EmissionCalculator.calculate_base_emission(
-                        trip_request.vehicle_type, fuel, city_data["segment_distance_km"]
-                    )
-                    city_fuel_emission_modified = EmissionCalculator.apply_modifiers(
-                        city_fuel_emission, city_terrain, city_road_type,
-                        trip_request.load_weight, city_data["segment_distance_km"]
-                    )
-                    fuel_total_emission += city_fuel_emission_modified.wtw_kg
-                
-                percentage_diff = ((fuel_total_emission - baseline_total_emission) / baseline_total_emission) * 100
-                
-                fuel_comparisons.append(
-                    FuelComparison(
-                        fuel_type=fuel,
-                        emission_kg=fuel_total_emission,
-                        percentage_difference=percentage_diff
-                    )
+            # The LLM is by far the slowest step, so it streams last, token by token
+            if trip_request.reasoning_mode == ReasoningMode.BACKGROUND:
+                try:
+                    job_id = reasoning_jobs.submit(build_reasoning_data(trip_request, route_data, comparison))
+                    yield format_stream_event("reasoning_job", {"reasoning_job_id": job_id}, stream_format)
+                except ReasoningQueueFull as e:
+                    logger.warning(f"Skipping reasoning for {trip_id}: {e}")
+            elif trip_request.reasoning_mode != ReasoningMode.OFF:
+                reasoning_data = build_reasoning_data(trip_request, route_data, comparison)
+                streamed = False
+                try:
+                    async for chunk in ReasoningService.stream_reasoning(reasoning_data):
+                        streamed = True
+                        yield format_stream_event("reasoning", {"text": chunk}, stream_format)
+                except Exception as e:
+                    logger.error(f"Reasoning unavailable for {trip_id}: {e}")
+                    # Template text can only stand in if none of the failed stream was sent
+                    reasoning = "" if streamed else ReasoningService.fallback_reasoning(reasoning_data)
+                    if reasoning:
+                        yield format_stream_event("reasoning", {"text": reasoning}, stream_format)
+                    fallbacks.append(TEMPLATE_REASONING if reasoning else REASONING_UNAVAILABLE)
+            
+            processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
+            yield format_stream_event("done", {
+                "trip_id": trip_id,
+                "calculation_time_ms": processing_time,
+                "degraded": bool(fallbacks),
+                "fallbacks": fallbacks
+            }, stream_format)
+        except Exception as e:
+            logger.error(f"Error streaming trip: {e}")
+            yield format_stream_event("error", {"detail": str(e)}, stream_format)
+    
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+def batch_lane_key(trip_request: TripRequest) -> tuple:
+    """Key identifying trips that share the same origin and destination"""
+    def location_key(location: LocationModel):
+        if location.latitude:
+            return (location.latitude, location.longitude)
+        return RouteService.geocode_cache_key(location.address)
+    return (location_key(trip_request.start_location), location_key(trip_request.end_location))
+
+@app.post("/calculate-trips/batch", response_model=BatchTripResponse)
+async def calculate_trips_batch(batch_request: BatchTripRequest,
+                                route_service: RouteService = Depends(get_route_service),
+                                reasoning_jobs: ReasoningJobBackend = Depends(get_reasoning_jobs)):
+    """Calculate CO2 emissions for many trips at once, sharing routing work between identical lanes"""
+    start_time = datetime.now()
+    batch_id = f"batch_{int(start_time.timestamp())}"
+    semaphore = asyncio.Semaphore(max(1, BATCH_MAX_CONCURRENCY))
+    
+    # Identical origin/destination pairs are geocoded and routed only once
+    route_tasks = {}
+    
+    async def route_lane(trip_request: TripRequest) -> dict:
+        async with semaphore:
+            # Each lane (and below, each trip) gets its own deadline rather than sharing one for the batch
+            start_deadline(REQUEST_DEADLINE_SECONDS)
+            start_coords, end_coords = await asyncio.gather(
+                resolve_coordinates(trip_request.start_location, route_service),
+                resolve_coordinates(trip_request.end_location, route_service)
+            )
+            return await route_service.get_route_with_cities(start_coords, end_coords)
+    
+    async def calculate_item(index: int, trip_request: TripRequest) -> BatchTripResult:
+        item_start = datetime.now()
+        try:
+            route_data = await route_tasks[batch_lane_key(trip_request)]
+            async with semaphore:
+                start_deadline(REQUEST_DEADLINE_SECONDS)
+                result = await build_trip_response(
+                    trip_request, route_data, f"{batch_id}_{index}", item_start,
+                    include_reasoning=batch_request.include_reasoning,
+                    reasoning_jobs=reasoning_jobs
                 )
+            return BatchTripResult(index=index, result=result)
+        except Exception as e:
+            logger.error(f"Error calculating batch trip {index}: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            return BatchTripResult(index=index, error=str(detail))
+    
+    for trip_request in batch_request.trips:
+        key = batch_lane_key(trip_request)
+        if key not in route_tasks:
+            route_tasks[key] = asyncio.ensure_future(route_lane(trip_request))
+    
+    results = await asyncio.gather(*(
+        calculate_item(index, trip_request) for index, trip_request in enumerate(batch_request.trips)
+    ))
+    succeeded = sum(1 for result in results if result.error is None)
+    
+    return BatchTripResponse(
+        results=results,
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        unique_routes=len(route_tasks),
+        calculation_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
+    )
+
+@app.post("/route-alternatives", response_model=RouteAlternativesResponse)
+async def get_route_alternatives(trip_request: TripRequest,
+                                 count: int = Query(3, ge=1, le=ROUTE_ALTERNATIVES_MAX),
+                                 route_service: RouteService = Depends(get_route_service)):
+    """Compare alternative routes for a trip and rank them by WTW CO2 for the requested vehicle and fuel"""
+    start_time = datetime.now()
+    trip_id = f"trip_{int(start_time.timestamp())}"
+    start_deadline(REQUEST_DEADLINE_SECONDS)
+    
+    try:
+        start_coords, end_coords = await asyncio.gather(
+            resolve_coordinates(trip_request.start_location, route_service),
+            resolve_coordinates(trip_request.end_location, route_service)
+        )
+        routes = await route_service.get_route_alternatives(start_coords, end_coords, count)
         
-        # Generate reasoning with city-specific information
-        city_info = [{"name": city["name"], "distance": city["segment_distance_km"], 
-                     "terrain": city.get("terrain", trip_request.terrain),
-                     "road_type": city.get("road_type", trip_request.road_type)} 
-                     for city in route_data["cities"]]
+        # Score every alternative for every fuel in one kernel pass, then split per route
+        comparison = compare_route_emissions(trip_request, [city for route in routes for city in route["cities"]])
+        route_comparisons = comparison.split([len(route["cities"]) for route in routes])
+        totals = [route_comparison.total(trip_request.vehicle_type, trip_request.fuel_type)
+                  for route_comparison in route_comparisons]
+        ranking = sorted(range(len(routes)), key=lambda i: totals[i].wtw_kg)
+        best_wtw = totals[ranking[0]].wtw_kg
         
-        reasoning = await ReasoningService.generate_reasoning({
-            "vehicle_type": trip_request.vehicle_type,
-            "fuel_type": trip_request.fuel_type,
-            "distance_km": route_data["distance_km"],
-            "terrain": trip_request.terrain,
-            "road_type": trip_request.road_type,
-            "load_weight": trip_request.load_weight,
-            "cities": city_info,
-            "total_cities": len(route_data["cities"])
-        })
+        alternatives = [
+            RouteAlternative(
+                rank=rank,
+                route_id=routes[i]["route_id"],
+                distance_km=routes[i]["distance_km"],
+                duration_seconds=routes[i]["duration_seconds"],
+                total_co2_emission=totals[i],
+                co2_difference_kg=totals[i].wtw_kg - best_wtw,
+                fuel_comparisons=route_comparisons[i].fuel_comparisons(trip_request.vehicle_type,
+                                                                       trip_request.fuel_type),
+                route_coordinates=routes[i]["coordinates"]
+            )
+            for rank, i in enumerate(ranking, start=1)
+        ]
         
-        # Calculate processing time
         processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
-        
-        return TripResponse(
+        return RouteAlternativesResponse(
             trip_id=trip_id,
-            total_distance_km=route_data["distance_km"],
-            total_fuel_consumption=fuel_consumption,
-            total_co2_emission=total_emission,
-            city_emissions=city_emissions,
-            fuel_comparisons=fuel_comparisons,
-            route_coordinates=route_data["coordinates"],
-            reasoning=reasoning,
-            calculation_time_ms=processing_time
+            recommended_route_id=alternatives[0].route_id,
+            alternatives=alternatives,
+            calculation_time_ms=processing_time,
+            degraded=any(route["fallbacks"] for route in routes),
+            fallbacks=sorted({fallback for route in routes for fallback in route["fallbacks"]})
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error calculating trip: {e}")
+        logger.error(f"Error comparing route alternatives: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/optimize-tour", response_model=TourResponse)
+async def optimize_tour(tour_request: TourRequest, route_service: RouteService = Depends(get_route_service),
+                        tour_pool: Optional[concurrent.futures.Executor] = Depends(get_tour_pool)):
+    """Order a multi-stop delivery tour for minimum WTW CO2, accounting for the load dropped at each stop"""
+    start_time = datetime.now()
+    start_deadline(REQUEST_DEADLINE_SECONDS)
+    stop_count = len(tour_request.stops)
+    if stop_count > TOUR_MAX_STOPS:
+        raise HTTPException(status_code=400, detail=f"A tour can have at most {TOUR_MAX_STOPS} stops")
+    demands = np.array([0.0] + [stop.demand_kg for stop in tour_request.stops] + [0.0])
+    initial_load = tour_request.load_weight if tour_request.load_weight is not None else float(demands.sum())
+    if tour_request.capacity_aware and initial_load < demands.sum():
+        raise HTTPException(status_code=400, detail="load_weight is less than the total demand of the stops")
+    if not tour_request.capacity_aware:
+        demands = np.zeros_like(demands)
+
+    try:
+        end = tour_request.depot if tour_request.return_to_depot else tour_request.end_location
+        locations = [tour_request.depot] + [stop.location for stop in tour_request.stops] + ([end] if end else [])
+        points = await asyncio.gather(*(resolve_coordinates(location, route_service) for location in locations))
+        distances, durations, matrix_fallback = await route_service.get_distance_matrix(list(points))
+        if end is None:
+            # Open tour: finish at a free dummy node after the last stop
+            distances = np.pad(distances, ((0, 1), (0, 1)))
+            durations = np.pad(durations, ((0, 1), (0, 1)))
+
+        per_km, per_kg_km = EmissionCalculator.cost_per_km(tour_request.vehicle_type, tour_request.fuel_type,
+                                                            tour_request.terrain, tour_request.road_type)
+        seq, _ = await asyncio.to_thread(
+            solve_tour, distances, demands, per_km, per_kg_km, initial_load,
+            tour_request.time_budget_seconds or TOUR_TIME_BUDGET_SECONDS, TOUR_STARTS, TOUR_WORKERS, tour_pool
+        )
+        baseline_co2 = tour_cost(np.arange(stop_count + 2), distances, demands, per_km, per_kg_km, initial_load)
+
+        legs = list(zip(seq[:-1], seq[1:]))
+        if end is None:
+            legs = legs[:-1]
+        leg_distances = [float(distances[a, b]) for a, b in legs]
+        loads = leg_loads(seq, demands, initial_load)[:len(legs)]
+        emissions = EmissionCalculator.calculate_segment_emissions(
+            tour_request.vehicle_type, leg_distances, [tour_request.terrain] * len(legs),
+            [tour_request.road_type] * len(legs), loads
+        )[FUEL_INDEX[tour_request.fuel_type]]
+        total = emissions.sum(axis=0)
+
+        processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
+        return TourResponse(
+            stop_order=[int(node) - 1 for node in seq[1:-1]],
+            legs=[
+                TourLeg(
+                    from_stop=int(a) - 1 if 0 < a <= stop_count else None,
+                    to_stop=int(b) - 1 if 0 < b <= stop_count else None,
+                    distance_km=leg_distances[i],
+                    duration_seconds=float(durations[a, b]),
+                    load_kg=float(loads[i]),
+                    co2_emission_kg=float(emissions[i, WTW])
+                )
+                for i, (a, b) in enumerate(legs)
+            ],
+            total_distance_km=sum(leg_distances),
+            total_duration_seconds=float(sum(durations[a, b] for a, b in legs)),
+            total_co2_emission=EmissionBreakdown(ttw_kg=float(total[TTW]), wtt_kg=float(total[WTT]),
+                                                 wtw_kg=float(total[WTW])),
+            baseline_co2_kg=baseline_co2,
+            co2_saving_kg=baseline_co2 - float(total[WTW]),
+            matrix_fallback=matrix_fallback,
+            calculation_time_ms=processing_time
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error optimizing tour: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/emission-matrix")
+async def get_emission_matrix(matrix_request: EmissionMatrixRequest,
+                              format: MatrixFormat = Query(MatrixFormat.JSON),
+                              route_service: RouteService = Depends(get_route_service)):
+    """WTW CO2 for every origin x destination pair and vehicle/fuel combination, from one distance matrix"""
+    start_time = datetime.now()
+    start_deadline(REQUEST_DEADLINE_SECONDS)
+    destinations = matrix_request.destinations or matrix_request.origins
+    point_count = max(len(matrix_request.origins), len(destinations))
+    if point_count > EMISSION_MATRIX_MAX_POINTS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {EMISSION_MATRIX_MAX_POINTS} origins and destinations are allowed")
+    if format == MatrixFormat.JSON and point_count > EMISSION_MATRIX_MAX_JSON_POINTS:
+        raise HTTPException(status_code=400,
+                            detail=f"format=json allows at most {EMISSION_MATRIX_MAX_JSON_POINTS} origins and "
+                                   f"destinations; use format=npz, arrow or csv for larger matrices")
+    if format == MatrixFormat.ARROW and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow output requires the 'pyarrow' package")
+
+    try:
+        # Only forward geocoding of locations without coordinates; no per-pair lookups or reasoning
+        origin_points = await asyncio.gather(*(resolve_coordinates(location, route_service)
+                                               for location in matrix_request.origins))
+        if matrix_request.destinations:
+            destination_points = await asyncio.gather(*(resolve_coordinates(location, route_service)
+                                                        for location in matrix_request.destinations))
+        else:
+            destination_points = origin_points
+        distances, durations, fallback = await route_service.get_distance_matrix(list(origin_points),
+                                                                                 list(destination_points))
+        emissions = EmissionCalculator.calculate_matrix_emissions(
+            matrix_request.vehicle_types, matrix_request.fuel_types, distances,
+            matrix_request.terrain, matrix_request.road_type, matrix_request.load_weight
+        )
+        args = (distances, durations, emissions, matrix_request.vehicle_types, matrix_request.fuel_types)
+        processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
+        headers = {"X-Distance-Fallback": str(fallback).lower(), "X-Calculation-Time-Ms": str(processing_time)}
+
+        if format == MatrixFormat.CSV:
+            return StreamingResponse(iter_csv(*args), media_type="text/csv", headers={
+                **headers, "Content-Disposition": "attachment; filename=emission_matrix.csv"
+            })
+        if format == MatrixFormat.NPZ:
+            return Response(to_npz_bytes(*args), media_type="application/octet-stream", headers={
+                **headers, "Content-Disposition": "attachment; filename=emission_matrix.npz"
+            })
+        if format == MatrixFormat.ARROW:
+            return Response(to_arrow_bytes(*args), media_type="application/vnd.apache.arrow.stream",
+                            headers=headers)
+        # Serialized directly; the generic encoder is far slower on large nested lists
+        return Response(json.dumps({
+            "vehicle_types": [vehicle.value for vehicle in matrix_request.vehicle_types],
+            "fuel_types": [fuel.value for fuel in matrix_request.fuel_types],
+            "distances_km": np.round(distances, 3).tolist(),
+            "durations_seconds": np.round(durations).tolist(),
+            "co2_wtw_kg": np.round(emissions, 4).tolist(),  # [vehicle][fuel][origin][destination]
+            "distance_fallback": fallback,
+            "calculation_time_ms": processing_time
+        }), media_type="application/json")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculating emission matrix: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/reasoning/{job_id}", response_model=ReasoningJobResponse)
+async def get_reasoning_job(job_id: str, reasoning_jobs: ReasoningJobBackend = Depends(get_reasoning_jobs)):
+    """Poll the status and result of a background reasoning job"""
+    job = reasoning_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Reasoning job not found: {job_id}")
+    return ReasoningJobResponse(job_id=job.job_id, status=job.status, reasoning=job.reasoning, error=job.error,
+                                fallbacks=job.fallbacks)
+
+@app.get("/metrics")
+async def get_metrics(route_service: RouteService = Depends(get_route_service)):
+    """Prometheus metrics: stage, upstream and request latency histograms plus cache hit ratios"""
+    if not REGISTRY.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false)")
+    caches = route_service.cache_stats()
+    caches["reasoning"] = ReasoningService.cache_stats()
+    extra_lines = cache_metrics(caches) + circuit_metrics(breaker_states())
+    return Response(REGISTRY.render(extra_lines), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache-stats")
+async def get_cache_stats(route_service: RouteService = Depends(get_route_service)):
+    """Get hit/miss counters for the geocoding and reasoning caches"""
+    stats = route_service.cache_stats()
+    stats["reasoning"] = ReasoningService.cache_stats()
+    return stats
+
 @app.get("/emission-factors")
 async def get_emission_factors():
     """Get all emission factors for reference"""
@@ -217,61 +680,57 @@ async def get_road_types():
     return [{"value": rt.value, "label": rt.value.title()} for rt in RoadType]
 
 @app.post("/city-emissions-heatmap")
-async def get_city_emissions_heatmap(trip_request: TripRequest):
+async def get_city_emissions_heatmap(trip_request: TripRequest,
+                                     route_service: RouteService = Depends(get_route_service)):
     """Get city-wise emissions data for heatmap visualization"""
+    start_deadline(REQUEST_DEADLINE_SECONDS)
     try:
         # Geocode addresses if coordinates not provided
-        if not trip_request.start_location.latitude:
-            start_coords = await route_service.geocode_address(trip_request.start_location.address)
-        else:
-            start_coords = (trip_request.start_location.latitude, trip_request.start_location.longitude)
-            
-        if not trip_request.end_location.latitude:
-            end_coords = await route_service.geocode_address(trip_request.end_location.address)
-        else:
-            end_coords = (trip_request.end_location.latitude, trip_request.end_location.longitude)
+        start_coords = await resolve_coordinates(trip_request.start_location, route_service)
+        end_coords = await resolve_coordinates(trip_request.end_location, route_service)
+        
+        # Reuse the route computed by /calculate-trip when its route_id is still cached,
+        # but only if it was issued for this request's start and end locations
+        route_data = None
+        if trip_request.route_id:
+            if not RouteService.route_id_matches(trip_request.route_id, start_coords, end_coords):
+                raise HTTPException(status_code=400,
+                                    detail="route_id does not match the requested start and end locations")
+            route_data = route_service.get_cached_route(trip_request.route_id)
         
-        # Get route with cities
-        route_data = route_service.route
+        if route_data is None:
+            # Get route with cities (served from the route cache for recently calculated trips)
+            route_data = await route_service.get_route_with_cities(start_coords, end_coords)
         
         # Calculate emissions for each city
-        heatmap_data = []
-        for city_data in route_data["cities"]:
-            city_terrain = city_data.get("terrain", trip_request.terrain)
-            city_road_type = city_data.get("road_type", trip_request.road_type)
-            
-            # Calculate emission for this city
-            city_base_emission = EmissionCalculator.calculate_base_emission(
-                trip_request.vehicle_type,
-                trip_request.fuel_type,
-                city_data["segment_distance_km"]
-            )
-            
-            city_emission = EmissionCalculator.apply_modifiers(
-                city_base_emission,
-                city_terrain,
-                city_road_type,
-                trip_request.load_weight,
-                city_data["segment_distance_km"]
+        with stage("emissions"):
+            city_emissions = compare_route_emissions(trip_request, route_data["cities"]).city_emissions(
+                trip_request.vehicle_type, trip_request.fuel_type
             )
-            
+        heatmap_data = []
+        for city_data, city_emission in zip(route_data["cities"], city_emissions):
             heatmap_data.append({
                 "city": city_data["name"],
                 "latitude": city_data["latitude"],
                 "longitude": city_data["longitude"],
-                "emission_kg": city_emission.wtw_kg,
+                "emission_kg": city_emission.co2_emission_kg,
                 "distance_km": city_data["segment_distance_km"],
-                "terrain": city_terrain.value,
-                "road_type": city_road_type.value,
-                "emission_intensity": city_emission.wtw_kg / city_data["segment_distance_km"] if city_data["segment_distance_km"] > 0 else 0
+                "terrain": city_emission.terrain.value,
+                "road_type": city_emission.road_type.value,
+                "emission_intensity": city_emission.co2_emission_kg / city_data["segment_distance_km"] if city_data["segment_distance_km"] > 0 else 0
             })
         
         return {
+            "route_id": route_data["route_id"],
             "heatmap_data": heatmap_data,
             "total_cities": len(heatmap_data),
-            "route_coordinates": route_data["coordinates"]
+            "route_coordinates": route_data["coordinates"],
+            "degraded": bool(route_data["fallbacks"]),
+            "fallbacks": route_data["fallbacks"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating heatmap data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -279,5 +738,4 @@ async def get_city_emissions_heatmap(trip_request: TripRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    route_service = RouteService()
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
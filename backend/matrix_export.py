@@ -0,0 +1,81 @@
+import importlib.util
+import io
+from typing import Iterator, List, Sequence
+
+import numpy as np
+
+from models import VehicleType, FuelType
+
+
+# Origins written per CSV chunk when streaming
+CSV_ORIGINS_PER_CHUNK = 16
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def emission_columns(vehicle_types: Sequence[VehicleType], fuel_types: Sequence[FuelType]) -> List[str]:
+    return [f"{vehicle.value}_{fuel.value}_co2_wtw_kg" for vehicle in vehicle_types for fuel in fuel_types]
+
+
+def to_npz_bytes(distances_km: np.ndarray, durations_s: np.ndarray, emissions: np.ndarray,
+                 vehicle_types: Sequence[VehicleType], fuel_types: Sequence[FuelType]) -> bytes:
+    """Uncompressed .npz with co2_wtw_kg shaped (vehicle, fuel, origin, destination)"""
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        co2_wtw_kg=emissions,
+        distances_km=distances_km.astype(np.float32),
+        durations_seconds=durations_s.astype(np.float32),
+        vehicle_types=np.array([vehicle.value for vehicle in vehicle_types]),
+        fuel_types=np.array([fuel.value for fuel in fuel_types])
+    )
+    return buffer.getvalue()
+
+
+def iter_csv(distances_km: np.ndarray, durations_s: np.ndarray, emissions: np.ndarray,
+             vehicle_types: Sequence[VehicleType], fuel_types: Sequence[FuelType]) -> Iterator[str]:
+    """CSV text in chunks of CSV_ORIGINS_PER_CHUNK origins, header first"""
+    columns = ["origin", "destination", "distance_km", "duration_seconds"] + emission_columns(vehicle_types, fuel_types)
+    yield ",".join(columns) + "\n"
+    origins, destinations = distances_km.shape
+    # (origin, destination, vehicle * fuel)
+    combos = emissions.reshape(-1, origins, destinations).transpose(1, 2, 0)
+    for start in range(0, origins, CSV_ORIGINS_PER_CHUNK):
+        stop = min(start + CSV_ORIGINS_PER_CHUNK, origins)
+        rows = np.column_stack([
+            np.repeat(np.arange(start, stop), destinations),
+            np.tile(np.arange(destinations), stop - start),
+            distances_km[start:stop].reshape(-1),
+            durations_s[start:stop].reshape(-1),
+            combos[start:stop].reshape(-1, combos.shape[2])
+        ])
+        buffer = io.StringIO()
+        fmt = ["%d", "%d", "%.3f", "%.0f"] + ["%.4f"] * combos.shape[2]
+        np.savetxt(buffer, rows, fmt=fmt, delimiter=",")
+        yield buffer.getvalue()
+
+
+def to_arrow_bytes(distances_km: np.ndarray, durations_s: np.ndarray, emissions: np.ndarray,
+                   vehicle_types: Sequence[VehicleType], fuel_types: Sequence[FuelType]) -> bytes:
+    """Arrow IPC stream with the same columns as the CSV (requires pyarrow)"""
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError("Arrow output requires the 'pyarrow' package (pip install pyarrow)") from e
+
+    origins, destinations = distances_km.shape
+    columns = {
+        "origin": pa.array(np.repeat(np.arange(origins, dtype=np.int32), destinations)),
+        "destination": pa.array(np.tile(np.arange(destinations, dtype=np.int32), origins)),
+        "distance_km": pa.array(distances_km.astype(np.float32).reshape(-1)),
+        "duration_seconds": pa.array(durations_s.astype(np.float32).reshape(-1))
+    }
+    for name, values in zip(emission_columns(vehicle_types, fuel_types), emissions.reshape(-1, origins * destinations)):
+        columns[name] = pa.array(values)
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,245 @@
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from config import METRICS_ENABLED
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, description, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra_lines: Sequence[str] = ()) -> str:
+        """Prometheus text exposition of every metric, followed by extra_lines"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(METRICS_ENABLED)
+STAGE_SECONDS = REGISTRY.histogram("greenroute_stage_duration_seconds", "Time spent per processing stage", ["stage"])
+UPSTREAM_SECONDS = REGISTRY.histogram("greenroute_upstream_request_duration_seconds",
+                                      "Latency of calls to external services", ["upstream"])
+UPSTREAM_REQUESTS = REGISTRY.counter("greenroute_upstream_requests_total",
+                                     "Calls to external services by outcome (ok, error, timeout)",
+                                     ["upstream", "outcome"])
+HTTP_SECONDS = REGISTRY.histogram("greenroute_http_request_duration_seconds", "API request latency",
+                                  ["method", "path", "status"])
+
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def request_timings() -> Optional[Dict[str, float]]:
+    """The current request's timings breakdown, if one was requested"""
+    return _request_timings.get()
+
+
+def start_request_timings() -> Dict[str, float]:
+    """Collect a per-stage breakdown (ms) for the current request and return it"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+class _NoOpTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+NOOP_TIMER = _NoOpTimer()
+
+
+class _StageTimer(_NoOpTimer):
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: Optional[Dict[str, float]]):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        if REGISTRY.enabled:
+            STAGE_SECONDS.observe(elapsed, self.name)
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed * 1000
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+class _UpstreamTimer(_NoOpTimer):
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self.start, self.name)
+        UPSTREAM_REQUESTS.inc(self.name, upstream_outcome(exc))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+def stage(name: str):
+    """Context manager (sync or async) timing one processing stage"""
+    timings = _request_timings.get()
+    if not REGISTRY.enabled and timings is None:
+        return NOOP_TIMER
+    return _StageTimer(name, timings)
+
+
+def upstream(name: str):
+    """Context manager (sync or async) timing and counting one call to an external service"""
+    return _UpstreamTimer(name) if REGISTRY.enabled else NOOP_TIMER
+
+
+def upstream_outcome(exc: Optional[BaseException]) -> str:
+    if exc is None:
+        return "ok"
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+def cache_metrics(caches: Dict[str, Optional[Dict[str, Any]]]) -> List[str]:
+    """Hit/miss counters and hit ratio gauges from cache stats() dicts"""
+    samples = {"greenroute_cache_hits_total": [], "greenroute_cache_misses_total": [], "greenroute_cache_hit_ratio": []}
+    for name, stats in sorted(caches.items()):
+        if not stats:
+            continue
+        hits = stats.get("hits", stats.get("memory_hits", 0) + stats.get("disk_hits", 0))
+        labels = _format_labels(("cache",), (name,))
+        samples["greenroute_cache_hits_total"].append(f"greenroute_cache_hits_total{labels} {hits}")
+        samples["greenroute_cache_misses_total"].append(f"greenroute_cache_misses_total{labels} {stats.get('misses', 0)}")
+        samples["greenroute_cache_hit_ratio"].append(f"greenroute_cache_hit_ratio{labels} {stats.get('hit_ratio', 0.0)}")
+    lines = []
+    for metric, metric_type in (("greenroute_cache_hits_total", "counter"), ("greenroute_cache_misses_total", "counter"),
+                                ("greenroute_cache_hit_ratio", "gauge")):
+        lines.append(f"# TYPE {metric} {metric_type}")
+        lines.extend(samples[metric])
+    return lines
+
+
+def circuit_metrics(states: Dict[str, str]) -> List[str]:
+    """1 for each upstream whose circuit breaker is currently open (failing fast), else 0"""
+    lines = ["# TYPE greenroute_circuit_open gauge"]
+    for name, state in sorted(states.items()):
+        lines.append(f"greenroute_circuit_open{_format_labels(('upstream',), (name,))} {int(state == 'open')}")
+    return lines
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel, Field
 
 # Enums
@@ -25,6 +25,27 @@ class RoadType(str, Enum):
     URBAN = "urban"
     RURAL = "rural"
 
+class ReasoningMode(str, Enum):
+    INLINE = "inline"  # generate reasoning before responding
+    BACKGROUND = "background"  # respond immediately with a reasoning_job_id to poll
+    OFF = "off"
+
+class ReasoningEngine(str, Enum):
+    TEMPLATE = "template"  # rendered locally from the computed figures
+    GEMINI = "gemini"  # LLM reasoning
+
+class ReasoningJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class MatrixFormat(str, Enum):
+    JSON = "json"
+    CSV = "csv"  # streamed
+    NPZ = "npz"  # NumPy archive
+    ARROW = "arrow"  # Arrow IPC stream, requires pyarrow
+
 # Pydantic Models
 class LocationModel(BaseModel):
     address: str
@@ -39,6 +60,11 @@ class TripRequest(BaseModel):
     load_weight: float = Field(gt=0, description="Load weight in kg")
     terrain: TerrainType = TerrainType.FLAT
     road_type: RoadType = RoadType.HIGHWAY
+    reasoning_mode: ReasoningMode = ReasoningMode.INLINE
+    reasoning_provider: Optional[ReasoningEngine] = Field(default=None, description="Reasoning provider for this trip; defaults to REASONING_PROVIDER")
+    compare_vehicles: bool = Field(default=False, description="Also compare emissions across vehicle types")
+    include_timings: bool = Field(default=False, description="Return a per-stage latency breakdown in ms")
+    route_id: Optional[str] = Field(default=None, description="Route id from a previous response, to reuse its cached route")
 
 class CityEmission(BaseModel):
     city: str
@@ -46,6 +72,9 @@ class CityEmission(BaseModel):
     co2_emission_kg: float
     terrain: TerrainType
     road_type: RoadType
+    road_type_shares: Optional[Dict[RoadType, float]] = None
+    climb_m: Optional[float] = None
+    grade_percent: Optional[float] = None
 
 class EmissionBreakdown(BaseModel):
     ttw_kg: float  # Tank-to-Wheel
@@ -57,8 +86,14 @@ class FuelComparison(BaseModel):
     emission_kg: float
     percentage_difference: float
 
+class VehicleComparison(BaseModel):
+    vehicle_type: VehicleType
+    emission_kg: float
+    percentage_difference: float
+
 class TripResponse(BaseModel):
     trip_id: str
+    route_id: str
     total_distance_km: float
     total_fuel_consumption: float
     total_co2_emission: EmissionBreakdown
@@ -67,6 +102,97 @@ class TripResponse(BaseModel):
     route_coordinates: List[List[float]]
     reasoning: str
     calculation_time_ms: int
+    reasoning_job_id: Optional[str] = None
+    vehicle_comparisons: Optional[List[VehicleComparison]] = None
+    timings: Optional[Dict[str, float]] = None
+    degraded: bool = Field(default=False, description="True when a fallback replaced an unavailable upstream")
+    fallbacks: List[str] = Field(default_factory=list, description="Fallbacks used, e.g. straight_line_route")
+
+class RouteAlternative(BaseModel):
+    rank: int
+    route_id: str
+    distance_km: float
+    duration_seconds: float
+    total_co2_emission: EmissionBreakdown
+    co2_difference_kg: float  # WTW above the lowest-emission alternative
+    fuel_comparisons: List[FuelComparison]
+    route_coordinates: List[List[float]]
+
+class RouteAlternativesResponse(BaseModel):
+    trip_id: str
+    recommended_route_id: str
+    alternatives: List[RouteAlternative]
+    calculation_time_ms: int
+    degraded: bool = False
+    fallbacks: List[str] = Field(default_factory=list)
+
+class ReasoningJobResponse(BaseModel):
+    job_id: str
+    status: ReasoningJobStatus
+    reasoning: Optional[str] = None
+    error: Optional[str] = None
+    fallbacks: List[str] = Field(default_factory=list, description="template_reasoning when the provider failed")
+
+class BatchTripRequest(BaseModel):
+    trips: List[TripRequest] = Field(min_length=1, max_length=1000)
+    include_reasoning: bool = Field(default=True, description="Generate AI reasoning for every trip")
+
+class BatchTripResult(BaseModel):
+    index: int
+    result: Optional[TripResponse] = None
+    error: Optional[str] = None
+
+class BatchTripResponse(BaseModel):
+    results: List[BatchTripResult]
+    succeeded: int
+    failed: int
+    unique_routes: int
+    calculation_time_ms: int
+
+class EmissionMatrixRequest(BaseModel):
+    origins: List[LocationModel] = Field(min_length=1)
+    destinations: Optional[List[LocationModel]] = Field(default=None, description="Defaults to the origins")
+    vehicle_types: List[VehicleType] = Field(default_factory=lambda: list(VehicleType), min_length=1)
+    fuel_types: List[FuelType] = Field(default_factory=lambda: list(FuelType), min_length=1)
+    load_weight: float = Field(default=0, ge=0, description="Load weight in kg")
+    terrain: TerrainType = TerrainType.FLAT
+    road_type: RoadType = RoadType.HIGHWAY
+
+class TourStop(BaseModel):
+    location: LocationModel
+    demand_kg: float = Field(default=0, ge=0, description="Load delivered at this stop in kg")
+
+class TourRequest(BaseModel):
+    depot: LocationModel
+    stops: List[TourStop] = Field(min_length=1)
+    return_to_depot: bool = True
+    end_location: Optional[LocationModel] = Field(default=None, description="Where an open tour must finish; ignored when returning to the depot")
+    vehicle_type: VehicleType
+    fuel_type: FuelType
+    load_weight: Optional[float] = Field(default=None, ge=0, description="Load on departure in kg; defaults to the total demand")
+    capacity_aware: bool = Field(default=True, description="Reduce the load by each stop's demand after the drop")
+    terrain: TerrainType = TerrainType.FLAT
+    road_type: RoadType = RoadType.HIGHWAY
+    time_budget_seconds: Optional[float] = Field(default=None, gt=0, le=60)
+
+class TourLeg(BaseModel):
+    from_stop: Optional[int] = Field(description="Index into stops; null for the depot")
+    to_stop: Optional[int] = Field(description="Index into stops; null for the depot or end location")
+    distance_km: float
+    duration_seconds: float
+    load_kg: float
+    co2_emission_kg: float
+
+class TourResponse(BaseModel):
+    stop_order: List[int]
+    legs: List[TourLeg]
+    total_distance_km: float
+    total_duration_seconds: float
+    total_co2_emission: EmissionBreakdown
+    baseline_co2_kg: float = Field(description="WTW CO2 visiting the stops in request order")
+    co2_saving_kg: float
+    matrix_fallback: bool
+    calculation_time_ms: int
 
 # Constants based on ISO 14083 and GLEC Framework
 EMISSION_FACTORS = {
@@ -0,0 +1,201 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from distance import haversine_km
+
+
+logger = logging.getLogger(__name__)
+
+# Address keys, matching Nominatim's address fields
+PLACE_KINDS = ["city", "town", "village", "county"]
+
+PLACE_DTYPE = np.dtype([
+    ("lat", "f8"), ("lon", "f8"), ("radius_km", "f4"), ("kind", "u1"),
+    ("name", "U64"), ("state", "U48"), ("country", "U48")
+])
+
+DEFAULT_CELL_DEGREES = 0.25
+
+
+class PlacesIndex:
+    """Grid spatial index over memory-mapped place records
+
+    A lookup scans the point's cell and its eight neighbours, so place radii
+    should not exceed the cell size (0.25 degrees is ~28 km of latitude).
+    """
+
+    def __init__(self, places: np.ndarray, coords: np.ndarray, cells: np.ndarray, offsets: np.ndarray,
+                 cell_degrees: float):
+        # Plain ndarray views of the memory maps avoid np.memmap's per-operation overhead
+        self.places = np.asarray(places)
+        # (lat, lon, radius_km) rows kept apart from the string fields so distance scans touch little memory
+        self.coords = np.asarray(coords)
+        self.cells = np.asarray(cells)
+        self.offsets = np.asarray(offsets)
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees))
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, directory: str) -> "PlacesIndex":
+        """Memory-map an index directory written by build()"""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(
+            np.load(os.path.join(directory, "places.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "coords.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "cells.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r"),
+            meta["cell_degrees"]
+        )
+
+    @staticmethod
+    def build(records: Iterable[Dict[str, Any]], directory: str,
+              cell_degrees: float = DEFAULT_CELL_DEGREES) -> int:
+        """Write an index directory from place dicts (name, kind, lat, lon, state, country, radius_km)"""
+        places = np.array([
+            (float(r["lat"]), float(r["lon"]), float(r["radius_km"]), PLACE_KINDS.index(r["kind"]),
+             r["name"], r.get("state") or "", r.get("country") or "")
+            for r in records
+        ], dtype=PLACE_DTYPE)
+        columns = int(math.ceil(360 / cell_degrees))
+        cell_ids = PlacesIndex.cell_ids(places["lat"], places["lon"], cell_degrees, columns)
+        order = np.argsort(cell_ids, kind="stable")
+        places, cell_ids = places[order], cell_ids[order]
+        cells, starts = np.unique(cell_ids, return_index=True)
+        offsets = np.append(starts, len(places)).astype(np.int64)
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "places.npy"), places)
+        np.save(os.path.join(directory, "coords.npy"),
+                np.stack([places["lat"], places["lon"], places["radius_km"].astype(np.float64)], axis=1))
+        np.save(os.path.join(directory, "cells.npy"), cells.astype(np.int64))
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"cell_degrees": cell_degrees, "places": len(places)}, f)
+        return len(places)
+
+    @staticmethod
+    def cell_ids(lat, lon, cell_degrees: float, columns: int) -> np.ndarray:
+        rows = np.floor((np.asarray(lat) + 90) / cell_degrees).astype(np.int64)
+        cols = np.floor((np.asarray(lon) + 180) / cell_degrees).astype(np.int64) % columns
+        return rows * columns + cols
+
+    def _candidate_ranges(self, lat: float, lon: float) -> List[tuple]:
+        """Record ranges covering the point's grid cell and its eight neighbours
+
+        Cells are sorted row-major, so the three cells of each neighbouring
+        row form one contiguous record range.
+        """
+        row = math.floor((lat + 90) / self.cell_degrees)
+        col = math.floor((lon + 180) / self.cell_degrees)
+        rows = np.arange(row - 1, row + 2, dtype=np.int64) * self.columns
+        lo = self.offsets[np.searchsorted(self.cells, rows + max(col - 1, 0), side="left")]
+        hi = self.offsets[np.searchsorted(self.cells, rows + min(col + 1, self.columns - 1), side="right")]
+        return [(int(start), int(end)) for start, end in zip(lo, hi) if end > start]
+
+    def lookup(self, lat: float, lon: float) -> Optional[Dict[str, str]]:
+        """Nominatim-style address dict of the nearest place covering the point, or None"""
+        ranges = self._candidate_ranges(lat, lon)
+        if ranges:
+            indices = np.concatenate([np.arange(start, end) for start, end in ranges])
+            coords = self.coords[indices]
+            distances = haversine_km(lat, lon, coords[:, 0], coords[:, 1])
+            # Distance relative to each place's radius, so a large city wins over a nearby hamlet
+            coverage = distances / np.maximum(coords[:, 2], 1e-6)
+            best = int(np.argmin(coverage))
+            if coverage[best] <= 1.0:
+                self.hits += 1
+                return self._address(int(indices[best]))
+        self.misses += 1
+        return None
+
+    def _address(self, index: int) -> Dict[str, str]:
+        record = self.places[index]
+        address = {PLACE_KINDS[int(record["kind"])]: str(record["name"])}
+        if record["state"]:
+            address["state"] = str(record["state"])
+        if record["country"]:
+            address["country"] = str(record["country"])
+        return address
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "places": len(self.places),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+def place_radius_km(kind: str, population: int = 0) -> float:
+    """Approximate extent of a place, from its population where known"""
+    if kind == "county":
+        return 25.0
+    base = {"city": 8.0, "town": 4.0, "village": 2.0}[kind]
+    return float(min(25.0, max(base, math.sqrt(max(population, 0)) / 100)))
+
+
+def read_csv_places(path: str) -> List[Dict[str, Any]]:
+    """Read places from a CSV with name, kind, lat, lon and optional state, country, radius_km, population"""
+    with open(path, newline="", encoding="utf-8") as f:
+        records = []
+        for row in csv.DictReader(f):
+            kind = row.get("kind") or "city"
+            row["kind"] = kind
+            if not row.get("radius_km"):
+                row["radius_km"] = place_radius_km(kind, int(row.get("population") or 0))
+            records.append(row)
+        return records
+
+
+def read_geonames_places(path: str) -> List[Dict[str, Any]]:
+    """Read populated places from a GeoNames dump (e.g. cities15000.txt)"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15 or fields[6] not in ("P", "A"):
+                continue
+            population = int(fields[14] or 0)
+            if fields[6] == "A":
+                if fields[7] != "ADM2":
+                    continue
+                kind = "county"
+            elif fields[7] in ("PPLC", "PPLA", "PPLA2") or population >= 100000:
+                kind = "city"
+            elif population >= 10000:
+                kind = "town"
+            else:
+                kind = "village"
+            records.append({
+                "name": fields[1], "kind": kind, "lat": fields[4], "lon": fields[5],
+                "country": fields[8],
+                "radius_km": place_radius_km(kind, population)
+            })
+    return records
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the offline places index used for reverse geocoding")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build an index directory from a places file")
+    build.add_argument("input", help="Places CSV or GeoNames dump")
+    build.add_argument("output", help="Output index directory")
+    build.add_argument("--format", choices=["csv", "geonames"], default="csv")
+    build.add_argument("--cell-degrees", type=float, default=DEFAULT_CELL_DEGREES)
+    args = parser.parse_args()
+
+    reader = read_geonames_places if args.format == "geonames" else read_csv_places
+    count = PlacesIndex.build(reader(args.input), args.output, args.cell_degrees)
+    logger.info(f"Indexed {count} places into {args.output}")
@@ -1,31 +1,188 @@
+import asyncio
 import os
 import json
-from typing import Dict, Any
-import google.generativeai as genai
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, AsyncIterator, Optional
 
-from dotenv import load_dotenv
+from cache import TieredCache, SingleFlight
+from metrics import upstream
+from reasoning_templates import render_reasoning
+from resilience import call_upstream
+from config import (REASONING_CACHE_SIZE, REASONING_CACHE_TTL_SECONDS, REASONING_CACHE_PATH,
+                    REASONING_CACHE_DISK_MAX_ENTRIES, REASONING_CACHE_DISTANCE_PRECISION, GEMINI_TIMEOUT_SECONDS,
+                    GEMINI_MODEL, REASONING_PROVIDER)
 
+logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Circuit breaker name for the model API
+GEMINI = "gemini"
 
-api_key = os.getenv("GEMINI_API_KEY")
 
-if not api_key:
-    print("GEMINI_API_KEY environment variable not set.")
-else:
-    try:
-        genai.configure(api_key=api_key)
-        print("Google Generative AI configured successfully.")
-    except Exception as e:
-        print(f"Failed to configure Google Generative AI: {e}")
+class ReasoningProvider:
+    """Turns a trip summary into reasoning HTML"""
+    
+    name = ""
+    # Whether results go through the reasoning cache
+    cacheable = True
+    
+    async def generate(self, trip_data: Dict[str, Any]) -> str:
+        raise NotImplementedError
+    
+    async def stream(self, trip_data: Dict[str, Any]) -> AsyncIterator[str]:
+        yield await self.generate(trip_data)
+
+
+class DisabledProvider(ReasoningProvider):
+    """No reasoning at all"""
+    
+    name = "off"
+    cacheable = False
+    
+    async def generate(self, trip_data: Dict[str, Any]) -> str:
+        return ""
+
+
+class TemplateProvider(ReasoningProvider):
+    """Deterministic HTML rendered locally from the computed figures; cheaper to render than to cache"""
+    
+    name = "template"
+    cacheable = False
+    
+    async def generate(self, trip_data: Dict[str, Any]) -> str:
+        return render_reasoning(trip_data)
+
+
+class GeminiProvider(ReasoningProvider):
+    """Gemini through google-generativeai; the SDK is imported and configured on first use, off the event loop"""
+    
+    name = GEMINI
+    
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self._genai = None
+        self._lock = threading.Lock()
+    
+    def sdk(self):
+        """The configured google.generativeai module"""
+        with self._lock:
+            if self._genai is None:
+                try:
+                    import google.generativeai as genai
+                except ImportError as e:
+                    raise RuntimeError("Gemini reasoning requires the 'google-generativeai' package "
+                                       "(pip install google-generativeai)") from e
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise RuntimeError("GEMINI_API_KEY environment variable not set")
+                genai.configure(api_key=api_key)
+                logger.info(f"Google Generative AI configured ({self.model_name})")
+                self._genai = genai
+            return self._genai
+    
+    async def create_model(self):
+        # Importing the SDK takes around a second, so the first call does it in a worker thread
+        genai = self._genai or await asyncio.to_thread(self.sdk)
+        return genai.GenerativeModel(self.model_name)
+    
+    async def generate(self, trip_data: Dict[str, Any]) -> str:
+        prompt = ReasoningService.build_prompt(trip_data)
+        model = await self.create_model()
+        
+        async def generate(timeout: float):
+            async with upstream("gemini"):
+                return await model.generate_content_async(prompt,
+                                                          generation_config={"response_mime_type": "application/json"},
+                                                          request_options={"timeout": timeout})
+        
+        response = await call_upstream(GEMINI, generate, GEMINI_TIMEOUT_SECONDS)
+        # The model answers with a one-key JSON object wrapping the HTML
+        data = json.loads(response.candidates[0].content.parts[0].text)
+        return next(iter(data.values()))
+    
+    async def stream(self, trip_data: Dict[str, Any]) -> AsyncIterator[str]:
+        prompt = ReasoningService.build_prompt(trip_data)
+        model = await self.create_model()
+        
+        # Plain text output: a JSON envelope can't be rendered until it is complete
+        # Timed until the stream opens; chunk delivery is paced by the client
+        async def open_stream(timeout: float):
+            async with upstream("gemini_stream"):
+                return await model.generate_content_async(prompt, stream=True, request_options={"timeout": timeout})
+        
+        response = await call_upstream(GEMINI, open_stream, GEMINI_TIMEOUT_SECONDS)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
 
 
 class ReasoningService:
     """Service for generating explanations using AI reasoning"""
     
+    _cache: Optional[TieredCache] = None
+    _single_flight = SingleFlight()
+    providers: Dict[str, ReasoningProvider] = {
+        provider.name: provider for provider in (GeminiProvider(), TemplateProvider(), DisabledProvider())
+    }
+    
+    @classmethod
+    def get_provider(cls, name: Optional[str] = None) -> ReasoningProvider:
+        """The named provider, or the REASONING_PROVIDER default"""
+        name = getattr(name, "value", name) or REASONING_PROVIDER
+        provider = cls.providers.get(name)
+        if provider is None:
+            raise ValueError(f"Unknown reasoning provider: {name} (expected one of {', '.join(cls.providers)})")
+        return provider
+    
+    @classmethod
+    def get_cache(cls) -> TieredCache:
+        """Content-addressed cache of generated reasoning, created on first use"""
+        if cls._cache is None:
+            cls._cache = TieredCache(
+                "reasoning", max_entries=REASONING_CACHE_SIZE, ttl_seconds=REASONING_CACHE_TTL_SECONDS,
+                disk_path=REASONING_CACHE_PATH or None, max_disk_entries=REASONING_CACHE_DISK_MAX_ENTRIES
+            )
+        return cls._cache
+    
+    @classmethod
+    def close_cache(cls) -> None:
+        """Write the cache's buffered disk entries and close it"""
+        if cls._cache is not None:
+            cls._cache.close()
+            cls._cache = None
+    
+    @classmethod
+    def cache_stats(cls) -> Dict[str, Any]:
+        stats = cls.get_cache().stats()
+        stats["in_flight"] = len(cls._single_flight)
+        return stats
+    
+    @staticmethod
+    def cache_key(trip_data: Dict[str, Any], precision: int = REASONING_CACHE_DISTANCE_PRECISION) -> str:
+        """Hash of the normalized trip summary; identical lanes produce identical prompts"""
+        def value(item):
+            return getattr(item, "value", item)
+        
+        summary = {
+            "vehicle_type": value(trip_data["vehicle_type"]),
+            "fuel_type": value(trip_data["fuel_type"]),
+            "distance_km": round(trip_data["distance_km"], precision),
+            "terrain": value(trip_data["terrain"]),
+            "road_type": value(trip_data["road_type"]),
+            "load_weight": trip_data["load_weight"],
+            "total_cities": trip_data.get("total_cities", 0),
+            "cities": [
+                [city["name"], round(city["distance"], precision), value(city["terrain"]), value(city["road_type"])]
+                for city in trip_data.get("cities", [])
+            ]
+        }
+        encoded = json.dumps(summary, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    
     @staticmethod
-    async def generate_reasoning(trip_data: Dict[str, Any]) -> str:
-        """Generate reasoning for CO2 calculations and fuel comparisons"""
+    def build_prompt(trip_data: Dict[str, Any]) -> str:
+        """Build the LLM prompt for a trip summary"""
         vehicle_type = trip_data["vehicle_type"]
         fuel_type = trip_data["fuel_type"]
         distance = trip_data["distance_km"]
@@ -93,17 +250,59 @@ Ensure the HTML contains the following tags for clarity:
 
 Please **do not** return plain text. The response should be **only in HTML format**, suitable for embedding directly into a webpage using `innerHTML`.
 """ 
+        return prompt
+
+    @staticmethod
+    def fallback_reasoning(trip_data: Dict[str, Any]) -> str:
+        """Template reasoning to stand in for a failed provider; empty if even that cannot be rendered"""
+        try:
+            return render_reasoning(trip_data)
+        except Exception as e:
+            logger.error(f"Template reasoning failed: {e}")
+            return ""
+
+    @staticmethod
+    async def generate_reasoning(trip_data: Dict[str, Any], provider: Optional[str] = None) -> str:
+        """Generate reasoning for CO2 calculations and fuel comparisons
+
+        The provider defaults to the trip's "reasoning_provider", then to REASONING_PROVIDER.
+        """
+        selected = ReasoningService.get_provider(provider or trip_data.get("reasoning_provider"))
+        if not selected.cacheable:
+            return await selected.generate(trip_data)
+        cache = ReasoningService.get_cache()
+        key = ReasoningService.cache_key(trip_data)
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
         
-            # Using a modern, capable model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        # Concurrent identical requests share a single in-flight LLM call
+        async def generate() -> str:
+            reasoning = await selected.generate(trip_data)
+            cache.set(key, reasoning)
+            return reasoning
         
-        generation_config = genai.types.GenerationConfig(response_mime_type="application/json")
-        response = await model.generate_content_async(prompt, generation_config=generation_config)
-
-        print("parts::::",response.candidates[0].content.parts[0].text)
+        return await ReasoningService._single_flight.do(key, generate)
 
-        # reasoning = json.loads(response.text)
-        data = response.candidates[0].content.parts[0].text
-        data = json.loads(data)
-        reasoning = next(iter(data.values()))
-        return reasoning
\ No newline at end of file
+    @staticmethod
+    async def stream_reasoning(trip_data: Dict[str, Any], provider: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream the reasoning HTML chunk by chunk as the provider produces it"""
+        selected = ReasoningService.get_provider(provider or trip_data.get("reasoning_provider"))
+        if not selected.cacheable:
+            async for chunk in selected.stream(trip_data):
+                yield chunk
+            return
+        
+        cache = ReasoningService.get_cache()
+        # Streamed output is plain model text, not the unwrapped JSON of generate(), so it is cached apart
+        key = "stream:" + ReasoningService.cache_key(trip_data)
+        cached = await cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        async for chunk in selected.stream(trip_data):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(key, "".join(chunks))
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from models import ReasoningJobStatus
+from reasoning import ReasoningService
+from resilience import TEMPLATE_REASONING
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReasoningQueueFull(Exception):
+    """Raised when the reasoning job queue is at capacity"""
+
+
+@dataclass
+class ReasoningJob:
+    job_id: str
+    trip_data: Dict[str, Any]
+    status: ReasoningJobStatus = ReasoningJobStatus.PENDING
+    reasoning: Optional[str] = None
+    error: Optional[str] = None
+    fallbacks: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    completed_at: Optional[float] = None
+
+
+class ReasoningJobBackend:
+    """Interface for running reasoning generation outside the request path"""
+
+    async def start(self) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+    def submit(self, trip_data: Dict[str, Any]) -> str:
+        """Enqueue a reasoning job and return its id; raises ReasoningQueueFull under backpressure"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[ReasoningJob]:
+        raise NotImplementedError
+
+
+class InProcessReasoningQueue(ReasoningJobBackend):
+    """Bounded asyncio queue drained by a fixed pool of worker tasks in this process"""
+
+    def __init__(self, workers: int = 2, max_queue_size: int = 100, result_ttl_seconds: float = 3600,
+                 generate: Optional[Callable[[Dict[str, Any]], Awaitable[str]]] = None):
+        self.workers = max(1, workers)
+        self.result_ttl_seconds = result_ttl_seconds
+        self.generate = generate
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._jobs: Dict[str, ReasoningJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the worker tasks; the worker count caps concurrent LLM calls"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; queued jobs are left pending"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, trip_data: Dict[str, Any]) -> str:
+        self._prune()
+        job = ReasoningJob(job_id=f"reasoning_{uuid.uuid4().hex}", trip_data=trip_data)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise ReasoningQueueFull("Reasoning job queue is full")
+        self._jobs[job.job_id] = job
+        return job.job_id
+
+    def get(self, job_id: str) -> Optional[ReasoningJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and job counts by status"""
+        counts = {status.value: 0 for status in ReasoningJobStatus}
+        for job in self._jobs.values():
+            counts[job.status.value] += 1
+        return {"queued": self._queue.qsize(), "workers": len(self._tasks), "jobs": counts}
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = ReasoningJobStatus.RUNNING
+            try:
+                generate = self.generate or ReasoningService.generate_reasoning
+                job.reasoning = await generate(job.trip_data)
+                job.status = ReasoningJobStatus.COMPLETED
+            except asyncio.CancelledError:
+                job.error = "Reasoning job cancelled during shutdown"
+                job.status = ReasoningJobStatus.FAILED
+                raise
+            except Exception as e:
+                logger.error(f"Reasoning job {job.job_id} failed: {e}")
+                # Same degradation as inline reasoning: the template stands in for the failed provider
+                job.reasoning = ReasoningService.fallback_reasoning(job.trip_data) or None
+                if job.reasoning:
+                    job.fallbacks.append(TEMPLATE_REASONING)
+                    job.status = ReasoningJobStatus.COMPLETED
+                else:
+                    job.error = str(e)
+                    job.status = ReasoningJobStatus.FAILED
+            finally:
+                job.completed_at = time.time()
+                job.trip_data = {}
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.completed_at is not None and job.completed_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,232 @@
+import html
+from typing import Any, Dict, List, Sequence, Tuple
+
+from emission_calculator import EmissionCalculator, LOAD_WEIGHT_FACTOR, ROAD_TYPE_MULTIPLIERS, TERRAIN_MULTIPLIERS
+from models import (EMISSION_FACTORS, CityEmission, EmissionBreakdown, FuelComparison, FuelType, RoadType,
+                    TerrainType, VehicleType)
+
+
+def _value(item: Any) -> str:
+    return getattr(item, "value", item)
+
+
+def _share(part: float, whole: float) -> float:
+    return part / whole * 100 if whole else 0.0
+
+
+# Display names by enum member; Enum.value is a slow descriptor on the per-segment path
+LABELS = {member: member.value.replace("_", " ") for enum in (VehicleType, FuelType, TerrainType, RoadType)
+          for member in enum}
+TERRAIN_TEXT = {terrain: f"{LABELS[terrain]} terrain (×{multiplier:.2f})"
+                for terrain, multiplier in TERRAIN_MULTIPLIERS.items()}
+ROAD_TEXT = {road: f"100% {LABELS[road]} roads (×{multiplier:.3f})" for road, multiplier in ROAD_TYPE_MULTIPLIERS.items()}
+
+
+def _multipliers(multipliers: Dict[Any, float]) -> str:
+    return ", ".join(f"{LABELS[key]} ×{value:.2f}" for key, value in multipliers.items())
+
+
+# Templates; the .format_map methods are bound here so rendering does no lookups
+ROUTE_ANALYSIS = (
+    "<h2>Route Analysis</h2>"
+    "<p>The route covers {distance:.1f} km across {segments} city/region segments, driven by a {vehicle} "
+    "running on {fuel} and carrying {load:,.0f} kg.</p>"
+    "<ul>{items}</ul>"
+).format_map
+DISTRIBUTION_ITEM = "<li>{name}: {distance:.1f} km ({share:.1f}%)</li>".format_map
+BASE_EMISSIONS = (
+    "<h2>Base Emissions</h2>"
+    "<p>Following ISO 14083 and the GLEC Framework, a {vehicle} on {fuel} emits {ttw_factor:g} gCO2/km "
+    "Tank-to-Wheel (direct combustion) and {wtt_factor:g} gCO2/km Well-to-Tank (fuel production). "
+    "Over {distance:.1f} km, unloaded on flat highway, that is:</p>"
+    "<ul><li><strong>TTW</strong>: {base_ttw:.2f} kg CO2</li>"
+    "<li><strong>WTT</strong>: {base_wtt:.2f} kg CO2</li>"
+    "<li><strong>WTW</strong>: {base_wtw:.2f} kg CO2</li></ul>"
+    "<p>With each segment's terrain, road types and the load applied, the trip emits:</p>"
+    "<ul><li><strong>TTW</strong>: {ttw:.2f} kg CO2</li>"
+    "<li><strong>WTT</strong>: {wtt:.2f} kg CO2</li>"
+    "<li><strong>WTW</strong>: {wtw:.2f} kg CO2 ({change:+.1f}% against the base)</li></ul>"
+).format_map
+SEGMENT_CALCULATIONS = (
+    "<h2>Segment-Specific Calculations</h2>"
+    "<p>Terrain multipliers: " + _multipliers(TERRAIN_MULTIPLIERS) + ". "
+    "Road type multipliers: " + _multipliers(ROAD_TYPE_MULTIPLIERS) + ". "
+    "Both apply to the TTW and WTT factors of each segment.</p>"
+    "<ul>{items}</ul>"
+).format_map
+SEGMENT_ITEM = (
+    "<li><strong>{city}</strong>: {distance:.1f} km, {terrain}{grade}, {roads}; "
+    "combined ×{multiplier:.3f}, {wtw:.2f} kg CO2 WTW</li>"
+).format_map
+LOAD_IMPACT = (
+    "<h2>Load Weight Impact</h2>"
+    "<p>Each kg of load adds " + f"{LOAD_WEIGHT_FACTOR:g}" + " gCO2/km to Tank-to-Wheel emissions. "
+    "The {load:,.0f} kg load adds {per_km:.1f} gCO2/km, or {load_kg:.2f} kg CO2 over {distance:.1f} km: "
+    "{share:.1f}% of the trip's WTW total.</p>"
+).format_map
+FUEL_COMPARISON = (
+    "<h2>Fuel Type Comparison</h2>"
+    "<p>WTW emissions of the same trip with each fuel, relative to {fuel}:</p>"
+    "<ul>{items}</ul>"
+    "<p>{summary}</p>"
+).format_map
+FUEL_ITEM = "<li><strong>{fuel}</strong>{selected}: {kg:.2f} kg CO2 ({difference:+.1f}%)</li>".format_map
+FUEL_SAVING = "Switching to {fuel} would save {saving:.2f} kg CO2 ({share:.1f}%) on this trip.".format_map
+FUEL_LOWEST = "{fuel} already has the lowest emissions of the fuels compared.".format_map
+CITY_BREAKDOWN = (
+    "<h2>City-Wise Breakdown for Sustainability Reporting</h2>"
+    "<ul>{items}</ul>"
+    "<p>{summary}</p>"
+).format_map
+CITY_ITEM = (
+    "<li><strong>{city}</strong>: {wtw:.2f} kg CO2 WTW, {share:.1f}% of the trip ({intensity:.3f} kg/km)</li>"
+).format_map
+CITY_TOP = ("{city} contributes the most, {wtw:.2f} kg CO2 ({share:.1f}%) over {distance:.1f} km "
+            "of {terrain} terrain.").format_map
+NO_SEGMENTS = "<li>No city or region segments were resolved for this route.</li>"
+
+
+def emission_figures(trip_data: Dict[str, Any]) -> Tuple[EmissionBreakdown, List[CityEmission], List[FuelComparison]]:
+    """Totals, city emissions and fuel comparisons, as passed in or recomputed from the trip summary"""
+    if "total_emission" in trip_data:
+        return trip_data["total_emission"], trip_data["city_emissions"], trip_data["fuel_comparisons"]
+    vehicle_type = VehicleType(_value(trip_data["vehicle_type"]))
+    fuel_type = FuelType(_value(trip_data["fuel_type"]))
+    segments = [
+        {"name": city["name"], "segment_distance_km": city["distance"],
+         "terrain": TerrainType(_value(city["terrain"])), "road_type": RoadType(_value(city["road_type"]))}
+        for city in trip_data.get("cities", [])
+    ]
+    comparison = EmissionCalculator.compare_emissions(
+        segments, vehicle_type, trip_data["load_weight"],
+        terrain=TerrainType(_value(trip_data["terrain"])), road_type=RoadType(_value(trip_data["road_type"]))
+    )
+    return (comparison.total(vehicle_type, fuel_type), comparison.city_emissions(vehicle_type, fuel_type),
+            comparison.fuel_comparisons(vehicle_type, fuel_type))
+
+
+def road_mix(city: CityEmission) -> Tuple[Dict[RoadType, float], float, str]:
+    """Distance share per road type of a segment, its blended road multiplier and their description"""
+    shares = city.road_type_shares
+    if not shares:
+        return {city.road_type: 1.0}, ROAD_TYPE_MULTIPLIERS[city.road_type], ROAD_TEXT[city.road_type]
+    multiplier = sum(share * ROAD_TYPE_MULTIPLIERS[road] for road, share in shares.items())
+    text = " / ".join(f"{share * 100:.0f}% {LABELS[road]}" for road, share in shares.items() if share > 0)
+    return shares, multiplier, f"{text} roads (×{multiplier:.3f})"
+
+
+def distribution_items(totals: Dict[Any, float], distance: float, suffix: str) -> Sequence[str]:
+    return [
+        DISTRIBUTION_ITEM({"name": f"{LABELS[key].capitalize()} {suffix}", "distance": km,
+                           "share": _share(km, distance)})
+        for key, km in totals.items() if km > 0
+    ]
+
+
+def render_reasoning(trip_data: Dict[str, Any]) -> str:
+    """Reasoning HTML for a trip summary (see main.build_reasoning_data)"""
+    total, city_emissions, fuel_comparisons = emission_figures(trip_data)
+    vehicle_type = VehicleType(_value(trip_data["vehicle_type"]))
+    fuel_type = FuelType(_value(trip_data["fuel_type"]))
+    load_weight = trip_data["load_weight"]
+    distance = trip_data["distance_km"]
+    vehicle = LABELS[vehicle_type]
+    fuel = LABELS[fuel_type]
+    # Emissions are summed over the segments, so their distance is what the figures cover
+    segment_distance = sum(city.distance_km for city in city_emissions)
+
+    terrain_km: Dict[TerrainType, float] = {}
+    road_km: Dict[RoadType, float] = {}
+    segment_items = []
+    city_items = []
+    for city in city_emissions:
+        shares, road_multiplier, roads = road_mix(city)
+        terrain = city.terrain
+        distance_km = city.distance_km
+        wtw = city.co2_emission_kg
+        terrain_km[terrain] = terrain_km.get(terrain, 0.0) + distance_km
+        for road, share in shares.items():
+            road_km[road] = road_km.get(road, 0.0) + share * distance_km
+        name = html.escape(city.city)
+        segment_items.append(SEGMENT_ITEM({
+            "city": name,
+            "distance": distance_km,
+            "terrain": TERRAIN_TEXT[terrain],
+            "grade": f", {city.grade_percent:.1f}% average grade" if city.grade_percent is not None else "",
+            "roads": roads,
+            "multiplier": TERRAIN_MULTIPLIERS[terrain] * road_multiplier,
+            "wtw": wtw
+        }))
+        city_items.append(CITY_ITEM({
+            "city": name,
+            "wtw": wtw,
+            "share": _share(wtw, total.wtw_kg),
+            "intensity": wtw / distance_km if distance_km else 0.0
+        }))
+
+    factors = EMISSION_FACTORS[vehicle_type][fuel_type]
+    base = EmissionCalculator.calculate_base_emission(vehicle_type, fuel_type, segment_distance)
+    load_kg = load_weight * LOAD_WEIGHT_FACTOR * segment_distance / 1000
+
+    fuel_items = []
+    lowest = None
+    for comparison in fuel_comparisons:
+        selected = comparison.fuel_type == fuel_type
+        fuel_items.append(FUEL_ITEM({
+            "fuel": LABELS[comparison.fuel_type],
+            "selected": " (selected)" if selected else "",
+            "kg": comparison.emission_kg,
+            "difference": comparison.percentage_difference
+        }))
+        if lowest is None or comparison.emission_kg < lowest.emission_kg:
+            lowest = comparison
+    if lowest is None or lowest.fuel_type == fuel_type or lowest.emission_kg >= total.wtw_kg:
+        fuel_summary = FUEL_LOWEST({"fuel": fuel.capitalize()})
+    else:
+        saving = total.wtw_kg - lowest.emission_kg
+        fuel_summary = FUEL_SAVING({"fuel": LABELS[lowest.fuel_type], "saving": saving,
+                                    "share": _share(saving, total.wtw_kg)})
+
+    if city_emissions:
+        top = max(city_emissions, key=lambda city: city.co2_emission_kg)
+        city_summary = CITY_TOP({"city": html.escape(top.city), "wtw": top.co2_emission_kg,
+                                 "share": _share(top.co2_emission_kg, total.wtw_kg), "distance": top.distance_km,
+                                 "terrain": LABELS[top.terrain]})
+    else:
+        city_summary = f"All {total.wtw_kg:.2f} kg CO2 WTW is reported for the route as a whole."
+
+    return "".join((
+        ROUTE_ANALYSIS({
+            "distance": distance,
+            "segments": len(city_emissions),
+            "vehicle": vehicle,
+            "fuel": fuel,
+            "load": load_weight,
+            "items": "".join(distribution_items(terrain_km, segment_distance, "terrain")
+                             + distribution_items(road_km, segment_distance, "roads"))
+        }),
+        BASE_EMISSIONS({
+            "vehicle": vehicle,
+            "fuel": fuel,
+            "ttw_factor": factors["ttw"],
+            "wtt_factor": factors["wtt"],
+            "distance": segment_distance,
+            "base_ttw": base.ttw_kg,
+            "base_wtt": base.wtt_kg,
+            "base_wtw": base.wtw_kg,
+            "ttw": total.ttw_kg,
+            "wtt": total.wtt_kg,
+            "wtw": total.wtw_kg,
+            "change": _share(total.wtw_kg - base.wtw_kg, base.wtw_kg)
+        }),
+        SEGMENT_CALCULATIONS({"items": "".join(segment_items) or NO_SEGMENTS}),
+        LOAD_IMPACT({
+            "load": load_weight,
+            "per_km": load_weight * LOAD_WEIGHT_FACTOR,
+            "load_kg": load_kg,
+            "distance": segment_distance,
+            "share": _share(load_kg, total.wtw_kg)
+        }),
+        FUEL_COMPARISON({"fuel": fuel, "items": "".join(fuel_items), "summary": fuel_summary}),
+        CITY_BREAKDOWN({"items": "".join(city_items) or NO_SEGMENTS, "summary": city_summary})
+    ))
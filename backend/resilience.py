@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from config import CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_SECONDS
+from metrics import REGISTRY, UPSTREAM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Fallbacks reported in responses' "fallbacks" list
+STRAIGHT_LINE_ROUTE = "straight_line_route"
+UNRESOLVED_CITIES = "unresolved_cities"
+REASONING_UNAVAILABLE = "reasoning_unavailable"
+TEMPLATE_REASONING = "template_reasoning"
+
+
+class UpstreamUnavailable(Exception):
+    """An external service could not be used for this call"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds one probe call decides"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.state == CircuitBreaker.CLOSED:
+            return True
+        if self.state == CircuitBreaker.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = CircuitBreaker.HALF_OPEN
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != CircuitBreaker.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CircuitBreaker.OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Neither success nor failure (e.g. cancelled); lets another call probe"""
+        self.probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_states() -> Dict[str, str]:
+    return {name: breaker.state for name, breaker in sorted(_breakers.items())}
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def start_deadline(seconds: float) -> None:
+    """Bound all upstream calls of the current request to seconds from now (0 or less: no deadline)"""
+    _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+
+def remaining_seconds() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_response(name: str, response: httpx.Response) -> httpx.Response:
+    """Raise UpstreamUnavailable for answers that mean the service is overloaded or failing"""
+    if response.status_code >= 500 or response.status_code == 429:
+        raise UpstreamUnavailable(f"{name} returned HTTP {response.status_code}")
+    return response
+
+
+async def hedged(fn: Callable[[float], Awaitable[T]], timeout: float, hedge_delay: float) -> T:
+    """fn(timeout), plus a second fn() if the first has not finished after hedge_delay; first success wins"""
+    if hedge_delay <= 0 or hedge_delay >= timeout:
+        return await fn(timeout)
+    first = asyncio.ensure_future(fn(timeout))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(fn(timeout - hedge_delay)))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_upstream(name: str, fn: Callable[[float], Awaitable[T]], timeout: float,
+                        hedge_delay: float = 0.0) -> T:
+    """Run fn(timeout) against upstream name under its circuit breaker and the request deadline
+
+    fn should cover only the network exchange: everything it raises counts as a failure of the upstream.
+    """
+    breaker = get_breaker(name)
+    if not breaker.allow():
+        if REGISTRY.enabled:
+            UPSTREAM_REQUESTS.inc(name, "circuit_open")
+        raise CircuitOpenError(f"{name} is unavailable (circuit open)")
+    left = remaining_seconds()
+    budget = timeout if left is None else min(timeout, left)
+    if budget <= 0:
+        breaker.release()
+        raise DeadlineExceeded(f"Request deadline passed before calling {name}")
+
+    try:
+        result = await asyncio.wait_for(hedged(fn, budget, hedge_delay), budget)
+    except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+        if budget < timeout:
+            # Cut short by the request deadline, not a failure of the service
+            breaker.release()
+            raise DeadlineExceeded(f"Request deadline reached while calling {name}") from e
+        breaker.record_failure()
+        raise
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models import RoadType
+from distance import PolylineDistance
+from emission_calculator import ROAD_TYPES, ROAD_INDEX
+
+
+# OSM road classes that settle the road type on their own
+HIGHWAY_CLASSES = {"motorway", "trunk"}
+URBAN_CLASSES = {"residential", "living_street", "service"}
+
+# Travel speed thresholds for everything else
+HIGHWAY_MIN_SPEED_KMH = 70
+URBAN_MAX_SPEED_KMH = 40
+
+
+class RoadProfile:
+    """Cumulative distance driven on each road type along a route polyline
+
+    Shares for any stretch of the route are read off by interpolating the
+    cumulative arrays at its start and end.
+    """
+
+    def __init__(self, positions_km: np.ndarray, cumulative_km: np.ndarray):
+        self.positions_km = positions_km  # (points,) distance along the polyline
+        self.cumulative_km = cumulative_km  # (points, road type)
+
+    @property
+    def total(self) -> float:
+        return float(self.positions_km[-1])
+
+    def shares(self, boundaries_km: Sequence[float]) -> np.ndarray:
+        """(interval, road type) distance shares between consecutive boundaries"""
+        boundaries = np.asarray(boundaries_km, dtype=np.float64)
+        at = np.stack([np.interp(boundaries, self.positions_km, self.cumulative_km[:, r])
+                       for r in range(len(ROAD_TYPES))], axis=1)
+        distances = np.diff(at, axis=0)
+        totals = distances.sum(axis=1, keepdims=True)
+        return np.divide(distances, totals, out=np.zeros_like(distances), where=totals > 0)
+
+
+def classify_steps(steps: List[Dict[str, Any]]) -> tuple:
+    """Per-step road class flags and average speed: (is_highway, is_urban, speed_kmh)"""
+    is_highway = np.zeros(len(steps), dtype=bool)
+    is_urban = np.zeros(len(steps), dtype=bool)
+    speed_kmh = np.full(len(steps), np.nan)
+    for i, step in enumerate(steps):
+        # The local engine reports the OSM class directly; OSRM tags motorway intersections
+        road_class = step.get("road_class")
+        if road_class is None and any("motorway" in intersection.get("classes", [])
+                                      for intersection in step.get("intersections", [])):
+            road_class = "motorway"
+        is_highway[i] = road_class in HIGHWAY_CLASSES
+        is_urban[i] = road_class in URBAN_CLASSES
+        if step.get("duration"):
+            speed_kmh[i] = step["distance"] / step["duration"] * 3.6
+    return is_highway, is_urban, speed_kmh
+
+
+def classify_route(route_data: Dict[str, Any], polyline: Optional[PolylineDistance] = None) -> Optional[RoadProfile]:
+    """Road type profile from the routing engine's steps and annotations, or None without steps"""
+    steps = route_data.get("steps") or []
+    coordinates = route_data.get("coordinates") or []
+    step_distances = np.array([step.get("distance", 0.0) for step in steps], dtype=np.float64)
+    if len(coordinates) < 2 or step_distances.sum() <= 0:
+        return None
+
+    polyline = polyline or PolylineDistance(coordinates)
+    if polyline.total <= 0:
+        return None
+    is_highway, is_urban, step_speed = classify_steps(steps)
+
+    # Assign every polyline leg to the step covering its midpoint, by fraction of route length
+    leg_midpoints = (polyline.cumulative[:-1] + polyline.cumulative[1:]) / 2 / polyline.total
+    step_ends = np.cumsum(step_distances) / step_distances.sum()
+    step_of_leg = np.minimum(np.searchsorted(step_ends, leg_midpoints, side="right"), len(steps) - 1)
+
+    # Per-leg annotation speeds are finer grained than step averages where available
+    speed_kmh = step_speed[step_of_leg]
+    annotation = route_data.get("annotation") or {}
+    leg_speeds = annotation.get("speed")
+    if leg_speeds is not None and len(leg_speeds) == len(polyline.legs):
+        annotated = np.asarray(leg_speeds, dtype=np.float64) * 3.6
+        speed_kmh = np.where(annotated > 0, annotated, speed_kmh)
+
+    road_idx = np.full(len(polyline.legs), ROAD_INDEX[RoadType.RURAL])
+    road_idx[speed_kmh >= HIGHWAY_MIN_SPEED_KMH] = ROAD_INDEX[RoadType.HIGHWAY]
+    road_idx[speed_kmh <= URBAN_MAX_SPEED_KMH] = ROAD_INDEX[RoadType.URBAN]
+    road_idx[is_urban[step_of_leg]] = ROAD_INDEX[RoadType.URBAN]
+    road_idx[is_highway[step_of_leg]] = ROAD_INDEX[RoadType.HIGHWAY]
+
+    leg_km = np.zeros((len(polyline.legs), len(ROAD_TYPES)))
+    leg_km[np.arange(len(polyline.legs)), road_idx] = polyline.legs
+    cumulative = np.vstack([np.zeros(len(ROAD_TYPES)), np.cumsum(leg_km, axis=0)])
+    return RoadProfile(polyline.cumulative, cumulative)
+
+
+def shares_to_dict(shares: Sequence[float]) -> Dict[RoadType, float]:
+    return {road: float(share) for road, share in zip(ROAD_TYPES, shares)}
+
+
+def dominant_road_type(shares: Dict[RoadType, float]) -> RoadType:
+    return max(shares, key=shares.get)
+
+
+def merge_shares(shares: Dict[RoadType, float], distance_km: float,
+                 other: Dict[RoadType, float], other_distance_km: float) -> Dict[RoadType, float]:
+    """Distance-weighted combination of two segments' road type shares"""
+    total = distance_km + other_distance_km
+    if total <= 0:
+        return dict(shares)
+    return {road: (shares[road] * distance_km + other[road] * other_distance_km) / total for road in ROAD_TYPES}
@@ -1,182 +1,620 @@
+import asyncio
+import hashlib
 import logging
 import httpx
 from fastapi import HTTPException
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import math
 
+import numpy as np
+
 from models import TerrainType, RoadType
+from config import (REVERSE_GEOCODE_CONCURRENCY, NOMINATIM_MAX_REQUESTS_PER_SECOND, GEOCODE_CACHE_SIZE,
+                    GEOCODE_CACHE_TTL_SECONDS, REVERSE_GEOCODE_CACHE_TTL_SECONDS, GEOCODE_CACHE_PATH,
+                    REVERSE_GEOCODE_GRID_LEVELS, PLACES_INDEX_PATH, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    HTTP_KEEPALIVE_EXPIRY_SECONDS, HTTP_ENABLE_HTTP2, HTTP_USER_AGENT,
+                    NOMINATIM_SEARCH_TIMEOUT_SECONDS, NOMINATIM_REVERSE_TIMEOUT_SECONDS,
+                    ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL_SECONDS, ROUTE_CACHE_MAX_MB, ROUTE_CACHE_COORD_PRECISION,
+                    ROUTE_MAX_SEGMENTS, ROUTE_MIN_SEGMENT_KM, ELEVATION_DATA_PATH, ELEVATION_TILE_CACHE_SIZE,
+                    ROUTE_TABLE_BLOCK_SIZE, ROUTE_TABLE_CONCURRENCY, ROUTE_TABLE_CACHE_SIZE)
+from rate_limiter import RateLimiter
+from distance import PolylineDistance, haversine_km
+from cache import TieredCache, LRUCache, SingleFlight
+from metrics import stage, upstream
+from resilience import (STRAIGHT_LINE_ROUTE, UNRESOLVED_CITIES, UpstreamUnavailable, call_upstream,
+                        check_response)
+from routing import RoutingBackend, create_routing_backend
+from places_index import PlacesIndex
+from road_classifier import RoadProfile, classify_route, shares_to_dict, dominant_road_type, merge_shares
+from elevation import ElevationModel, TerrainProfile, average_grade_percent, terrain_for_grade
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Circuit breaker shared by the search and reverse endpoints
+NOMINATIM = "nominatim"
+
 class RouteService:
     """Service for route calculation and optimization"""
-    def __init__(self):
-        self.route = {}
+    def __init__(self, reverse_geocode_concurrency: int = REVERSE_GEOCODE_CONCURRENCY,
+                 nominatim_rate_limit: float = NOMINATIM_MAX_REQUESTS_PER_SECOND,
+                 http_client: Optional[httpx.AsyncClient] = None,
+                 routing_backend: Optional[RoutingBackend] = None):
+        # One pooled client per process, shared by every outbound call
+        self._http_client = http_client
+        self.routing_backend = routing_backend or create_routing_backend(http_client=lambda: self.http_client)
+        # Bound parallel reverse geocodes; searches and reverse geocodes share the Nominatim throttle
+        self.reverse_geocode_semaphore = asyncio.Semaphore(max(1, reverse_geocode_concurrency))
+        self.nominatim_limiter = RateLimiter(nominatim_rate_limit) if nominatim_rate_limit > 0 else None
+        # Depots and customer addresses repeat all day, so cache both geocoding directions
+        self.geocode_cache = TieredCache(
+            "geocode", max_entries=GEOCODE_CACHE_SIZE,
+            ttl_seconds=GEOCODE_CACHE_TTL_SECONDS, disk_path=GEOCODE_CACHE_PATH or None
+        )
+        self.reverse_geocode_cache = TieredCache(
+            "reverse_geocode", max_entries=GEOCODE_CACHE_SIZE,
+            ttl_seconds=REVERSE_GEOCODE_CACHE_TTL_SECONDS, disk_path=GEOCODE_CACHE_PATH or None
+        )
+        # Offline reverse geocoder; memory-mapped, so opening it per worker is cheap
+        self.places_index = None
+        if PLACES_INDEX_PATH:
+            try:
+                self.places_index = PlacesIndex.open(PLACES_INDEX_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Places index disabled: {e}")
+        # Local DEM tiles for elevation-based terrain; address keywords are used without them
+        self.elevation_model = (ElevationModel(ELEVATION_DATA_PATH, ELEVATION_TILE_CACHE_SIZE)
+                                if ELEVATION_DATA_PATH else None)
+        # Resolved routes keyed by snapped origin/destination and profile, bounded by count and memory
+        self.route_cache = LRUCache(
+            max_entries=ROUTE_CACHE_SIZE, ttl_seconds=ROUTE_CACHE_TTL_SECONDS,
+            max_weight=int(ROUTE_CACHE_MAX_MB * 1024 * 1024), weigher=RouteService.estimate_route_size
+        )
+        # Route ids of each lane's alternatives; kept apart from route_cache, which route_id lookups read
+        self.alternatives_cache = LRUCache(max_entries=ROUTE_CACHE_SIZE, ttl_seconds=ROUTE_CACHE_TTL_SECONDS)
+        self._route_single_flight = SingleFlight()
+        # Distance/duration matrix blocks keyed by their snapped source and destination points
+        self.table_cache = LRUCache(max_entries=ROUTE_TABLE_CACHE_SIZE, ttl_seconds=ROUTE_CACHE_TTL_SECONDS)
+        self.table_semaphore = asyncio.Semaphore(max(1, ROUTE_TABLE_CONCURRENCY))
+
+    @staticmethod
+    def create_http_client() -> httpx.AsyncClient:
+        """Build the pooled, keep-alive HTTP client used for all upstream calls"""
+        http2 = HTTP_ENABLE_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx needs the h2 package for HTTP/2)
+            except ImportError:
+                http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            headers={"User-Agent": HTTP_USER_AGENT}
+        )
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, created on first use if startup() was not called"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = RouteService.create_http_client()
+        return self._http_client
+
+    async def startup(self) -> None:
+        """Open the shared HTTP client and load the routing engine (called on application startup)"""
+        _ = self.http_client
+        await self.routing_backend.start()
+
+    async def shutdown(self) -> None:
+        """Close the shared HTTP client and cache tiers (called on application shutdown)"""
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+        # Flushing the disk tiers' buffered writes may wait on the disk
+        await asyncio.to_thread(self.geocode_cache.close)
+        await asyncio.to_thread(self.reverse_geocode_cache.close)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the geocoding caches, route cache and places index"""
+        return {
+            "geocode": self.geocode_cache.stats(),
+            "reverse_geocode": self.reverse_geocode_cache.stats(),
+            "route": self.route_cache.stats(),
+            "table": self.table_cache.stats(),
+            "places_index": self.places_index.stats() if self.places_index else None
+        }
+
+    @staticmethod
+    def route_cache_key(start_coords: tuple, end_coords: tuple, profile: str = "driving") -> str:
+        """Route id for an origin/destination pair snapped to ROUTE_CACHE_COORD_PRECISION decimals"""
+        (start_lat, start_lon), (end_lat, end_lon) = start_coords, end_coords
+        precision = ROUTE_CACHE_COORD_PRECISION
+        key = (f"{profile}:{round(start_lat, precision)},{round(start_lon, precision)};"
+               f"{round(end_lat, precision)},{round(end_lon, precision)}")
+        return "route_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def route_id_matches(route_id: str, start_coords: tuple, end_coords: tuple, profile: str = "driving") -> bool:
+        """Whether route_id was issued for this origin/destination: the lane's route or one of its alternatives"""
+        lane_id = RouteService.route_cache_key(start_coords, end_coords, profile)
+        return route_id == lane_id or route_id.startswith(lane_id + "_")
+
+    @staticmethod
+    def estimate_route_size(route_data: Dict[str, Any]) -> int:
+        """Rough in-memory size of a route dict in bytes, used for the route cache memory limit"""
+        return (len(route_data.get("coordinates", [])) * 128
+                + len(route_data.get("steps", [])) * 2048
+                + len(route_data.get("cities", [])) * 1024)
+
+    def get_cached_route(self, route_id: str) -> Optional[Dict[str, Any]]:
+        """Return a previously computed route by its route_id, if still cached"""
+        return self.route_cache.get(route_id)
+
+    def store_route(self, route_data: Dict[str, Any]) -> None:
+        """Cache a fully resolved route; degraded routes are not cached so the upstreams are retried"""
+        route_data["fallbacks"] = RouteService.route_fallbacks(route_data)
+        if not route_data["fallbacks"]:
+            self.route_cache.set(route_data["route_id"], route_data)
+
+    @staticmethod
+    def route_fallbacks(route_data: Dict[str, Any]) -> List[str]:
+        """Fallbacks used for a route: a straight line instead of a routed path, unresolved city segments"""
+        fallbacks = []
+        if route_data["fallback"]:
+            fallbacks.append(STRAIGHT_LINE_ROUTE)
+        if any(city.get("unresolved") for city in route_data.get("cities", [])):
+            fallbacks.append(UNRESOLVED_CITIES)
+        return fallbacks
+
+    @staticmethod
+    def geocode_cache_key(address: str) -> str:
+        """Normalize an address string for forward geocode caching"""
+        return " ".join(address.lower().split())
+
+    @staticmethod
+    def reverse_geocode_cache_key(lat: float, lon: float, zoom: int) -> str:
+        """Quantize a point to its grid cell at the requested zoom for reverse geocode caching"""
+        cell_degrees = 360.0 / (2 ** (zoom + REVERSE_GEOCODE_GRID_LEVELS))
+        return f"{zoom}:{math.floor(lat / cell_degrees)}:{math.floor(lon / cell_degrees)}"
     
     async def geocode_address(self, address: str) -> tuple:
         """Convert address to coordinates using Nominatim"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
+        cache_key = RouteService.geocode_cache_key(address)
+        cached = await self.geocode_cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+        
+        async def search(timeout: float) -> httpx.Response:
+            async with upstream("nominatim_search"):
+                response = await self.http_client.get(
                     "https://nominatim.openstreetmap.org/search",
                     params={
                         "q": address,
                         "format": "json",
                         "limit": 1
                     },
-                    timeout=5.0
+                    timeout=timeout
                 )
-                data = response.json()
-                if data:
-                    return float(data[0]["lat"]), float(data[0]["lon"])
-                else:
-                    raise ValueError(f"Address not found: {address}")
+            return check_response(NOMINATIM, response)
+        
+        try:
+            if self.nominatim_limiter:
+                await self.nominatim_limiter.acquire()
+            response = await call_upstream(NOMINATIM, search, NOMINATIM_SEARCH_TIMEOUT_SECONDS)
+            data = response.json()
+            if data:
+                coords = (float(data[0]["lat"]), float(data[0]["lon"]))
+                self.geocode_cache.set(cache_key, list(coords))
+                return coords
+            else:
+                raise ValueError(f"Address not found: {address}")
+        except UpstreamUnavailable as e:
+            logger.error(f"Geocoding error: {e}")
+            raise HTTPException(status_code=503, detail=f"Geocoding is unavailable: {e}")
         except Exception as e:
             logger.error(f"Geocoding error: {e}")
             raise HTTPException(status_code=400, detail=f"Could not geocode address: {address}")
 
 
-    async def get_route_with_cities(self, start_coords: tuple, end_coords: tuple) -> Dict[str, Any]:
-        """Get route with detailed city information"""
+    async def get_route_with_cities(self, start_coords: tuple, end_coords: tuple,
+                                    profile: str = "driving") -> Dict[str, Any]:
+        """Get route with detailed city information, served from the route cache when possible"""
+        route_id = RouteService.route_cache_key(start_coords, end_coords, profile)
+        cached = self.route_cache.get(route_id)
+        if cached is not None:
+            return cached
+        
+        async def compute() -> Dict[str, Any]:
+            route_data = await self.fetch_route(start_coords, end_coords, profile)
+            async with stage("cities"):
+                if route_data["fallback"]:
+                    route_data["cities"] = await self.get_cities_along_simple_route(start_coords, end_coords)
+                else:
+                    route_data["cities"] = [city async for _, city in self.iter_route_cities(route_data)]
+            self.store_route(route_data)
+            return route_data
+        
+        # Concurrent requests for the same lane share one routing + reverse geocoding pass
+        return await self._route_single_flight.do(route_id, compute)
+
+    async def get_route_alternatives(self, start_coords: tuple, end_coords: tuple, count: int = 3,
+                                     profile: str = "driving") -> List[Dict[str, Any]]:
+        """Up to count alternative routes with cities, the routing engine's preferred route first
+
+        Each alternative is cached under its own route_id (the first shares the
+        id of the single-route lookup), so it can be reused like any other route.
+        """
+        route_id = RouteService.route_cache_key(start_coords, end_coords, profile)
+        index_key = f"{route_id}_alternatives_{count}"
+        cached = self.alternatives_cache.get(index_key)
+        if cached is not None:
+            routes = [self.route_cache.get(alternative_id) for alternative_id in cached["route_ids"]]
+            if all(route is not None for route in routes):
+                return routes
+        
+        async def compute() -> List[Dict[str, Any]]:
+            try:
+                routes = await self.routing_backend.route_alternatives(start_coords, end_coords, profile, count)
+            except Exception as e:
+                logger.error(f"Routing alternatives error ({self.routing_backend.name}): {e}")
+                return [await self.get_route_with_cities(start_coords, end_coords, profile)]
+            for i, route_data in enumerate(routes):
+                route_data.update(route_id=route_id if i == 0 else f"{route_id}_{i}", fallback=False)
+            
+            # Overlapping alternatives share most reverse geocodes through the cell cache
+            async def resolve_cities(route_data: Dict[str, Any]) -> None:
+                route_data["cities"] = [city async for _, city in self.iter_route_cities(route_data)]
+            await asyncio.gather(*(resolve_cities(route_data) for route_data in routes))
+            
+            for route_data in routes:
+                self.store_route(route_data)
+            self.alternatives_cache.set(index_key, {"route_ids": [route_data["route_id"] for route_data in routes]})
+            return routes
+        
+        return await self._route_single_flight.do(index_key, compute)
+
+    @staticmethod
+    def table_cache_key(sources: List[tuple], destinations: List[tuple], profile: str = "driving") -> str:
+        precision = ROUTE_CACHE_COORD_PRECISION
+        key = profile + "|" + "|".join(
+            ";".join(f"{round(lat, precision)},{round(lon, precision)}" for lat, lon in points)
+            for points in (sources, destinations)
+        )
+        return "table_" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    async def get_distance_matrix(self, sources: List[tuple], destinations: Optional[List[tuple]] = None,
+                                  profile: str = "driving") -> Tuple[np.ndarray, np.ndarray, bool]:
+        """(distances_km, durations_s, fallback) from every source to every destination (lat, lon) point
+
+        Destinations default to the sources. The matrix is fetched from the
+        routing backend in cached blocks of up to ROUTE_TABLE_BLOCK_SIZE points
+        a side; pairs the backend cannot answer use the straight-line estimate
+        and set fallback.
+        """
+        if destinations is None:
+            destinations = sources
+        distances = np.full((len(sources), len(destinations)), np.nan)
+        durations = np.full((len(sources), len(destinations)), np.nan)
+        row_blocks = [np.arange(start, min(start + ROUTE_TABLE_BLOCK_SIZE, len(sources)))
+                      for start in range(0, len(sources), ROUTE_TABLE_BLOCK_SIZE)]
+        col_blocks = [np.arange(start, min(start + ROUTE_TABLE_BLOCK_SIZE, len(destinations)))
+                      for start in range(0, len(destinations), ROUTE_TABLE_BLOCK_SIZE)]
+
+        async def fill(rows: np.ndarray, cols: np.ndarray) -> None:
+            block_sources = [sources[i] for i in rows]
+            block_destinations = [destinations[j] for j in cols]
+            key = RouteService.table_cache_key(block_sources, block_destinations, profile)
+            block = self.table_cache.get(key)
+            if block is None:
+                try:
+                    async with self.table_semaphore:
+                        block = await self.routing_backend.table(block_sources, block_destinations, profile)
+                except Exception as e:
+                    logger.error(f"Distance table error ({self.routing_backend.name}): {e}")
+                    return
+                if not np.isnan(block[0]).any():
+                    self.table_cache.set(key, block)
+            distances[np.ix_(rows, cols)] = block[0]
+            durations[np.ix_(rows, cols)] = block[1]
+
+        await asyncio.gather(*(fill(rows, cols) for rows in row_blocks for cols in col_blocks))
+
+        missing = np.isnan(distances) | np.isnan(durations)
+        if missing.any():
+            source_points = np.asarray(sources, dtype=np.float64)
+            destination_points = np.asarray(destinations, dtype=np.float64)
+            estimate = haversine_km(source_points[:, None, 0], source_points[:, None, 1],
+                                    destination_points[None, :, 0], destination_points[None, :, 1])
+            distances[missing] = estimate[missing]
+            durations[missing] = estimate[missing] * 60  # Rough estimate, as for straight-line routes
+        return distances, durations, bool(missing.any())
+
+    async def fetch_route(self, start_coords: tuple, end_coords: tuple, profile: str = "driving") -> Dict[str, Any]:
+        """Get the route geometry from the routing backend, falling back to a straight line (without cities)"""
         start_lat, start_lon = start_coords
         end_lat, end_lon = end_coords
+        route_id = RouteService.route_cache_key(start_coords, end_coords, profile)
         
         try:
-            # Using OSRM (free routing service)
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"http://router.project-osrm.org/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}",
-                    params={
-                        "overview": "full",
-                        "geometries": "geojson",
-                        "steps": "true",
-                        "annotations": "true"
-                    },
-                    timeout=10.0
-                )
-                data = response.json()
+            async with stage("route"):
+                route_data = await self.routing_backend.route(start_coords, end_coords, profile)
+            route_data.update(route_id=route_id, fallback=False)
+            return route_data
                 
-                if data["code"] == "Ok":
-                    route = data["routes"][0]
-                    
-                    # Get cities along the route
-                    cities_data = await self.get_cities_along_route(
-                        route["geometry"]["coordinates"]
-                    )
-                    
-                    return {
-                        "distance_km": route["distance"] / 1000,
-                        "duration_seconds": route["duration"],
-                        "coordinates": route["geometry"]["coordinates"],
-                        "steps": route["legs"][0]["steps"],
-                        "cities": cities_data
-                    }
-                else:
-                    raise ValueError("Route not found")
-                    
         except Exception as e:
-            logger.error(f"Routing error: {e}")
+            logger.error(f"Routing error ({self.routing_backend.name}): {e}")
             # Fallback to simple distance calculation
             distance_km = RouteService.haversine_distance(start_coords, end_coords)
-            cities_data = await RouteService.get_cities_along_simple_route(start_coords, end_coords)
             return {
                 "distance_km": distance_km,
                 "duration_seconds": distance_km * 60,  # Rough estimate
                 "coordinates": [[start_lon, start_lat], [end_lon, end_lat]],
                 "steps": [],
-                "cities": cities_data
+                "route_id": route_id,
+                "fallback": True
             }
 
 
-    async def get_cities_along_route(self, coordinates: List[List[float]]) -> List[Dict[str, Any]]:
+    async def iter_route_cities(self, route_data: Dict[str, Any]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Cities along a routed (non-fallback) route, with road types and terrain from its steps and the DEM"""
+        # One distance index per route, shared by the road and terrain profiles and the segment plan
+        polyline = PolylineDistance(route_data["coordinates"])
+        terrain_profile = await self.terrain_profile(polyline)
+        async for item in self.iter_cities_along_route(route_data["coordinates"], route_data["distance_km"],
+                                                       classify_route(route_data, polyline), terrain_profile,
+                                                       polyline):
+            yield item
+
+    async def terrain_profile(self, polyline: PolylineDistance) -> Optional[TerrainProfile]:
+        """Elevation profile of the route, or None without DEM tiles"""
+        if self.elevation_model is None:
+            return None
+        # Tile reads may fault pages in from disk, so keep them off the event loop
+        async with stage("terrain"):
+            return await asyncio.to_thread(TerrainProfile.from_polyline, self.elevation_model, polyline)
+
+    async def get_cities_along_route(self, coordinates: List[List[float]], total_km: Optional[float] = None,
+                                     road_profile: Optional[RoadProfile] = None,
+                                     terrain_profile: Optional[TerrainProfile] = None) -> List[Dict[str, Any]]:
         """Get cities along the route with their segments"""
-        cities = []
+        return [city async for _, city in
+                self.iter_cities_along_route(coordinates, total_km, road_profile, terrain_profile)]
+
+    async def iter_cities_along_route(self, coordinates: List[List[float]], total_km: Optional[float] = None,
+                                      road_profile: Optional[RoadProfile] = None,
+                                      terrain_profile: Optional[TerrainProfile] = None,
+                                      polyline: Optional[PolylineDistance] = None
+                                      ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (index, city) pairs in route order, merging adjacent segments that resolve to the same city
+
+        Segment distances always sum to total_km (the polyline length by default).
+        With a road profile (from the routing engine's steps) or a terrain
+        profile (from DEM tiles), each city gets distance-weighted road type
+        shares or its climb and grade instead of address-based guesses.
+        """
+        polyline = polyline or PolylineDistance(coordinates)
+        segments = RouteService.plan_route_segments(coordinates, total_km, polyline=polyline)
+        attributes = RouteService.segment_attributes(segments, polyline.total, road_profile, terrain_profile)
         
-        # Sample points along the route to find cities
-        sample_points = self.sample_route_points(coordinates, max_points=10)
+        async def resolve(i: int, lon: float, lat: float, distance_km: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+            city = await self.resolve_route_point(i, lon, lat, distance_km)
+            if city is not None:
+                city.update(attributes[i])
+            return i, city
         
-        async with httpx.AsyncClient() as client:
-            for i, (lon, lat) in enumerate(sample_points):
-                try:
-                    # Reverse geocode to get city information
-                    response = await client.get(
-                        "https://nominatim.openstreetmap.org/reverse",
-                        params={
-                            "lat": lat,
-                            "lon": lon,
-                            "format": "json",
-                            "zoom": 10
-                        },
-                        timeout=3.0
-                    )
-                    
-                    data = response.json()
-                    if data and "address" in data:
-                        city_name = (data["address"].get("city") or 
-                                   data["address"].get("town") or 
-                                   data["address"].get("village") or 
-                                   data["address"].get("county") or
-                                   f"Location {i+1}")
-                        
-                        # Calculate segment distance
-                        if i == 0:
-                            segment_distance = RouteService.calculate_segment_distance(
-                                coordinates, 0, len(coordinates) // len(sample_points)
-                            )
-                        else:
-                            start_idx = (i * len(coordinates)) // len(sample_points)
-                            end_idx = ((i + 1) * len(coordinates)) // len(sample_points)
-                            segment_distance = RouteService.calculate_segment_distance(
-                                coordinates, start_idx, end_idx
-                            )
-                        
-                        # Determine terrain and road type based on location
-                        terrain, road_type = RouteService.determine_terrain_and_road(data["address"])
-                        
-                        cities.append({
-                            "name": city_name,
-                            "latitude": lat,
-                            "longitude": lon,
-                            "segment_distance_km": segment_distance,
-                            "terrain": terrain,
-                            "road_type": road_type,
-                            "address_data": data["address"]
-                        })
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to geocode point {lat}, {lon}: {e}")
-                    # Add fallback city data
-                    cities.append({
-                        "name": f"Route Segment {i+1}",
-                        "latitude": lat,
-                        "longitude": lon,
-                        "segment_distance_km": RouteService.calculate_total_distance(coordinates) / len(sample_points),
-                        "terrain": TerrainType.FLAT,
-                        "road_type": RoadType.HIGHWAY,
-                        "address_data": {}
-                    })
+        # Reverse geocode all sampled points concurrently
+        tasks = [asyncio.ensure_future(resolve(i, *segment)) for i, segment in enumerate(segments)]
+        resolved: Dict[int, Optional[Dict[str, Any]]] = {}
+        next_index = 0
+        emitted = 0
+        current = None
+        # Leading samples that resolved to nothing, carried into the first city
+        unassigned = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, city = await next_done
+                resolved[i] = city
+                # Lookups finish out of order; merge as far as the resolved prefix of the route reaches
+                while next_index in resolved:
+                    city = resolved.pop(next_index)
+                    if city is None:
+                        city = {"segment_distance_km": segments[next_index][2], **attributes[next_index]}
+                        unmatched = True
+                    else:
+                        unmatched = False
+                    next_index += 1
+                    if current is not None and (unmatched or current["name"] == city["name"]):
+                        RouteService.merge_segment(current, city)
+                    elif unmatched:
+                        unassigned = city if unassigned is None else RouteService.merge_segment(unassigned, city)
+                    else:
+                        if current is not None:
+                            yield emitted, current
+                            emitted += 1
+                        current = city
+                        if unassigned is not None:
+                            RouteService.merge_segment(current, unassigned)
+                            unassigned = None
+        finally:
+            for task in tasks:
+                task.cancel()
         
-        # If no cities found, create at least one segment
-        if not cities:
-            total_distance = RouteService.calculate_total_distance(coordinates)
+        if current is not None:
+            yield emitted, current
+        else:
+            # If no cities found, create at least one segment
             mid_point = coordinates[len(coordinates) // 2]
-            cities.append({
+            city = {
                 "name": "Route",
                 "latitude": mid_point[1],
                 "longitude": mid_point[0],
-                "segment_distance_km": total_distance,
+                "segment_distance_km": 0.0,
                 "terrain": TerrainType.FLAT,
                 "road_type": RoadType.HIGHWAY,
                 "address_data": {}
-            })
-        
-        return cities
+            }
+            if unassigned is not None:
+                RouteService.merge_segment(city, unassigned)
+            yield 0, city
 
     @staticmethod
-    async def get_cities_along_simple_route(start_coords: tuple, end_coords: tuple) -> List[Dict[str, Any]]:
+    def segment_attributes(segments: List[Tuple[float, float, float]], polyline_km: float,
+                           road_profile: Optional[RoadProfile],
+                           terrain_profile: Optional[TerrainProfile]) -> List[Dict[str, Any]]:
+        """Road type shares and elevation stats for each planned segment, where profiles are available
+
+        Both profiles are positioned along the route polyline (polyline_km long),
+        and segment i covers the same share of it as of the route distance.
+        """
+        attributes = [{} for _ in segments]
+        boundaries = np.linspace(0.0, polyline_km, len(segments) + 1)
+        if road_profile is not None:
+            for attrs, shares in zip(attributes, road_profile.shares(boundaries)):
+                attrs["road_type_shares"] = shares_to_dict(shares)
+                attrs["road_type"] = dominant_road_type(attrs["road_type_shares"])
+        if terrain_profile is not None:
+            for attrs, segment, stats in zip(attributes, segments, terrain_profile.segments(boundaries)):
+                if stats is not None:
+                    attrs.update(stats)
+                    # Grade over the segment's route distance, as merge_segment recomputes it
+                    RouteService.apply_grade(attrs, segment[2])
+        return attributes
+
+    @staticmethod
+    def apply_grade(segment: Dict[str, Any], distance_km: float) -> None:
+        """Set grade_percent and terrain from a segment's climb and descent"""
+        segment["grade_percent"] = average_grade_percent(segment["climb_m"], segment["descent_m"], distance_km)
+        segment["terrain"] = terrain_for_grade(segment["grade_percent"])
+
+    @staticmethod
+    def merge_segment(segment: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold another segment's distance, road type shares and elevation stats into segment, in place"""
+        if "road_type_shares" in other:
+            shares = segment.get("road_type_shares", other["road_type_shares"])
+            segment["road_type_shares"] = merge_shares(shares, segment["segment_distance_km"],
+                                                       other["road_type_shares"], other["segment_distance_km"])
+            segment["road_type"] = dominant_road_type(segment["road_type_shares"])
+        # When only one side has DEM coverage its grade stands for the merged segment
+        merge_elevation = "climb_m" in segment and "climb_m" in other
+        if "climb_m" in other and "climb_m" not in segment:
+            for key in ("climb_m", "descent_m", "grade_percent", "terrain"):
+                segment[key] = other[key]
+        elif merge_elevation:
+            segment["climb_m"] += other["climb_m"]
+            segment["descent_m"] += other["descent_m"]
+        segment["segment_distance_km"] += other["segment_distance_km"]
+        if merge_elevation:
+            RouteService.apply_grade(segment, segment["segment_distance_km"])
+        return segment
+
+    @staticmethod
+    def plan_route_segments(coordinates: List[List[float]], total_km: Optional[float] = None,
+                            max_segments: int = ROUTE_MAX_SEGMENTS,
+                            min_segment_km: float = ROUTE_MIN_SEGMENT_KM,
+                            polyline: Optional[PolylineDistance] = None) -> List[Tuple[float, float, float]]:
+        """Split a route into equal-distance segments, each sampled at its midpoint
+
+        Returns (lon, lat, segment km) per segment. Short routes get fewer
+        segments (no shorter than min_segment_km), and the segment distances
+        sum to total_km, which defaults to the polyline length.
+        """
+        polyline = polyline or PolylineDistance(coordinates)
+        if total_km is None:
+            total_km = polyline.total
+        count = max(1, max_segments)
+        if min_segment_km > 0:
+            count = min(count, max(1, math.ceil(total_km / min_segment_km)))
+        boundaries = np.linspace(0.0, polyline.total, count + 1)
+        midpoints = polyline.interpolate((boundaries[:-1] + boundaries[1:]) / 2)
+        distances = [total_km / count] * count
+        distances[-1] = total_km - sum(distances[:-1])
+        return [(float(lon), float(lat), distance_km) for (lon, lat), distance_km in zip(midpoints, distances)]
+
+    async def reverse_geocode(self, lat: float, lon: float, zoom: int = 10) -> Optional[Dict[str, Any]]:
+        """Reverse geocode a point to its address dict: offline places index, then cache, then Nominatim"""
+        if self.places_index is not None:
+            address = self.places_index.lookup(lat, lon)
+            if address is not None:
+                return address
+        
+        cache_key = RouteService.reverse_geocode_cache_key(lat, lon, zoom)
+        cached = await self.reverse_geocode_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def reverse(timeout: float) -> httpx.Response:
+            async with upstream("nominatim_reverse"):
+                response = await self.http_client.get(
+                    "https://nominatim.openstreetmap.org/reverse",
+                    params={
+                        "lat": lat,
+                        "lon": lon,
+                        "format": "json",
+                        "zoom": zoom
+                    },
+                    timeout=timeout
+                )
+            return check_response(NOMINATIM, response)
+        
+        async with self.reverse_geocode_semaphore:
+            if self.nominatim_limiter:
+                await self.nominatim_limiter.acquire()
+            response = await call_upstream(NOMINATIM, reverse, NOMINATIM_REVERSE_TIMEOUT_SECONDS)
+        
+        data = response.json()
+        if not data or "address" not in data:
+            return None
+        self.reverse_geocode_cache.set(cache_key, data["address"])
+        return data["address"]
+
+    async def resolve_route_point(self, i: int, lon: float, lat: float,
+                                  segment_distance: float) -> Optional[Dict[str, Any]]:
+        """Reverse geocode one sampled route point into its city segment"""
+        try:
+            # Reverse geocode to get city information
+            address = await self.reverse_geocode(lat, lon)
+            if address is None:
+                return None
+            
+            city_name = (address.get("city") or 
+                       address.get("town") or 
+                       address.get("village") or 
+                       address.get("county") or
+                       f"Location {i+1}")
+            
+            # Determine terrain and road type based on location
+            terrain, road_type = RouteService.determine_terrain_and_road(address)
+            
+            return {
+                "name": city_name,
+                "latitude": lat,
+                "longitude": lon,
+                "segment_distance_km": segment_distance,
+                "terrain": terrain,
+                "road_type": road_type,
+                "address_data": address
+            }
+            
+        except Exception as e:
+            logger.warning(f"Failed to geocode point {lat}, {lon}: {e}")
+            # Add fallback city data
+            return {
+                "name": f"Route Segment {i+1}",
+                "latitude": lat,
+                "longitude": lon,
+                "segment_distance_km": segment_distance,
+                "terrain": TerrainType.FLAT,
+                "road_type": RoadType.HIGHWAY,
+                "address_data": {},
+                "unresolved": True
+            }
+
+    async def get_cities_along_simple_route(self, start_coords: tuple, end_coords: tuple) -> List[Dict[str, Any]]:
         """Get cities for simple fallback route"""
         start_lat, start_lon = start_coords
         end_lat, end_lon = end_coords
@@ -187,78 +625,60 @@ class RouteService:
         mid_lon = (start_lon + end_lon) / 2
         
         cities = []
-        async with httpx.AsyncClient() as client:
-            try:
-                # Get city for midpoint
-                response = await client.get(
-                    "https://nominatim.openstreetmap.org/reverse",
-                    params={
-                        "lat": mid_lat,
-                        "lon": mid_lon,
-                        "format": "json",
-                        "zoom": 10
-                    },
-                    timeout=3.0
-                )
-                
-                data = response.json()
-                city_name = "Route"
-                if data and "address" in data:
-                    city_name = (data["address"].get("city") or 
-                               data["address"].get("town") or 
-                               data["address"].get("village") or
-                               "Route")
+        try:
+            # Get city for midpoint
+            address = await self.reverse_geocode(mid_lat, mid_lon)
+            city_name = "Route"
+            if address:
+                city_name = (address.get("city") or 
+                           address.get("town") or 
+                           address.get("village") or
+                           "Route")
                 
-                cities.append({
-                    "name": city_name,
-                    "latitude": mid_lat,
-                    "longitude": mid_lon,
-                    "segment_distance_km": distance,
-                    "terrain": TerrainType.FLAT,
-                    "road_type": RoadType.HIGHWAY,
-                    "address_data": data.get("address", {}) if data else {}
-                })
+            cities.append({
+                "name": city_name,
+                "latitude": mid_lat,
+                "longitude": mid_lon,
+                "segment_distance_km": distance,
+                "terrain": TerrainType.FLAT,
+                "road_type": RoadType.HIGHWAY,
+                "address_data": address or {}
+            })
                 
-            except Exception as e:
-                logger.warning(f"Failed to get city data for midpoint: {e}")
-                cities.append({
-                    "name": "Route",
-                    "latitude": mid_lat,
-                    "longitude": mid_lon,
-                    "segment_distance_km": distance,
-                    "terrain": TerrainType.FLAT,
-                    "road_type": RoadType.HIGHWAY,
-                    "address_data": {}
-                })
+        except Exception as e:
+            logger.warning(f"Failed to get city data for midpoint: {e}")
+            cities.append({
+                "name": "Route",
+                "latitude": mid_lat,
+                "longitude": mid_lon,
+                "segment_distance_km": distance,
+                "terrain": TerrainType.FLAT,
+                "road_type": RoadType.HIGHWAY,
+                "address_data": {},
+                "unresolved": True
+            })
         
         return cities
 
     def sample_route_points(self, coordinates: List[List[float]], max_points: int = 10) -> List[List[float]]:
-        """Sample points along the route for city detection"""
-        if len(coordinates) <= max_points:
-            return coordinates
-        
-        step = len(coordinates) // max_points
-        return [coordinates[i] for i in range(0, len(coordinates), step)]
+        """Sample points along the route for city detection, evenly spaced by distance"""
+        segments = RouteService.plan_route_segments(coordinates, max_segments=max_points)
+        return [[lon, lat] for lon, lat, _ in segments]
 
     @staticmethod
-    def calculate_segment_distance(coordinates: List[List[float]], start_idx: int, end_idx: int) -> float:
-        """Calculate distance for a segment of the route"""
-        if start_idx >= len(coordinates) or end_idx >= len(coordinates):
-            return 0.0
-        
-        total_distance = 0.0
-        for i in range(start_idx, min(end_idx, len(coordinates) - 1)):
-            coord1 = (coordinates[i][1], coordinates[i][0])  # lat, lon
-            coord2 = (coordinates[i + 1][1], coordinates[i + 1][0])  # lat, lon
-            total_distance += RouteService.haversine_distance(coord1, coord2)
-        
-        return total_distance
+    def calculate_segment_distance(coordinates: List[List[float]], start_idx: int, end_idx: int,
+                                   polyline: Optional[PolylineDistance] = None) -> float:
+        """Calculate distance for a segment of the route; pass the route's polyline to reuse its prefix sums"""
+        if polyline is None:
+            if start_idx >= len(coordinates) or end_idx >= len(coordinates):
+                return 0.0
+            return PolylineDistance(coordinates[start_idx:end_idx + 1]).total
+        return polyline.segment(start_idx, end_idx)
 
     @staticmethod
     def calculate_total_distance(coordinates: List[List[float]]) -> float:
         """Calculate total distance of the route"""
-        return RouteService.calculate_segment_distance(coordinates, 0, len(coordinates) - 1)
+        return PolylineDistance(coordinates).total
 
     @staticmethod
     def determine_terrain_and_road(address_data: Dict[str, Any]) -> tuple:
@@ -266,28 +686,28 @@ class RouteService:
         # Simple heuristics based on address components
         terrain = TerrainType.FLAT
         road_type = RoadType.HIGHWAY
+        address_text = str(address_data).lower()
         
         # Check for mountainous areas
-        if any(keyword in str(address_data).lower() for keyword in 
+        if any(keyword in address_text for keyword in 
                ['mountain', 'hill', 'peak', 'ridge', 'alpine']):
             terrain = TerrainType.MOUNTAINOUS
-        elif any(keyword in str(address_data).lower() for keyword in 
+        elif any(keyword in address_text for keyword in 
                 ['hill', 'elevated', 'plateau']):
             terrain = TerrainType.HILLY
         
         # Check for urban areas
         if address_data.get('city') or address_data.get('town'):
             road_type = RoadType.URBAN
-        elif any(keyword in str(address_data).lower() for keyword in 
+        elif any(keyword in address_text for keyword in 
                 ['village', 'rural', 'county', 'countryside']):
             road_type = RoadType.RURAL
         
         return terrain, road_type
 
-    @staticmethod
-    async def get_route(start_coords: tuple, end_coords: tuple) -> Dict[str, Any]:
+    async def get_route(self, start_coords: tuple, end_coords: tuple) -> Dict[str, Any]:
         """Wrapper for backward compatibility"""
-        return await RouteService.get_route_with_cities(start_coords, end_coords)
+        return await self.get_route_with_cities(start_coords, end_coords)
     
     @staticmethod
     def haversine_distance(coord1: tuple, coord2: tuple) -> float:
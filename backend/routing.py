@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from config import OSRM_BASE_URL, OSRM_TIMEOUT_SECONDS, OSRM_HEDGE_DELAY_SECONDS, ROUTING_BACKEND, LOCAL_ROUTING_GRAPH_PATH
+from metrics import upstream
+from resilience import call_upstream, check_response
+
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingBackend:
+    """Interface for routing engines
+
+    route() returns a dict with distance_km, duration_seconds, coordinates
+    ([lon, lat] pairs), steps (OSRM-style) and optionally annotation, and
+    raises on failure so the caller can fall back.
+    """
+
+    name = "base"
+
+    async def start(self) -> None:
+        """Load resources before the first query (called on application startup)"""
+
+    async def route(self, start_coords: tuple, end_coords: tuple, profile: str = "driving") -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def route_alternatives(self, start_coords: tuple, end_coords: tuple, profile: str = "driving",
+                                 count: int = 3) -> List[Dict[str, Any]]:
+        """Up to count distinct routes, the preferred one first"""
+        return [await self.route(start_coords, end_coords, profile)]
+
+    async def table(self, sources: List[tuple], destinations: List[tuple],
+                    profile: str = "driving") -> Tuple[np.ndarray, np.ndarray]:
+        """(distances_km, durations_s) arrays of shape (sources, destinations), NaN where unreachable"""
+        raise NotImplementedError
+
+
+class OSRMRoutingBackend(RoutingBackend):
+    """Routes via an OSRM HTTP server (the public demo server by default)"""
+
+    name = "osrm"
+
+    def __init__(self, http_client: Callable[[], httpx.AsyncClient], base_url: str = OSRM_BASE_URL,
+                 timeout_seconds: float = OSRM_TIMEOUT_SECONDS):
+        # Callable so the backend always uses the owner's current shared client
+        self._http_client = http_client
+        self.base_url = base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+
+    async def route(self, start_coords: tuple, end_coords: tuple, profile: str = "driving") -> Dict[str, Any]:
+        return (await self._request(start_coords, end_coords, profile))[0]
+
+    async def route_alternatives(self, start_coords: tuple, end_coords: tuple, profile: str = "driving",
+                                 count: int = 3) -> List[Dict[str, Any]]:
+        routes = await self._request(start_coords, end_coords, profile, alternatives=count - 1)
+        return routes[:count]
+
+    async def _request(self, start_coords: tuple, end_coords: tuple, profile: str,
+                       alternatives: int = 0) -> List[Dict[str, Any]]:
+        start_lat, start_lon = start_coords
+        end_lat, end_lon = end_coords
+        params = {
+            "overview": "full",
+            "geometries": "geojson",
+            "steps": "true",
+            "annotations": "true"
+        }
+        if alternatives > 0:
+            params["alternatives"] = str(alternatives)
+
+        async def fetch(timeout: float) -> httpx.Response:
+            async with upstream("osrm_route"):
+                response = await self._http_client().get(
+                    f"{self.base_url}/route/v1/{profile}/{start_lon},{start_lat};{end_lon},{end_lat}",
+                    params=params,
+                    timeout=timeout
+                )
+            return check_response(self.name, response)
+
+        response = await call_upstream(self.name, fetch, self.timeout_seconds, OSRM_HEDGE_DELAY_SECONDS)
+        data = response.json()
+        if data["code"] != "Ok" or not data.get("routes"):
+            raise ValueError("Route not found")
+        return [
+            {
+                "distance_km": route["distance"] / 1000,
+                "duration_seconds": route["duration"],
+                "coordinates": route["geometry"]["coordinates"],
+                "steps": route["legs"][0]["steps"],
+                "annotation": route["legs"][0].get("annotation")
+            }
+            for route in data["routes"]
+        ]
+
+    async def table(self, sources: List[tuple], destinations: List[tuple],
+                    profile: str = "driving") -> Tuple[np.ndarray, np.ndarray]:
+        points = list(sources) + list(destinations)
+        coordinates = ";".join(f"{lon},{lat}" for lat, lon in points)
+
+        async def fetch(timeout: float) -> httpx.Response:
+            async with upstream("osrm_table"):
+                response = await self._http_client().get(
+                    f"{self.base_url}/table/v1/{profile}/{coordinates}",
+                    params={
+                        "sources": ";".join(str(i) for i in range(len(sources))),
+                        "destinations": ";".join(str(i) for i in range(len(sources), len(points))),
+                        "annotations": "distance,duration"
+                    },
+                    timeout=timeout
+                )
+            return check_response(self.name, response)
+
+        response = await call_upstream(self.name, fetch, self.timeout_seconds, OSRM_HEDGE_DELAY_SECONDS)
+        data = response.json()
+        if data["code"] != "Ok":
+            raise ValueError(f"Table request failed: {data.get('message', data['code'])}")
+        # Unreachable pairs come back as null
+        distances = np.array(data["distances"], dtype=np.float64) / 1000
+        durations = np.array(data["durations"], dtype=np.float64)
+        return distances, durations
+
+
+class LocalRoutingBackend(RoutingBackend):
+    """Routes in-process over a preprocessed road graph (see local_router.py)"""
+
+    name = "local"
+
+    def __init__(self, graph_path: str = LOCAL_ROUTING_GRAPH_PATH):
+        self.graph_path = graph_path
+        self.graph = None
+        self._load_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        async with self._load_lock:
+            if self.graph is None:
+                from local_router import RoadGraph
+                if not self.graph_path:
+                    raise RuntimeError("LOCAL_ROUTING_GRAPH_PATH must be set for the local routing backend")
+                self.graph = await asyncio.to_thread(RoadGraph.load, self.graph_path)
+                logger.info(f"Loaded road graph with {self.graph.node_count} nodes from {self.graph_path}")
+
+    async def route(self, start_coords: tuple, end_coords: tuple, profile: str = "driving") -> Dict[str, Any]:
+        if profile != "driving":
+            raise ValueError(f"Local routing graph only supports the driving profile, not {profile}")
+        await self.start()
+        # The search is CPU-bound, so keep it off the event loop
+        return await asyncio.to_thread(self.graph.route, start_coords, end_coords)
+
+    async def route_alternatives(self, start_coords: tuple, end_coords: tuple, profile: str = "driving",
+                                 count: int = 3) -> List[Dict[str, Any]]:
+        if profile != "driving":
+            raise ValueError(f"Local routing graph only supports the driving profile, not {profile}")
+        await self.start()
+        return await asyncio.to_thread(self.graph.route_alternatives, start_coords, end_coords, count)
+
+    async def table(self, sources: List[tuple], destinations: List[tuple],
+                    profile: str = "driving") -> Tuple[np.ndarray, np.ndarray]:
+        if profile != "driving":
+            raise ValueError(f"Local routing graph only supports the driving profile, not {profile}")
+        await self.start()
+        return await asyncio.to_thread(self.graph.table, sources, destinations)
+
+
+def create_routing_backend(name: str = ROUTING_BACKEND,
+                           http_client: Optional[Callable[[], httpx.AsyncClient]] = None) -> RoutingBackend:
+    """Build the routing backend selected by ROUTING_BACKEND ("osrm" or "local")"""
+    if name == "local":
+        return LocalRoutingBackend()
+    if name != "osrm":
+        raise ValueError(f"Unknown routing backend: {name}")
+    if http_client is None:
+        raise ValueError("The OSRM routing backend needs an HTTP client")
+    return OSRMRoutingBackend(http_client)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+# The backend modules are imported flat, as uvicorn runs them from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from reasoning_jobs import InProcessReasoningQueue  # noqa: E402
+from route_service import RouteService  # noqa: E402
+from tests.fakes import FakeRoutingBackend, fake_nominatim  # noqa: E402
+
+
+@pytest.fixture
+def route_service():
+    """RouteService on a fake routing backend and a fake, unthrottled Nominatim"""
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(fake_nominatim))
+    return RouteService(nominatim_rate_limit=0, http_client=http_client, routing_backend=FakeRoutingBackend())
+
+
+@pytest.fixture
+def client(route_service):
+    """TestClient for the app, with route_service and an idle job queue in place of the lifespan's"""
+    from fastapi.testclient import TestClient
+
+    reasoning_jobs = InProcessReasoningQueue(workers=1)
+    main.app.dependency_overrides[main.get_route_service] = lambda: route_service
+    main.app.dependency_overrides[main.get_reasoning_jobs] = lambda: reasoning_jobs
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
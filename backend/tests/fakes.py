@@ -0,0 +1,47 @@
+import httpx
+
+from routing import RoutingBackend
+
+START, END = (19.076, 72.878), (18.520, 73.857)
+
+
+class FakeRoutingBackend(RoutingBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def route(self, start_coords, end_coords, profile="driving"):
+        return (await self.route_alternatives(start_coords, end_coords, profile))[0]
+
+    async def route_alternatives(self, start_coords, end_coords, profile="driving", count=3):
+        self.calls += 1
+        return [
+            {"distance_km": 150.0 + i, "duration_seconds": 9000.0, "coordinates": [[72.878, 19.076], [73.857, 18.520]],
+             "steps": []}
+            for i in range(2)
+        ]
+
+
+def fake_nominatim(request: httpx.Request) -> httpx.Response:
+    """Nominatim finding no address by search and placing every reverse lookup in Lonavala"""
+    if request.url.path == "/search":
+        return httpx.Response(200, json=[])
+    return httpx.Response(200, json={"address": {"city": "Lonavala", "state": "Maharashtra"}})
+
+
+def location(address, point=None):
+    if point is None:
+        return {"address": address}
+    return {"address": address, "latitude": point[0], "longitude": point[1]}
+
+
+def trip_body(end=END, **fields):
+    return {
+        "start_location": location("Mumbai", START),
+        "end_location": location("Destination", end),
+        "vehicle_type": "truck",
+        "fuel_type": "diesel_b7",
+        "load_weight": 1000,
+        **fields
+    }
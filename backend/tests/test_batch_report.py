@@ -0,0 +1,39 @@
+import numpy as np
+
+from batch_report import chunk_columns, parse_floats, process_chunk
+
+HEADER = ["date", "vehicle_type", "fuel_type", "distance_km", "load_weight", "city"]
+GROUP_BY = ["vehicle_type", "fuel_type", "city"]
+
+
+def test_short_and_long_csv_rows_are_counted_invalid():
+    lines = [
+        "2024-01-05,truck,diesel_b7,100,1000,Pune\n",
+        "2024-01-06,truck,diesel_b7,100\n",
+        "2024-01-07,truck,diesel_b7,100,1000,Pune,extra\n",
+        "2024-01-08,truck,diesel_b7,50,1000,Pune\n",
+    ]
+    columns, ragged = chunk_columns((HEADER, lines))
+    assert ragged.tolist() == [False, True, True, False]
+    assert columns["city"] == ["Pune", "", "Pune", "Pune"]
+
+    groups, rows, skipped = process_chunk((HEADER, lines), GROUP_BY)
+    assert (rows, skipped) == (4, 2)
+    assert groups[("truck", "diesel_b7", "Pune")][1] == 150.0
+
+
+def test_optional_nulls_take_the_default_and_required_nulls_stay_nan():
+    assert parse_floats([1000.0, None], 0.0).tolist() == [1000.0, 0.0]
+    assert parse_floats(["1000", "", "heavy"], 0.0)[:2].tolist() == [1000.0, 0.0]
+    assert np.isnan(parse_floats(["1000", "", "heavy"], 0.0)[2])
+    assert np.isnan(parse_floats([100.0, None])[1])
+
+
+def test_parquet_null_load_is_empty_not_invalid():
+    batch = {"date": ["2024-01-05", "2024-01-06"], "vehicle_type": ["truck", "truck"],
+             "fuel_type": ["diesel_b7", "diesel_b7"], "distance_km": [100.0, None],
+             "load_weight": [None, 1000.0], "city": ["Pune", "Pune"]}
+    groups, rows, skipped = process_chunk(batch, GROUP_BY)
+    # The null load is an empty run; the null distance is a missing required value
+    assert (rows, skipped) == (2, 1)
+    assert groups[("truck", "diesel_b7", "Pune")][2] == 0.0
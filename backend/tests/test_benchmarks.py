@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.fixtures import NOMINATIM, OSRM, ReplayTransport, synthetic_fixtures
+from benchmarks.run import find_regressions, parse_latency, percentiles
+
+ROUTES = {"urban": ((19.076, 72.878), (19.120, 72.900), 120)}
+
+
+def replay(path: str, **params) -> tuple:
+    """Response to one GET through a fresh replay transport, and the upstream calls it counted"""
+    transport = ReplayTransport(synthetic_fixtures(ROUTES), "urban", latency={NOMINATIM: 0.0, OSRM: 0.0})
+
+    async def get():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get(path, params=params)
+
+    return asyncio.run(get()), transport.calls
+
+
+def test_synthetic_route_is_an_osrm_response():
+    route = synthetic_fixtures(ROUTES)["route"]["urban"]["routes"][0]
+    coordinates = route["geometry"]["coordinates"]
+    assert len(coordinates) == 120
+    assert coordinates[0] == [72.878, 19.076] and coordinates[-1] == [72.9, 19.12]
+    assert sum(step["distance"] for step in route["legs"][0]["steps"]) == pytest.approx(route["distance"], rel=1e-3)
+
+
+def test_replay_answers_nominatim_search_and_reverse():
+    search, calls = replay("https://nominatim.openstreetmap.org/search", q="Lonavala", format="json")
+    assert search.status_code == 200 and len(search.json()) == 1
+    assert calls == {NOMINATIM: 1, OSRM: 0}
+    # The same address always geocodes to the same place
+    again, _ = replay("https://nominatim.openstreetmap.org/search", q="Lonavala", format="json")
+    assert search.json() == again.json()
+
+    reverse, _ = replay("https://nominatim.openstreetmap.org/reverse", lat="18.75", lon="73.40")
+    assert reverse.json()["address"]["state"] == "Maharashtra"
+
+
+def test_replay_answers_osrm_routes():
+    response, calls = replay("http://router.project-osrm.org/route/v1/driving/72.878,19.076;72.900,19.120")
+    assert response.json()["code"] == "Ok"
+    assert len(response.json()["routes"][0]["geometry"]["coordinates"]) == 120
+    assert calls == {NOMINATIM: 0, OSRM: 1}
+    missing, _ = replay("http://router.project-osrm.org/nearest/v1/driving/72.878,19.076")
+    assert missing.status_code == 404
+
+
+def test_percentiles():
+    assert percentiles([]) == {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    result = percentiles(list(range(1, 101)))
+    assert result["p50"] == pytest.approx(50.5) and result["p99"] > result["p95"] > result["p50"]
+
+
+def scenario(p95: float, rps: float, memory: float) -> dict:
+    return {"latency_ms": {"p95": p95}, "requests_per_second": rps, "peak_memory_kib": memory,
+            "stages": {"routing": {"latency_ms": {"p95": p95 / 2}}}}
+
+
+def test_find_regressions_flags_changes_beyond_tolerance():
+    baseline = {"startup": {"import_ms": 500}, "scenarios": {"urban": scenario(100, 50, 1000)}}
+    steady = {"startup": {"import_ms": 520}, "scenarios": {"urban": scenario(105, 49, 1010)}}
+    assert find_regressions(steady, baseline, tolerance=0.1) == []
+
+    slower = {"startup": {"import_ms": 800}, "scenarios": {"urban": scenario(150, 30, 1000),
+                                                           "new": scenario(1, 1, 1)}}
+    regressions = find_regressions(slower, baseline, tolerance=0.1)
+    assert any(r.startswith("startup import ms") for r in regressions)
+    assert any(r.startswith("urban p95 latency ms") for r in regressions)
+    assert any(r.startswith("urban requests/s") for r in regressions)
+    assert any(r.startswith("urban/routing p95 ms") for r in regressions)
+    assert not any("memory" in r or r.startswith("new") for r in regressions)
+
+
+def test_parse_latency():
+    assert parse_latency("osrm=0.2")[OSRM] == 0.2
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_latency("valhalla=1")
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from cache import LRUCache, SQLiteCache, SingleFlight, TieredCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lru_entries_expire():
+    cache = LRUCache(ttl_seconds=60)
+    cache.set("a", 1, ttl_seconds=0.01)
+    cache.set("b", 2)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_sqlite_writes_are_visible_before_and_after_flush(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, "geocode", flush_interval=60)
+    cache.set("mumbai", [19.07, 72.87])
+    # Still buffered: the writer thread waits flush_interval before committing
+    assert cache.get("mumbai") == [19.07, 72.87]
+    cache.close()
+
+    reopened = SQLiteCache(path, "geocode")
+    assert reopened.get("mumbai") == [19.07, 72.87]
+    assert reopened._conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    reopened.close()
+
+
+def test_sqlite_trims_to_max_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), "reasoning", max_entries=2, flush_interval=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+        cache.flush()
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+    cache.close()
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = TieredCache("geocode", disk_path=path)
+    writer.set("pune", [18.52, 73.85])
+    writer.close()
+
+    reader = TieredCache("geocode", disk_path=path)
+    assert asyncio.run(reader.get("pune")) == [18.52, 73.85]
+    assert asyncio.run(reader.get("pune")) == [18.52, 73.85]
+    assert asyncio.run(reader.get("delhi")) is None
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    reader.close()
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "route"
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("lane", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["route"] * 5
+    assert len(calls) == 1
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from distance import PolylineDistance, haversine_km
+
+# [lon, lat]: Mumbai, Lonavala, Pune
+ROUTE = [[72.878, 19.076], [73.407, 18.754], [73.857, 18.520]]
+
+
+def test_haversine_known_distance_and_broadcasting():
+    assert haversine_km(19.076, 72.878, 18.520, 73.857) == pytest.approx(120.0, abs=1.5)
+    # One origin against several destinations in one call
+    distances = haversine_km(19.076, 72.878, np.array([19.076, 18.520]), np.array([72.878, 73.857]))
+    assert distances.shape == (2,)
+    assert distances[0] == 0.0
+
+
+def test_segments_are_prefix_sum_differences():
+    polyline = PolylineDistance(ROUTE)
+    legs = [float(haversine_km(a[1], a[0], b[1], b[0])) for a, b in zip(ROUTE, ROUTE[1:])]
+    assert polyline.total == pytest.approx(sum(legs))
+    assert polyline.segment(1, 2) == pytest.approx(legs[1])
+    assert polyline.segments([0, 1, 2]) == pytest.approx(legs)
+    assert polyline.segment(2, 1) == 0.0 and polyline.segment(0, 9) == 0.0
+
+
+def test_interpolate_walks_along_the_polyline():
+    polyline = PolylineDistance(ROUTE)
+    points = polyline.interpolate([0.0, polyline.segment(0, 1), polyline.total + 50])
+    np.testing.assert_allclose(points, [ROUTE[0], ROUTE[1], ROUTE[2]], atol=1e-9)
+    assert PolylineDistance([ROUTE[0]]).interpolate([3.0]).tolist() == [ROUTE[0]]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from elevation import HGT_VOID, ElevationModel, TerrainProfile, average_grade_percent, terrain_for_grade
+from models import TerrainType
+
+SIZE = 11
+
+
+@pytest.fixture
+def model(tmp_path):
+    """One 11x11 tile, N19E072, rising 100 m per column eastwards with a void at its north-west corner"""
+    grid = np.tile(np.arange(SIZE) * 100, (SIZE, 1)).astype(">i2")
+    grid[0, 0] = HGT_VOID
+    grid.tofile(tmp_path / "N19E072.hgt")
+    return ElevationModel(str(tmp_path))
+
+
+def test_sample_interpolates_and_marks_gaps(model):
+    heights = model.sample([19.5, 19.5, 19.55, 20.5, 19.99], [72.5, 72.25, 72.05, 72.5, 72.01])
+    assert heights[:3] == pytest.approx([500.0, 250.0, 50.0])
+    # No tile north of 20°, and the void poisons the corner it touches
+    assert np.isnan(heights[3]) and np.isnan(heights[4])
+
+
+def test_terrain_profile_splits_climb_between_segments(model):
+    # West to east across the tile at 19.5°N: a steady 1000 m climb
+    profile = TerrainProfile.from_coordinates(model, [[72.0, 19.5], [73.0, 19.5]])
+    half = profile.total / 2
+    first, second = profile.segments([0.0, half, profile.total])
+    # Smoothing flattens the ends a little, so the halves differ slightly from 500 m
+    assert first["climb_m"] + second["climb_m"] == pytest.approx(1000.0, rel=0.05)
+    assert first["descent_m"] == pytest.approx(0.0) and second["descent_m"] == pytest.approx(0.0)
+    assert first["climb_m"] == pytest.approx(500.0, rel=0.1)
+
+
+def test_segments_without_coverage_keep_no_stats(model):
+    profile = TerrainProfile.from_coordinates(model, [[72.5, 19.5], [72.5, 20.5]])
+    covered, uncovered = profile.segments([0.0, profile.total / 2, profile.total])
+    assert covered is not None and uncovered is None
+
+
+def test_grade_thresholds():
+    assert average_grade_percent(30.0, 20.0, 10.0) == pytest.approx(0.5)
+    assert terrain_for_grade(0.5) == TerrainType.FLAT
+    assert terrain_for_grade(1.5) == TerrainType.HILLY
+    assert terrain_for_grade(3.0) == TerrainType.MOUNTAINOUS
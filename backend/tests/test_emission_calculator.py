@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from emission_calculator import (FACTOR_TABLE, FUEL_INDEX, FUEL_TYPES, ROAD_INDEX, ROAD_TYPES, TERRAIN_INDEX,
+                                 TERRAIN_TYPES, VEHICLE_INDEX, VEHICLE_TYPES, EmissionCalculator, TTW, WTT, WTW)
+
+# One segment per terrain/road combination, with distances and loads that differ between segments
+COMBINATIONS = list(itertools.product(TERRAIN_TYPES, ROAD_TYPES))
+DISTANCES = [12.5 + 7 * i for i in range(len(COMBINATIONS))]
+LOADS = [500.0 * i for i in range(len(COMBINATIONS))]
+
+
+def scalar(vehicle, fuel, terrain, road, load, distance):
+    base = EmissionCalculator.calculate_base_emission(vehicle, fuel, distance)
+    result = EmissionCalculator.apply_modifiers(base, terrain, road, load, distance)
+    return [result.ttw_kg, result.wtt_kg, result.wtw_kg]
+
+
+def test_factor_table_matches_scalar_factors():
+    for vehicle, fuel, (terrain, road) in itertools.product(VEHICLE_TYPES, FUEL_TYPES, COMBINATIONS):
+        expected = scalar(vehicle, fuel, terrain, road, 0.0, 1000.0)
+        table = FACTOR_TABLE[VEHICLE_INDEX[vehicle], FUEL_INDEX[fuel], TERRAIN_INDEX[terrain], ROAD_INDEX[road]]
+        assert table.tolist() == pytest.approx(expected[:2], rel=1e-12)
+
+
+def test_fleet_segment_kernel_matches_scalar_path():
+    terrains, roads = zip(*COMBINATIONS)
+    emissions = EmissionCalculator.calculate_fleet_segment_emissions(VEHICLE_TYPES, DISTANCES, terrains, roads,
+                                                                     LOADS)
+    assert emissions.shape == (len(VEHICLE_TYPES), len(FUEL_TYPES), len(COMBINATIONS), 3)
+    for (v, vehicle), (f, fuel), s in itertools.product(enumerate(VEHICLE_TYPES), enumerate(FUEL_TYPES),
+                                                        range(len(COMBINATIONS))):
+        expected = scalar(vehicle, fuel, terrains[s], roads[s], LOADS[s], DISTANCES[s])
+        assert emissions[v, f, s].tolist() == pytest.approx(expected, rel=1e-12)
+
+
+def test_one_hot_road_shares_match_single_road_types():
+    terrains, roads = zip(*COMBINATIONS)
+    shares = np.eye(len(ROAD_TYPES))[[ROAD_INDEX[road] for road in roads]]
+    by_type = EmissionCalculator.calculate_fleet_segment_emissions(VEHICLE_TYPES, DISTANCES, terrains, roads, 1000)
+    by_share = EmissionCalculator.calculate_fleet_segment_emissions(VEHICLE_TYPES, DISTANCES, terrains, roads, 1000,
+                                                                    road_shares=shares)
+    np.testing.assert_allclose(by_share, by_type, rtol=1e-12)
+
+
+@pytest.mark.parametrize("terrain, road", COMBINATIONS)
+def test_matrix_kernel_matches_scalar_wtw(terrain, road):
+    distances = np.array([[0.0, 42.0, 310.5], [18.2, 0.0, 77.7]])
+    matrix = EmissionCalculator.calculate_matrix_emissions(VEHICLE_TYPES, FUEL_TYPES, distances, terrain, road, 750.0,
+                                                           dtype=np.float64)
+    for (v, vehicle), (f, fuel), (i, j) in itertools.product(enumerate(VEHICLE_TYPES), enumerate(FUEL_TYPES),
+                                                             np.ndindex(distances.shape)):
+        expected = scalar(vehicle, fuel, terrain, road, 750.0, distances[i, j])[WTW]
+        assert matrix[v, f, i, j] == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+def test_indexed_kernel_matches_scalar_path():
+    trips = list(itertools.product(VEHICLE_TYPES, FUEL_TYPES, COMBINATIONS))
+    distances = np.linspace(5.0, 900.0, len(trips))
+    loads = np.linspace(0.0, 20000.0, len(trips))
+    emissions = EmissionCalculator.calculate_indexed_emissions(
+        np.array([VEHICLE_INDEX[vehicle] for vehicle, _, _ in trips]),
+        np.array([FUEL_INDEX[fuel] for _, fuel, _ in trips]),
+        distances, loads,
+        np.eye(len(TERRAIN_TYPES))[[TERRAIN_INDEX[terrain] for _, _, (terrain, _) in trips]],
+        np.eye(len(ROAD_TYPES))[[ROAD_INDEX[road] for _, _, (_, road) in trips]]
+    )
+    for n, (vehicle, fuel, (terrain, road)) in enumerate(trips):
+        expected = scalar(vehicle, fuel, terrain, road, loads[n], distances[n])
+        assert emissions[n, [TTW, WTT, WTW]].tolist() == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,20 @@
+from tests.fakes import END, START, location
+
+
+def matrix_body(origins):
+    return {"origins": origins, "vehicle_types": ["truck"], "fuel_types": ["diesel_b7"]}
+
+
+def test_unknown_origin_address_is_a_client_error(client):
+    response = client.post("/emission-matrix", json=matrix_body([location("Nowhere Street 0, Atlantis")]))
+    assert response.status_code == 400
+
+
+def test_json_is_capped_but_binary_formats_are_not(client, monkeypatch):
+    monkeypatch.setattr("main.EMISSION_MATRIX_MAX_JSON_POINTS", 1)
+    body = matrix_body([location("Mumbai", START), location("Pune", END)])
+
+    response = client.post("/emission-matrix?format=json", json=body)
+    assert response.status_code == 400
+    assert "npz" in response.json()["detail"]
+    assert client.post("/emission-matrix?format=npz", json=body).status_code == 200
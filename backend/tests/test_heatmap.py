@@ -0,0 +1,36 @@
+from route_service import RouteService
+from tests.fakes import END, START, trip_body
+
+OTHER_END = (18.975, 72.826)
+
+
+def cached_route(route_id):
+    return {
+        "route_id": route_id, "distance_km": 150.0, "duration_seconds": 9000.0, "fallback": False,
+        "coordinates": [[START[1], START[0]], [END[1], END[0]]],
+        "cities": [{"name": "Lonavala", "latitude": 18.75, "longitude": 73.41, "segment_distance_km": 150.0}]
+    }
+
+
+def test_heatmap_reuses_matching_route_id(client, route_service):
+    route_id = RouteService.route_cache_key(START, END)
+    route_service.store_route(cached_route(route_id))
+    response = client.post("/city-emissions-heatmap", json=trip_body(route_id=route_id))
+    assert response.status_code == 200
+    assert response.json()["route_id"] == route_id
+    assert response.json()["heatmap_data"][0]["city"] == "Lonavala"
+
+
+def test_heatmap_rejects_route_id_of_another_trip(client, route_service):
+    route_id = RouteService.route_cache_key(START, END)
+    route_service.store_route(cached_route(route_id))
+    response = client.post("/city-emissions-heatmap", json=trip_body(OTHER_END, route_id=route_id))
+    assert response.status_code == 400
+
+
+def test_route_id_matches_alternatives_of_the_lane():
+    route_id = RouteService.route_cache_key(START, END)
+    assert RouteService.route_id_matches(route_id, START, END)
+    assert RouteService.route_id_matches(f"{route_id}_2", START, END)
+    assert not RouteService.route_id_matches(route_id, START, OTHER_END)
+    assert not RouteService.route_id_matches("abc_alternatives_3", START, END)
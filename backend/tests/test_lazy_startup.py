@@ -0,0 +1,34 @@
+import sys
+
+import pytest
+
+import reasoning
+from benchmarks.run import LAZY_MODULES, measure_startup
+from models import ReasoningEngine
+from reasoning import GeminiProvider, ReasoningService
+
+
+def test_importing_main_does_not_load_the_gemini_sdk():
+    probe = measure_startup(runs=1)
+    assert "google.generativeai" in LAZY_MODULES
+    assert probe["eager_modules"] == []
+
+
+def test_get_provider_by_name_enum_and_default(monkeypatch):
+    assert ReasoningService.get_provider("off").name == "off"
+    assert ReasoningService.get_provider(ReasoningEngine.TEMPLATE).name == "template"
+    monkeypatch.setattr(reasoning, "REASONING_PROVIDER", "template")
+    assert ReasoningService.get_provider().name == "template"
+    with pytest.raises(ValueError, match="Unknown reasoning provider: openai"):
+        ReasoningService.get_provider("openai")
+
+
+def test_gemini_sdk_errors_are_raised_on_first_use(monkeypatch):
+    monkeypatch.setitem(sys.modules, "google.generativeai", None)
+    with pytest.raises(RuntimeError, match="google-generativeai"):
+        GeminiProvider().sdk()
+
+    monkeypatch.delitem(sys.modules, "google.generativeai")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+        GeminiProvider().sdk()
@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+import pytest
+
+from local_router import RoadGraph
+
+GRID = 100
+
+
+@pytest.fixture(scope="module")
+def graph():
+    """10,000-node street grid with mixed speeds and 8 ALT landmarks"""
+    rng = np.random.default_rng(0)
+    nodes = np.arange(GRID * GRID).reshape(GRID, GRID)
+    pairs = np.concatenate([np.column_stack((nodes[:, :-1].ravel(), nodes[:, 1:].ravel())),
+                            np.column_stack((nodes[:-1].ravel(), nodes[1:].ravel()))])
+    edge_from = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    edge_to = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    graph = RoadGraph.from_edges(18.0 + nodes.ravel() // GRID * 0.01, 72.0 + nodes.ravel() % GRID * 0.01,
+                                 edge_from, edge_to, rng.choice([25, 45, 65, 100], len(edge_from)),
+                                 np.zeros(len(edge_from), dtype=int))
+    graph.select_landmarks(8)
+    return graph
+
+
+def path_time(graph, edges):
+    return float(graph.edge_time_s[edges].sum())
+
+
+def test_alt_paths_are_shortest(graph):
+    rng = np.random.default_rng(1)
+    for source in rng.integers(0, graph.node_count, 5).tolist():
+        times = graph.travel_times_from(source)
+        for target in rng.integers(0, graph.node_count, 5).tolist():
+            _, edges = graph.shortest_path(source, target)
+            assert path_time(graph, edges) == pytest.approx(times[target])
+
+
+def test_alt_query_latency(graph):
+    rng = np.random.default_rng(2)
+    pairs = rng.integers(0, graph.node_count, (20, 2)).tolist()
+    start = time.perf_counter()
+    for source, target in pairs:
+        graph.shortest_path(source, target)
+    # About 3 ms per query on one slow core; the bound only catches the heuristic going back to NumPy calls
+    assert (time.perf_counter() - start) / len(pairs) < 0.025
+
+
+def test_landmarks_survive_save_and_load(graph, tmp_path):
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    loaded = RoadGraph.load(path)
+    target = graph.node_count - 1
+    _, edges = loaded.shortest_path(0, target)
+    assert path_time(loaded, edges) == pytest.approx(graph.travel_times_from(0)[target])
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+
+import httpx
+
+import metrics
+from metrics import (NOOP_TIMER, Counter, Histogram, MetricsRegistry, cache_metrics, circuit_metrics,
+                     request_timings, stage, start_request_timings, upstream_outcome)
+
+
+def test_stage_accumulates_into_request_timings():
+    def run():
+        assert request_timings() is None
+        timings = start_request_timings()
+        with stage("geocode"):
+            pass
+        with stage("geocode"):
+            pass
+
+        async def routed():
+            async with stage("routing"):
+                await asyncio.sleep(0)
+
+        asyncio.run(routed())
+        return timings
+
+    # A fresh context so the timings don't leak into other tests
+    timings = contextvars.copy_context().run(run)
+    assert set(timings) == {"geocode", "routing"}
+    assert all(ms >= 0 for ms in timings.values())
+    assert request_timings() is None
+
+
+def test_stage_is_noop_when_disabled_and_not_requested(monkeypatch):
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", False)
+    assert stage("geocode") is NOOP_TIMER
+    assert metrics.upstream("nominatim") is NOOP_TIMER
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, "geocode")
+    histogram.observe(0.5, "geocode")
+    histogram.observe(5.0, "geocode")
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{stage="geocode",le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{stage="geocode",le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{stage="geocode",le="+Inf"} 3.0' in lines
+    assert 'latency_seconds_sum{stage="geocode"} 5.55' in lines
+    assert 'latency_seconds_count{stage="geocode"} 3.0' in lines
+
+
+def test_counter_and_registry_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls_total", "Calls", ["upstream", "outcome"])
+    counter.inc("osrm", "ok")
+    counter.inc("osrm", "ok", amount=2)
+    text = registry.render(["# extra"])
+    assert 'calls_total{upstream="osrm",outcome="ok"} 3.0' in text
+    assert text.endswith("# extra\n")
+
+
+def test_upstream_outcome():
+    assert upstream_outcome(None) == "ok"
+    assert upstream_outcome(httpx.ReadTimeout("slow")) == "timeout"
+    assert upstream_outcome(ValueError()) == "error"
+
+
+def test_cache_and_circuit_lines():
+    lines = cache_metrics({"geocode": {"memory_hits": 3, "disk_hits": 1, "misses": 2, "hit_ratio": 0.67},
+                           "reasoning": None})
+    assert 'greenroute_cache_hits_total{cache="geocode"} 4' in lines
+    assert 'greenroute_cache_misses_total{cache="geocode"} 2' in lines
+    assert not any('cache="reasoning"' in line for line in lines)
+    assert circuit_metrics({"osrm": "open", "nominatim": "closed"}) == [
+        "# TYPE greenroute_circuit_open gauge",
+        'greenroute_circuit_open{upstream="nominatim"} 0',
+        'greenroute_circuit_open{upstream="osrm"} 1',
+    ]
+
+
+def test_metrics_endpoint(client, monkeypatch):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE greenroute_stage_duration_seconds histogram" in response.text
+    assert "# TYPE greenroute_circuit_open gauge" in response.text
+
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", False)
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from cache import TieredCache
+from models import FuelType, RoadType, TerrainType, VehicleType
+from reasoning import ReasoningProvider, ReasoningService
+
+TRIP = {"vehicle_type": VehicleType.TRUCK, "fuel_type": FuelType.DIESEL_B7, "distance_km": 150.0,
+        "terrain": TerrainType.FLAT, "road_type": RoadType.HIGHWAY, "load_weight": 1000}
+
+
+class FormatProvider(ReasoningProvider):
+    """Answers generate() and stream() in different formats, as Gemini's JSON and plain text modes do"""
+
+    name = "format"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, trip_data):
+        self.calls += 1
+        return "<p>generated</p>"
+
+    async def stream(self, trip_data):
+        self.calls += 1
+        for chunk in ("streamed ", "text"):
+            yield chunk
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FormatProvider()
+    monkeypatch.setitem(ReasoningService.providers, provider.name, provider)
+    monkeypatch.setattr(ReasoningService, "_cache", TieredCache("reasoning", max_entries=16))
+    return provider
+
+
+async def collect(stream):
+    return "".join([chunk async for chunk in stream])
+
+
+def test_streamed_text_does_not_answer_blocking_calls(provider):
+    async def run():
+        streamed = await collect(ReasoningService.stream_reasoning(TRIP, provider.name))
+        generated = await ReasoningService.generate_reasoning(TRIP, provider.name)
+        return streamed, generated
+
+    streamed, generated = asyncio.run(run())
+    assert streamed == "streamed text"
+    assert generated == "<p>generated</p>"
+
+
+def test_each_format_is_served_from_its_own_cache_entry(provider):
+    async def run():
+        for _ in range(2):
+            await collect(ReasoningService.stream_reasoning(TRIP, provider.name))
+            await ReasoningService.generate_reasoning(TRIP, provider.name)
+
+    asyncio.run(run())
+    assert provider.calls == 2
@@ -0,0 +1,42 @@
+import asyncio
+
+import main
+from models import ReasoningJobStatus, TripRequest
+from reasoning_jobs import InProcessReasoningQueue
+from resilience import TEMPLATE_REASONING
+from tests.fakes import trip_body
+
+
+def reasoning_data():
+    request = TripRequest(**trip_body())
+    route = {"distance_km": 150.0, "cities": [{"name": "Lonavala", "segment_distance_km": 150.0}]}
+    return main.build_reasoning_data(request, route, main.compare_route_emissions(request, route["cities"]))
+
+
+def run_job(generate, trip_data):
+    async def run():
+        queue = InProcessReasoningQueue(workers=1, generate=generate)
+        await queue.start()
+        job_id = queue.submit(trip_data)
+        await queue._queue.join()
+        await queue.stop()
+        return queue.get(job_id)
+
+    return asyncio.run(run())
+
+
+async def failing(trip_data):
+    raise TimeoutError("provider timed out")
+
+
+def test_failed_provider_falls_back_to_template_reasoning():
+    job = run_job(failing, reasoning_data())
+    assert job.status == ReasoningJobStatus.COMPLETED
+    assert job.fallbacks == [TEMPLATE_REASONING]
+    assert "Lonavala" in job.reasoning
+
+
+def test_job_fails_when_the_template_cannot_render_either():
+    job = run_job(failing, {})
+    assert job.status == ReasoningJobStatus.FAILED
+    assert job.error == "provider timed out" and job.reasoning is None
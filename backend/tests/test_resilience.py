@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_upstream, get_breaker, hedged,
+                        start_deadline)
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # After reset_seconds a single probe is let through
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_open_breaker_fails_fast():
+    breaker = get_breaker("test_fail_fast")
+    breaker.failure_threshold, breaker.reset_seconds = 1, 60.0
+    calls = []
+
+    async def failing(timeout):
+        calls.append(timeout)
+        raise ConnectionError("refused")
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await call_upstream("test_fail_fast", failing, timeout=1.0)
+        with pytest.raises(CircuitOpenError):
+            await call_upstream("test_fail_fast", failing, timeout=1.0)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_deadline_caps_timeout_without_tripping_breaker():
+    async def slow(timeout):
+        await asyncio.sleep(1.0)
+
+    async def run():
+        start_deadline(0.05)
+        with pytest.raises(DeadlineExceeded):
+            await call_upstream("test_deadline", slow, timeout=5.0)
+
+    asyncio.run(run())
+    breaker = get_breaker("test_deadline")
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_hedged_call_returns_first_answer():
+    attempts = []
+
+    async def fetch(timeout):
+        attempts.append(timeout)
+        # The first attempt stalls; the hedge answers quickly
+        await asyncio.sleep(1.0 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    assert asyncio.run(asyncio.wait_for(hedged(fetch, timeout=2.0, hedge_delay=0.05), 0.5)) == 2
@@ -0,0 +1,48 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from distance import PolylineDistance
+from elevation import TerrainProfile, average_grade_percent
+from route_service import RouteService
+
+# A wiggly 21-point polyline east of Mumbai; the routed distance is longer than the drawn geometry
+COORDINATES = [[72.8 + i * 0.05, 19.0 + 0.02 * (i % 2)] for i in range(21)]
+ROUTE_KM = 140.0
+
+
+def test_segment_distances_sum_to_the_route_distance():
+    polyline = PolylineDistance(COORDINATES)
+    assert polyline.total < ROUTE_KM
+    segments = RouteService.plan_route_segments(COORDINATES, ROUTE_KM, max_segments=7, min_segment_km=5)
+    assert len(segments) == 7
+    assert sum(segment[2] for segment in segments) == pytest.approx(ROUTE_KM)
+
+
+def test_merged_cities_keep_distance_and_grade_on_the_route_basis(route_service):
+    async def reverse_geocode(lat, lon, zoom=10):
+        return {"city": "Panvel" if lon < 73.3 else "Khopoli"}
+
+    route_service.reverse_geocode = reverse_geocode
+    polyline = PolylineDistance(COORDINATES)
+    positions = np.linspace(0.0, polyline.total, 50)
+    terrain = TerrainProfile(positions, 20 * np.sin(positions / 3))
+
+    async def run():
+        return [city async for _, city in route_service.iter_cities_along_route(
+            COORDINATES, ROUTE_KM, terrain_profile=terrain, polyline=polyline)]
+
+    cities = asyncio.run(run())
+    assert [city["name"] for city in cities] == ["Panvel", "Khopoli"]
+    assert sum(city["segment_distance_km"] for city in cities) == pytest.approx(ROUTE_KM)
+    for city in cities:
+        assert city["grade_percent"] == pytest.approx(
+            average_grade_percent(city["climb_m"], city["descent_m"], city["segment_distance_km"]))
+
+
+def test_segment_distance_from_the_route_polyline_matches_the_slice():
+    polyline = PolylineDistance(COORDINATES)
+    for start, end in ((0, 20), (3, 9), (12, 13)):
+        assert RouteService.calculate_segment_distance(COORDINATES, start, end, polyline) == pytest.approx(
+            RouteService.calculate_segment_distance(COORDINATES, start, end))
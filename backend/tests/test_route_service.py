@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from route_service import RouteService
+from tests.fakes import END, START
+
+
+@pytest.fixture
+def service(route_service):
+    async def iter_route_cities(route_data):
+        yield 0, {"name": "Lonavala", "latitude": 18.75, "longitude": 73.41,
+                  "segment_distance_km": route_data["distance_km"]}
+
+    route_service.iter_route_cities = iter_route_cities
+    return route_service
+
+
+def test_alternatives_index_is_not_a_route(service):
+    routes = asyncio.run(service.get_route_alternatives(START, END, count=3))
+    route_id = RouteService.route_cache_key(START, END)
+
+    assert [route["route_id"] for route in routes] == [route_id, f"{route_id}_1"]
+    assert service.get_cached_route(f"{route_id}_1")["cities"]
+    # The lane's index of alternatives must not be served as a route by route_id lookups
+    assert service.get_cached_route(f"{route_id}_alternatives_3") is None
+
+
+def test_alternatives_are_served_from_cache(service):
+    first = asyncio.run(service.get_route_alternatives(START, END, count=3))
+    second = asyncio.run(service.get_route_alternatives(START, END, count=3))
+
+    assert service.routing_backend.calls == 1
+    assert [route["route_id"] for route in second] == [route["route_id"] for route in first]
+
+
+def test_forward_searches_share_the_nominatim_throttle():
+    def found(request):
+        return httpx.Response(200, json=[{"lat": "19.07", "lon": "72.87"}])
+
+    service = RouteService(nominatim_rate_limit=20, http_client=httpx.AsyncClient(transport=httpx.MockTransport(found)))
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(service.geocode_address(f"Depot {i}") for i in range(3)))
+        return time.perf_counter() - start
+
+    # Three calls at 20/s: the last one starts two 50 ms intervals after the first
+    assert asyncio.run(run()) >= 0.1
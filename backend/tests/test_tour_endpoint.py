@@ -0,0 +1,17 @@
+from tests.fakes import START, location
+
+
+def tour_body(stops):
+    return {
+        "depot": location("Depot", START),
+        "stops": [{"location": stop, "demand_kg": 200} for stop in stops],
+        "vehicle_type": "truck",
+        "fuel_type": "diesel_b7"
+    }
+
+
+def test_unknown_stop_address_is_a_client_error(client):
+    response = client.post("/optimize-tour", json=tour_body([location("Nowhere Street 0, Atlantis")]))
+    assert response.status_code == 400
+    assert "Atlantis" in response.json()["detail"]
+
@@ -0,0 +1,93 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import tour_optimizer
+
+from tour_optimizer import (OR_OPT_MAX_CHAIN, best_or_opt, best_two_opt, nearest_neighbour, relocate, solve_tour,
+                            tour_cost)
+
+PER_KM, PER_KG_KM = 1.07, 0.00005
+
+
+def random_instance(rng: np.random.Generator, size: int):
+    """Asymmetric distances, demands at the stops only, and a tour from start (0) to end (size - 1)"""
+    distances = rng.uniform(1.0, 100.0, (size, size))
+    np.fill_diagonal(distances, 0.0)
+    demands = rng.uniform(0.0, 2000.0, size)
+    demands[[0, size - 1]] = 0.0
+    seq = np.concatenate(([0], rng.permutation(np.arange(1, size - 1)), [size - 1]))
+    return seq, distances, demands, float(demands.sum())
+
+
+def reverse(seq: np.ndarray, i: int, j: int) -> np.ndarray:
+    return np.concatenate((seq[:i + 1], seq[i + 1:j + 1][::-1], seq[j + 1:]))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_two_opt_delta_matches_recomputed_cost(seed):
+    rng = np.random.default_rng(seed)
+    seq, distances, demands, load = random_instance(rng, int(rng.integers(5, 12)))
+    args = (distances, demands, PER_KM, PER_KG_KM, load)
+    base = tour_cost(seq, *args)
+
+    delta, i, j = best_two_opt(seq, *args)
+    assert delta == pytest.approx(tour_cost(reverse(seq, i, j), *args) - base, abs=1e-9)
+    brute = min(tour_cost(reverse(seq, a, b), *args) - base
+                for a in range(len(seq) - 2) for b in range(a + 2, len(seq) - 1))
+    assert delta == pytest.approx(brute, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("chain", range(1, OR_OPT_MAX_CHAIN + 1))
+def test_or_opt_delta_matches_recomputed_cost(seed, chain):
+    rng = np.random.default_rng(seed)
+    seq, distances, demands, load = random_instance(rng, int(rng.integers(chain + 3, 12)))
+    args = (distances, demands, PER_KM, PER_KG_KM, load)
+    base = tour_cost(seq, *args)
+
+    delta, s, p = best_or_opt(seq, *args, chain)
+    moves = [(start, after) for start in range(1, len(seq) - chain) for after in range(len(seq) - 1)
+             if after >= start + chain or after <= start - 2]
+    brute = min(tour_cost(relocate(seq, start, chain, after), *args) - base for start, after in moves)
+    if s < 0:
+        # Only improving relocations are reported
+        assert brute >= -1e-9
+    else:
+        assert delta == pytest.approx(tour_cost(relocate(seq, s, chain, p), *args) - base, abs=1e-9)
+        assert delta == pytest.approx(brute, abs=1e-9)
+
+
+def test_relocate_keeps_every_stop():
+    seq = np.arange(8)
+    for start, after in ((2, 5), (5, 1)):
+        moved = relocate(seq, start, 2, after)
+        assert sorted(moved) == list(seq)
+        assert moved[0] == 0 and moved[-1] == 7
+
+
+def test_solve_tour_improves_on_the_greedy_start():
+    rng = np.random.default_rng(7)
+    _, distances, demands, load = random_instance(rng, 12)
+    args = (distances, demands, PER_KM, PER_KG_KM, load)
+    best, cost = solve_tour(*args, time_budget_s=0.2)
+    assert sorted(best) == list(range(12)) and best[0] == 0 and best[-1] == 11
+    assert cost == pytest.approx(tour_cost(best, *args))
+    assert cost <= tour_cost(nearest_neighbour(distances), *args) + 1e-9
+
+
+@pytest.mark.parametrize("starts, workers, per_start", [(4, 2, 0.5), (3, 4, 1.0), (4, 1, 0.25)])
+def test_every_round_of_starts_fits_the_budget(monkeypatch, starts, workers, per_start):
+    budgets = []
+
+    def fake_optimize(distances, demands, per_km, per_kg_km, initial_load, time_budget_s, seed=0):
+        budgets.append(time_budget_s)
+        return np.arange(len(distances)), float(seed)
+
+    monkeypatch.setattr(tour_optimizer, "optimize_tour", fake_optimize)
+    distances = np.ones((4, 4))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        _, cost = solve_tour(distances, np.zeros(4), PER_KM, PER_KG_KM, 0.0, 1.0, starts, workers, pool)
+    assert budgets == [per_start] * starts
+    assert cost == 0.0
@@ -0,0 +1,33 @@
+import json
+
+from tests.fakes import trip_body
+
+
+def events(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_ndjson_stream_sends_route_cities_totals_then_reasoning(client):
+    response = client.post("/calculate-trip/stream", json=trip_body(reasoning_provider="template"))
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    stream = events(response)
+    names = [event["event"] for event in stream]
+
+    assert names[0] == "route" and names[-1] == "done"
+    assert names.index("city_emission") < names.index("totals") < names.index("reasoning")
+    assert stream[names.index("city_emission")]["data"]["city"] == "Lonavala"
+    assert stream[-1]["data"]["degraded"] is False
+
+
+def test_streamed_route_is_cached_for_route_id_lookups(client, route_service):
+    route = events(client.post("/calculate-trip/stream", json=trip_body(reasoning_mode="off")))[0]["data"]
+    cached = route_service.get_cached_route(route["route_id"])
+    assert cached is not None and cached["cities"]
+
+
+def test_sse_framing(client):
+    response = client.post("/calculate-trip/stream?format=sse", json=trip_body(reasoning_mode="off"))
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.strip().split("\n\n")
+    assert frames[0].startswith("event: route\ndata: {")
+    assert frames[-1].startswith("event: done\n")
@@ -0,0 +1,214 @@
+import concurrent.futures
+import math
+import multiprocessing
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+# Smallest cost change treated as an improvement
+EPSILON = 1e-9
+
+# Or-opt moves relocate chains of up to this many consecutive stops
+OR_OPT_MAX_CHAIN = 3
+
+
+def tour_cost(seq: np.ndarray, distances: np.ndarray, demands: np.ndarray, per_km: float,
+              per_kg_km: float, initial_load: float) -> float:
+    """Total cost of visiting the nodes in seq order; a leg costs distance * (per_km + per_kg_km * load on it)"""
+    delivered = np.cumsum(demands[seq])
+    legs = distances[seq[:-1], seq[1:]]
+    return float(np.sum(legs * (per_km + per_kg_km * (initial_load - delivered[:-1]))))
+
+
+def leg_loads(seq: np.ndarray, demands: np.ndarray, initial_load: float) -> np.ndarray:
+    """Load carried on each leg of the tour"""
+    return initial_load - np.cumsum(demands[seq])[:-1]
+
+
+def nearest_neighbour(distances: np.ndarray, rng: Optional[np.random.Generator] = None,
+                      candidates: int = 1) -> np.ndarray:
+    """Greedy initial tour; with an rng, each step picks randomly among the nearest candidates"""
+    end = len(distances) - 1
+    remaining = np.ones(len(distances), dtype=bool)
+    remaining[[0, end]] = False
+    seq = [0]
+    while remaining.any():
+        row = np.where(remaining, distances[seq[-1]], np.inf)
+        if rng is not None and candidates > 1:
+            nearest = np.argsort(row)[:min(candidates, int(remaining.sum()))]
+            node = int(rng.choice(nearest))
+        else:
+            node = int(np.argmin(row))
+        seq.append(node)
+        remaining[node] = False
+    seq.append(end)
+    return np.asarray(seq, dtype=np.int64)
+
+
+def _prefix_terms(seq, distances, demands, per_km, per_kg_km, initial_load):
+    delivered = np.cumsum(demands[seq])
+    legs = distances[seq[:-1], seq[1:]]
+    costs = legs * (per_km + per_kg_km * (initial_load - delivered[:-1]))
+    cost_prefix = np.concatenate(([0.0], np.cumsum(costs)))
+    distance_prefix = np.concatenate(([0.0], np.cumsum(legs)))
+    return delivered, cost_prefix, distance_prefix
+
+
+def best_two_opt(seq, distances, demands, per_km, per_kg_km, initial_load) -> Tuple[float, int, int]:
+    """Best segment reversal (delta, i, j): reverse seq[i + 1..j]"""
+    size = len(seq)
+    if size < 5:
+        return 0.0, -1, -1
+    delivered, cost_prefix, _ = _prefix_terms(seq, distances, demands, per_km, per_kg_km, initial_load)
+    # Reversed legs seq[m + 1] -> seq[m] and their load-weighted prefix sums
+    reverse_legs = distances[seq[1:], seq[:-1]]
+    reverse_prefix = np.concatenate(([0.0], np.cumsum(reverse_legs)))
+    reverse_load_prefix = np.concatenate(([0.0], np.cumsum(reverse_legs * delivered[:-1])))
+
+    i = np.arange(0, size - 2)[:, None]
+    j = np.arange(1, size - 1)[None, :]
+    i_b, j_b = np.broadcast_arrays(i, j)
+    valid = j_b >= i_b + 2
+    i_v, j_v = i_b[valid], j_b[valid]
+
+    old = cost_prefix[j_v + 1] - cost_prefix[i_v]
+    inside = ((per_km + per_kg_km * (initial_load - delivered[i_v] - delivered[j_v]))
+              * (reverse_prefix[j_v] - reverse_prefix[i_v + 1])
+              + per_kg_km * (reverse_load_prefix[j_v] - reverse_load_prefix[i_v + 1]))
+    new = (distances[seq[i_v], seq[j_v]] * (per_km + per_kg_km * (initial_load - delivered[i_v]))
+           + inside
+           + distances[seq[i_v + 1], seq[j_v + 1]] * (per_km + per_kg_km * (initial_load - delivered[j_v])))
+    delta = new - old
+    best = int(np.argmin(delta))
+    return float(delta[best]), int(i_v[best]), int(j_v[best])
+
+
+def best_or_opt(seq, distances, demands, per_km, per_kg_km, initial_load,
+                chain: int) -> Tuple[float, int, int]:
+    """Best relocation (delta, s, p) of the chain seq[s..s + chain - 1] to between seq[p] and seq[p + 1]"""
+    size = len(seq)
+    if size < chain + 3:
+        return 0.0, -1, -1
+    delivered, cost_prefix, distance_prefix = _prefix_terms(seq, distances, demands, per_km, per_kg_km,
+                                                            initial_load)
+    s = np.arange(1, size - chain)[:, None]
+    p = np.arange(0, size - 1)[None, :]
+    s_b, p_b = np.broadcast_arrays(s, p)
+    e_b = s_b + chain - 1
+    load = initial_load
+
+    best_delta, best_s, best_p = 0.0, -1, -1
+    for forward, valid in ((True, p_b >= e_b + 1), (False, p_b <= s_b - 2)):
+        if not valid.any():
+            continue
+        s_v, p_v, e_v = s_b[valid], p_b[valid], e_b[valid]
+        chain_demand = delivered[e_v] - delivered[s_v - 1]
+        chain_legs = distance_prefix[e_v] - distance_prefix[s_v]
+        chain_cost = cost_prefix[e_v] - cost_prefix[s_v]
+        if forward:
+            # Forward: the chain is delivered later, so legs it skips carry its demand longer
+            old = cost_prefix[p_v + 1] - cost_prefix[s_v - 1]
+            new = (distances[seq[s_v - 1], seq[e_v + 1]] * (per_km + per_kg_km * (load - delivered[s_v - 1]))
+                   + (cost_prefix[p_v] - cost_prefix[e_v + 1])
+                   + per_kg_km * chain_demand * (distance_prefix[p_v] - distance_prefix[e_v + 1])
+                   + distances[seq[p_v], seq[s_v]] * (per_km + per_kg_km * (load - delivered[p_v] + chain_demand))
+                   + chain_cost - per_kg_km * (delivered[p_v] - delivered[e_v]) * chain_legs
+                   + distances[seq[e_v], seq[p_v + 1]] * (per_km + per_kg_km * (load - delivered[p_v])))
+        else:
+            # Backward: the chain is delivered earlier, lightening the legs it jumps over
+            old = cost_prefix[e_v + 1] - cost_prefix[p_v]
+            new = (distances[seq[p_v], seq[s_v]] * (per_km + per_kg_km * (load - delivered[p_v]))
+                   + chain_cost + per_kg_km * (delivered[s_v - 1] - delivered[p_v]) * chain_legs
+                   + distances[seq[e_v], seq[p_v + 1]] * (per_km + per_kg_km * (load - delivered[p_v] - chain_demand))
+                   + (cost_prefix[s_v - 1] - cost_prefix[p_v + 1])
+                   - per_kg_km * chain_demand * (distance_prefix[s_v - 1] - distance_prefix[p_v + 1])
+                   + distances[seq[s_v - 1], seq[e_v + 1]] * (per_km + per_kg_km * (load - delivered[e_v])))
+        delta = new - old
+        i = int(np.argmin(delta))
+        if delta[i] < best_delta:
+            best_delta, best_s, best_p = float(delta[i]), int(s_v[i]), int(p_v[i])
+    return best_delta, best_s, best_p
+
+
+def relocate(seq: np.ndarray, s: int, chain: int, p: int) -> np.ndarray:
+    e = s + chain - 1
+    if p > e:
+        return np.concatenate((seq[:s], seq[e + 1:p + 1], seq[s:e + 1], seq[p + 1:]))
+    return np.concatenate((seq[:p + 1], seq[s:e + 1], seq[p + 1:s], seq[e + 1:]))
+
+
+def local_search(seq, distances, demands, per_km, per_kg_km, initial_load, deadline: float) -> np.ndarray:
+    """Apply the best improving 2-opt / Or-opt move until none improves or the deadline passes"""
+    while time.perf_counter() < deadline:
+        delta, i, j = best_two_opt(seq, distances, demands, per_km, per_kg_km, initial_load)
+        move = ("2opt", i, j, 0)
+        for chain in range(1, OR_OPT_MAX_CHAIN + 1):
+            or_delta, s, p = best_or_opt(seq, distances, demands, per_km, per_kg_km, initial_load, chain)
+            if or_delta < delta:
+                delta, move = or_delta, ("oropt", s, p, chain)
+        if delta >= -EPSILON:
+            break
+        kind, a, b, chain = move
+        if kind == "2opt":
+            seq = np.concatenate((seq[:a + 1], seq[a + 1:b + 1][::-1], seq[b + 1:]))
+        else:
+            seq = relocate(seq, a, chain, b)
+    return seq
+
+
+def double_bridge(seq: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Random 4-opt kick that 2-opt / Or-opt cannot undo in one move"""
+    inner = seq[1:-1]
+    a, b, c = sorted(rng.choice(np.arange(1, len(inner)), size=3, replace=False))
+    return np.concatenate(([seq[0]], inner[:a], inner[b:c], inner[a:b], inner[c:], [seq[-1]]))
+
+
+def optimize_tour(distances: np.ndarray, demands: np.ndarray, per_km: float, per_kg_km: float,
+                  initial_load: float, time_budget_s: float, seed: int = 0) -> Tuple[np.ndarray, float]:
+    """Iterated local search from a (randomized, for seed > 0) nearest-neighbour start"""
+    deadline = time.perf_counter() + time_budget_s
+    rng = np.random.default_rng(seed)
+    seq = nearest_neighbour(distances, rng if seed else None, candidates=3)
+    seq = local_search(seq, distances, demands, per_km, per_kg_km, initial_load, deadline)
+    best_seq = seq
+    best_cost = tour_cost(seq, distances, demands, per_km, per_kg_km, initial_load)
+    while len(seq) >= 8 and time.perf_counter() < deadline:
+        candidate = local_search(double_bridge(best_seq, rng), distances, demands, per_km, per_kg_km,
+                                 initial_load, deadline)
+        cost = tour_cost(candidate, distances, demands, per_km, per_kg_km, initial_load)
+        if cost < best_cost - EPSILON:
+            best_seq, best_cost = candidate, cost
+    return best_seq, best_cost
+
+
+def create_tour_pool(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """Process pool for tour starts; spawned, so workers do not inherit the server's event loop or sockets"""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def solve_tour(distances: np.ndarray, demands: np.ndarray, per_km: float, per_kg_km: float,
+               initial_load: float, time_budget_s: float = 2.0, starts: int = 1, workers: int = 1,
+               pool: Optional[concurrent.futures.Executor] = None) -> Tuple[np.ndarray, float]:
+    """Best tour over several independent starts, optionally run in a process pool of `workers` processes"""
+    distances = np.asarray(distances, dtype=np.float64)
+    demands = np.asarray(demands, dtype=np.float64)
+    starts = max(starts, 1)
+    workers = min(max(workers, 1), starts)
+    # Starts run in rounds of `workers`, and every round has to fit in the wall-clock budget
+    per_start = time_budget_s / math.ceil(starts / workers)
+    args = [(distances, demands, per_km, per_kg_km, initial_load, per_start, seed) for seed in range(starts)]
+    if workers > 1:
+        if pool is not None:
+            results = list(pool.map(_optimize_tour_args, args))
+        else:
+            with create_tour_pool(workers) as own_pool:
+                results = list(own_pool.map(_optimize_tour_args, args))
+    else:
+        results = [optimize_tour(*arg) for arg in args]
+    return min(results, key=lambda result: result[1])
+
+
+def _optimize_tour_args(args: tuple) -> Tuple[np.ndarray, float]:
+    return optimize_tour(*args)